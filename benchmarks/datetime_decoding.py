@@ -0,0 +1,69 @@
+"""
+datetime_decoding.py: Cost of decoding datetimes from stored JSON
+
+Compares the fuzzy datetime detection that ``DateTimeDecoder`` used to do
+with the ISO 8601 matching it does now, and with plain ``json.loads``.
+
+    PYTHONPATH=. python benchmarks/datetime_decoding.py [rounds]
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import datetime
+import json
+import sys
+import timeit
+
+import pytz
+
+from librarian_core.contrib.databases import serializers
+from librarian_core.contrib.databases.utils import to_datetime
+
+
+DEFAULT_ROUNDS = 5000
+
+
+class FuzzyDateTimeDecoder(json.JSONDecoder):
+    """The decoder as it was before only ISO 8601 strings were decoded."""
+
+    def __init__(self, *args, **kwargs):
+        super(FuzzyDateTimeDecoder, self).__init__(
+            object_hook=self.object_hook, *args, **kwargs)
+
+    def object_hook(self, obj):
+        for key, value in obj.items():
+            obj[key] = to_datetime(value)
+        return obj
+
+
+def make_user_json():
+    """Return a serialized user, as stored by ``User.to_json``."""
+    now = datetime.datetime(2015, 3, 4, 5, 6, 7, 123456, tzinfo=pytz.utc)
+    user = dict(username='someone',
+                password='$p5k2$$' + 'a' * 41,
+                reset_token=None,
+                created=now,
+                options=dict(language='en', timezone='UTC', last_seen=now),
+                groups='guest,readers',
+                is_authenticated=True)
+    return json.dumps(user, cls=serializers.DateTimeEncoder)
+
+
+def main(rounds):
+    encoded = make_user_json()
+    cases = [('old decoder', lambda: json.loads(encoded,
+                                                cls=FuzzyDateTimeDecoder)),
+             ('new decoder', lambda: json.loads(
+                 encoded, cls=serializers.DateTimeDecoder)),
+             ('no decoder', lambda: json.loads(encoded))]
+    for (name, fn) in cases:
+        duration = timeit.timeit(fn, number=rounds) / rounds
+        print('{0:<12} {1:8.1f} us'.format(name, duration * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROUNDS)
@@ -0,0 +1,150 @@
+"""
+dependencies.py: Cost of resolving the installation order of components
+
+Orders a chain and a random tree of 500 members with the recursive walk
+that was used before, and with the current topological sort, then loads
+500 components from disk with and without the dependency cache.
+
+    PYTHONPATH=. python benchmarks/dependencies.py [components]
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import collections
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from librarian_core.dependencies import (CircularDependency,
+                                         DependencyLoader,
+                                         UnresolvableDependency)
+
+
+DEFAULT_COMPONENTS = 500
+COMPONENT_META = {
+    'hooks': {
+        'exports': {'initialize': {}},
+        'is_strict': False,
+    }
+}
+HOOKS = """EXPORTS = {{'initialize': {{'depends_on': {0!r}}}}}
+
+
+def initialize(supervisor):
+    pass
+"""
+
+
+class RecursiveLoader(DependencyLoader):
+    """The loader as it was before the order was resolved with a
+    topological sort."""
+
+    def _collect(self, dependent_id, collected=None):
+        if collected is None:
+            collected = collections.deque([dependent_id])
+        try:
+            dependent = self._dep_tree[dependent_id]
+        except KeyError as exc:
+            msg = "Dependency {0} is missing.".format(exc)
+            raise UnresolvableDependency(msg)
+        for needed_dep_id in dependent.get('depends_on', []):
+            if needed_dep_id in collected:
+                msg = 'Dependent module {0} referenced {1}'
+                raise CircularDependency(msg.format(dependent_id,
+                                                    needed_dep_id))
+            collected.appendleft(needed_dep_id)
+            self._collect(needed_dep_id, collected=collected)
+        return collected
+
+    def _order(self):
+        ordered_deps = collections.OrderedDict()
+        for dep_id in self._dep_tree:
+            for needed_dep_id in self._collect(dep_id):
+                if needed_dep_id not in ordered_deps:
+                    ordered_deps[needed_dep_id] = self._dep_tree[
+                        needed_dep_id]
+        self._dep_tree = ordered_deps
+
+
+def make_chain(count):
+    """Return the dependencies of members which each depend on the next."""
+    ids = ['c{0}'.format(i) for i in range(count)]
+    return [(dep_id, ids[i + 1:i + 2]) for (i, dep_id) in enumerate(ids)]
+
+
+def make_tree(count, seed=1):
+    """Return the dependencies of members which each depend on a random
+    member that precedes it."""
+    rand = random.Random(seed)
+    ids = ['t{0}'.format(i) for i in range(count)]
+    return [(dep_id, [ids[rand.randrange(i)]] if i else [])
+            for (i, dep_id) in enumerate(ids)]
+
+
+def time_order(loader_cls, members):
+    loader = loader_cls([], {})
+    loader._dep_tree = collections.OrderedDict(
+        (dep_id, dict(depends_on=list(deps))) for (dep_id, deps) in members)
+    start = time.time()
+    loader._order()
+    return time.time() - start
+
+
+def make_components(path, count):
+    """Create ``count`` components in ``path``, each depending on a random
+    component that precedes it, and return their names."""
+    names = ['benchcomp{0:04d}'.format(i) for i in range(count)]
+    for (i, (_, deps)) in enumerate(make_tree(count)):
+        name = names[i]
+        depends_on = ['{0}.hooks.initialize'.format(names[int(dep[1:])])
+                      for dep in deps]
+        os.mkdir(os.path.join(path, name))
+        with open(os.path.join(path, name, '__init__.py'), 'w') as f:
+            f.write('')
+        with open(os.path.join(path, name, 'hooks.py'), 'w') as f:
+            f.write(HOOKS.format(depends_on))
+    return names
+
+
+def time_load(names, cache_path):
+    # each run starts like a new process would
+    for name in list(sys.modules):
+        if name.startswith('benchcomp'):
+            del sys.modules[name]
+    start = time.time()
+    DependencyLoader(names, COMPONENT_META, cache_path=cache_path).load()
+    return time.time() - start
+
+
+def main(count):
+    for (name, members) in [('chain', make_chain(count)),
+                            ('random tree', make_tree(count))]:
+        for loader_cls in (RecursiveLoader, DependencyLoader):
+            duration = time_order(loader_cls, members)
+            print('_order, {0:<12} {1:<17} {2:8.1f} ms'.format(
+                name, loader_cls.__name__, duration * 1e3))
+
+    path = tempfile.mkdtemp()
+    sys.path.insert(0, path)
+    try:
+        names = make_components(path, count)
+        cache_path = os.path.join(path, 'dependencies.json')
+        print('load(), no cache{0:>24.1f} ms'.format(
+            time_load(names, None) * 1e3))
+        time_load(names, cache_path)
+        print('load(), warm cache{0:>22.1f} ms'.format(
+            time_load(names, cache_path) * 1e3))
+    finally:
+        sys.path.remove(path)
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COMPONENTS)
@@ -0,0 +1,70 @@
+"""
+serializers.py: Per-request cost of the JSON serializer backends
+
+Loads a session, decodes the user stored in it, and encodes both again, as
+the session and auth plugins do on each request, with every backend
+available in the environment.
+
+    PYTHONPATH=. python benchmarks/serializers.py [rounds]
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import datetime
+import sys
+import timeit
+
+import pytz
+
+from librarian_core.contrib.databases import serializers
+
+
+DEFAULT_ROUNDS = 20000
+
+
+def make_session():
+    """Return a serialized session holding a serialized user."""
+    now = datetime.datetime(2015, 3, 4, 5, 6, 7, 123456, tzinfo=pytz.utc)
+    notifications = [dict(id=i, read=False, created=now) for i in range(10)]
+    user = dict(username='someone',
+                password='$p5k2$$' + 'a' * 41,
+                reset_token=None,
+                created=now,
+                options=dict(language='en', timezone='UTC', last_seen=now,
+                             notifications=notifications),
+                groups='guest,readers')
+    session = dict(user=serializers.stdlib_dumps(user),
+                   csrf='x' * 32,
+                   messages=['hello'] * 5,
+                   history=list(range(50)))
+    return serializers.stdlib_dumps(session)
+
+
+def handle_request(encoded):
+    data = serializers.loads(encoded, datetimes=False)
+    user = serializers.loads(data['user'])
+    data['user'] = serializers.dumps(user)
+    return serializers.dumps(data)
+
+
+def main(rounds):
+    encoded = make_session()
+    original = serializers.backend
+    try:
+        for (name, _, _, available) in serializers.BACKENDS:
+            if not available():
+                continue
+            serializers.use_backend(name)
+            duration = timeit.timeit(lambda: handle_request(encoded),
+                                     number=rounds) / rounds
+            print('{0:<12} {1:8.1f} us/request'.format(name, duration * 1e6))
+    finally:
+        serializers.use_backend(original)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROUNDS)
@@ -0,0 +1,219 @@
+"""
+builder.py: Incremental and parallel building of asset bundles
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import webassets
+
+from webassets.bundle import wrap
+from webassets.cache import BaseCache
+from webassets.merge import MemoryHunk
+
+from .static import Assets
+from .utils import ENCODINGS
+
+
+DEFAULT_MANIFEST_NAME = '.bundles.json'
+# name of the webassets cache directory used when the cache is enabled but no
+# directory is configured
+DEFAULT_CACHE_NAME = '.webassets-cache'
+
+# environment used by the worker processes, set up by ``init_worker``
+_worker_env = None
+
+
+class BundleOutput(object):
+    """Minimal writable stream collecting the output of a bundle build."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+def get_bundle_files(bundle):
+    """Return the absolute paths of all source files of ``bundle``, including
+    those of nested bundles."""
+    files = []
+    for _, path in bundle.resolve_contents():
+        if isinstance(path, webassets.Bundle):
+            files.extend(get_bundle_files(path))
+        else:
+            files.append(path)
+    return files
+
+
+def get_bundle_hash(bundle):
+    """Calculate a hash of the bundle definition and the content of all its
+    source files, which changes only if the built bundle would change."""
+    sha1 = hashlib.sha1()
+    filters = ','.join(sorted(getattr(f, 'name', None) or type(f).__name__
+                              for f in bundle.filters))
+    sha1.update('{0}|{1}'.format(bundle.output, filters).encode('utf8'))
+    for path in get_bundle_files(bundle):
+        sha1.update(path.encode('utf8'))
+        with open(path, 'rb') as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def is_built(env, bundle):
+    """Check whether the versioned output of ``bundle`` recorded in the
+    webassets manifest is present on disk."""
+    try:
+        version = bundle.get_version()
+    except webassets.bundle.BundleError:
+        return False
+    ctx = wrap(env, bundle)
+    return os.path.exists(bundle.resolve_output(ctx, version=version))
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, hashes):
+    with open(path, 'w') as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+
+
+def remove_outputs(env, bundle):
+    """Delete all existing versions of the bundle output and their
+    precompressed siblings."""
+    pattern = os.path.join(env.directory, bundle.output) % {'version': '*'}
+    for path in glob.glob(pattern):
+        os.unlink(path)
+        for _, ext in ENCODINGS:
+            if os.path.exists(path + ext):
+                os.unlink(path + ext)
+
+
+def save_bundle(env, bundle, data):
+    """Write the built ``data`` of ``bundle`` under its versioned output name
+    and record the version in the webassets manifest, the same way webassets
+    does it when building bundles itself."""
+    ctx = wrap(env, bundle)
+    hunk = MemoryHunk(data)
+    version = None
+    if ctx.versions:
+        version = ctx.versions.determine_version(bundle, ctx, hunk)
+    output_path = bundle.resolve_output(ctx, version=version)
+    output_dir = os.path.dirname(output_path)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    hunk.save(output_path)
+    bundle.version = version
+    if ctx.manifest:
+        ctx.manifest.remember(bundle, ctx, version)
+    if ctx.versions and version:
+        ctx.versions.set_version(bundle, ctx, output_path, version)
+    return output_path
+
+
+def get_worker_cache(env, slot):
+    """Return the cache setting of the worker in ``slot``. Each worker gets
+    its own subdirectory of the configured cache directory, so workers never
+    write to the same cache files."""
+    cache = env.config.get('cache')
+    if not cache or isinstance(cache, BaseCache):
+        # cache objects cannot be split, so the workers do without one
+        return False
+    if cache is True:
+        cache = os.path.join(env.directory, DEFAULT_CACHE_NAME)
+    return os.path.join(cache, 'worker-{0}'.format(slot))
+
+
+def init_worker(config, counter):
+    global _worker_env
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    _worker_env = Assets.from_config(config).env
+    cache = get_worker_cache(_worker_env, slot)
+    if cache and not os.path.exists(cache):
+        os.makedirs(cache)
+    _worker_env.cache = cache
+
+
+def build_bundle(name, env=None):
+    """Concatenate and minify the bundle registered under ``name`` without
+    writing it to disk. Returns the name, the built data and the time it took
+    to build it."""
+    env = env or _worker_env
+    start = time.time()
+    output = BundleOutput()
+    env[name].build(force=True, output=output)
+    return (name, output.getvalue(), time.time() - start)
+
+
+def build_bundles(env, config, processes=None, manifest_path=None):
+    """Build all bundles of ``env`` whose sources changed since the last
+    build, distributing the work over a pool of ``processes`` worker
+    processes.
+
+    Returns a list of ``(name, status, duration)`` tuples.
+    """
+    manifest_path = manifest_path or os.path.join(env.directory,
+                                                  DEFAULT_MANIFEST_NAME)
+    known_hashes = load_manifest(manifest_path)
+    hashes = {}
+    dirty = []
+    report = []
+    for name, bundle in sorted(env._named_bundles.items()):
+        hashes[name] = get_bundle_hash(bundle)
+        if hashes[name] == known_hashes.get(name) and is_built(env, bundle):
+            report.append((name, 'unchanged', 0.0))
+        else:
+            dirty.append(name)
+
+    processes = min(processes or multiprocessing.cpu_count(), len(dirty))
+    if processes > 1:
+        counter = multiprocessing.Value('i', 0)
+        pool = multiprocessing.Pool(processes,
+                                    initializer=init_worker,
+                                    initargs=(config, counter))
+        try:
+            results = pool.imap_unordered(build_bundle, dirty)
+            built = list(results)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        built = [build_bundle(name, env=env) for name in dirty]
+
+    for (name, data, duration) in built:
+        bundle = env[name]
+        remove_outputs(env, bundle)
+        save_bundle(env, bundle, data)
+        report.append((name, 'built', duration))
+
+    save_manifest(manifest_path, hashes)
+    return sorted(report)
+
+
+def format_report(report):
+    width = max([len(name) for (name, _, _) in report] + [len('bundle')])
+    row = '{0:<%d}  {1:<9}  {2:>8}' % width
+    lines = [row.format('bundle', 'status', 'time (s)')]
+    lines.extend(row.format(name, status, '%.3f' % duration)
+                 for (name, status, duration) in report)
+    return '\n'.join(lines)
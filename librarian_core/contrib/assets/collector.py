@@ -0,0 +1,174 @@
+"""
+collector.py: Collecting static files of components into the static root
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+
+from multiprocessing.pool import ThreadPool
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+COPY = 'copy'
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+METHODS = (COPY, HARDLINK, REFLINK)
+
+DEFAULT_MANIFEST_NAME = '.collected.json'
+# ioctl request code for cloning a file on copy-on-write filesystems (btrfs,
+# xfs), as defined in linux/fs.h
+FICLONE = 0x40049409
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def find_files(src, dst, ignore=None, root='.'):
+    """Yield ``(source, destination)`` path pairs of all files found within
+    ``src``, except the ones whose path relative to ``root`` is in
+    ``ignore``."""
+    ignore = frozenset(ignore or ())
+    for dirpath, dirnames, filenames in os.walk(src):
+        reldir = os.path.relpath(dirpath, src)
+        # prune ignored directories so they're not walked at all
+        dirnames[:] = [d for d in dirnames
+                       if os.path.relpath(os.path.join(dirpath, d), root)
+                       not in ignore]
+        for name in filenames:
+            s = os.path.join(dirpath, name)
+            if os.path.relpath(s, root) not in ignore:
+                yield (s, os.path.normpath(os.path.join(dst, reldir, name)))
+
+
+def reflink(src, dst):
+    """Clone ``src`` into ``dst`` sharing the same data blocks. Raises
+    ``OSError`` if the filesystem does not support it."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported')
+    with open(src, 'rb') as s:
+        with open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+
+
+def copy_file(src, dst, method=COPY):
+    """Copy ``src`` to ``dst`` using the specified ``method``. Hardlinks and
+    reflinks fall back to plain copying if they cannot be created, e.g.
+    because the paths are on different devices."""
+    dst_dir = os.path.dirname(dst)
+    if not os.path.exists(dst_dir):
+        try:
+            os.makedirs(dst_dir)
+        except OSError as exc:
+            # directory may have been created by another worker meanwhile
+            if exc.errno != errno.EEXIST:
+                raise
+    if method != COPY and os.path.lexists(dst):
+        os.unlink(dst)
+    if method == HARDLINK:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    elif method == REFLINK:
+        try:
+            reflink(src, dst)
+            return
+        except (IOError, OSError):
+            pass
+    shutil.copy2(src, dst)
+
+
+class Collector(object):
+    """Copies files into the static root, skipping the ones that are already
+    up to date.
+
+    If ``manifest_path`` is specified, the content hashes of the copied files
+    are stored in it, and files with a matching hash are not copied again,
+    regardless of their modification times.
+
+    :param method:     one of ``copy``, ``hardlink`` or ``reflink``
+    :param threads:    number of threads used for copying
+    """
+    def __init__(self, method=COPY, threads=4, manifest_path=None):
+        if method not in METHODS:
+            raise ValueError('Unknown collect method: {0}'.format(method))
+        self.method = method
+        self.threads = threads
+        self.manifest_path = manifest_path
+        self.hashes = self.load_manifest() if manifest_path else None
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        if self.manifest_path:
+            with open(self.manifest_path, 'w') as f:
+                json.dump(self.hashes, f, indent=2, sort_keys=True)
+
+    def get_key(self, dst):
+        return os.path.relpath(dst, os.path.dirname(self.manifest_path))
+
+    def copy(self, pair):
+        """Copy a single file unless it's up to date. Returns whether the
+        file was copied."""
+        (src, dst) = pair
+        checksum = None
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            pass
+        else:
+            src_stat = os.stat(src)
+            if self.hashes is None:
+                if src_stat.st_mtime - dst_stat.st_mtime <= 1:
+                    return False
+            else:
+                checksum = file_hash(src)
+                if (src_stat.st_size == dst_stat.st_size and
+                        self.hashes.get(self.get_key(dst)) == checksum):
+                    return False
+        copy_file(src, dst, method=self.method)
+        if self.hashes is not None:
+            self.hashes[self.get_key(dst)] = checksum or file_hash(src)
+        return True
+
+    def collect(self, pairs):
+        """Copy all the passed in ``(source, destination)`` pairs. Returns
+        the number of files that were actually copied."""
+        pairs = list(pairs)
+        if self.threads > 1 and len(pairs) > 1:
+            pool = ThreadPool(self.threads)
+            try:
+                results = pool.map(self.copy, pairs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.copy(pair) for pair in pairs]
+        self.save_manifest()
+        return sum(results)
@@ -1,39 +1,48 @@
 import os
-import glob
-import logging
-import shutil
+import time
 
-import webassets.script
+from .builder import build_bundles, format_report
+from .collector import (COPY,
+                        DEFAULT_MANIFEST_NAME as COLLECT_MANIFEST_NAME,
+                        Collector,
+                        find_files)
+from .utils import (MIN_COMPRESS_SIZE,
+                    get_compressors,
+                    precompress_tree)
 
 
-def copytree(src, dst, symlinks=False, ignore=None, root='.'):
-    if not os.path.exists(dst):
-        os.makedirs(dst)
-    for item in os.listdir(src):
-        s = os.path.join(src, item)
-        if os.path.relpath(s, root) not in ignore:
-            d = os.path.join(dst, item)
-            if os.path.isdir(s):
-                copytree(s, d, symlinks=symlinks, ignore=ignore, root=root)
-            else:
-                if (not os.path.exists(d) or
-                        os.stat(s).st_mtime - os.stat(d).st_mtime > 1):
-                    shutil.copy2(s, d)
+def compress_assets(supervisor):
+    """Write gzip (and brotli, if available) compressed siblings of all
+    compressible files in the static directory, so they can be served without
+    compressing them on each request."""
+    if not supervisor.config.get('assets.precompress', True):
+        return
+    use_brotli = supervisor.config.get('assets.brotli', True)
+    min_size = supervisor.config.get('assets.precompress_min_size',
+                                     MIN_COMPRESS_SIZE)
+    assets_dir = supervisor.exts.assets.env.directory
+    count = precompress_tree(assets_dir,
+                             get_compressors(use_brotli=use_brotli),
+                             min_size=int(min_size))
+    print("Compressed {0} static files".format(count))
 
 
 def rebuild_assets(arg, supervisor):
     print("Rebuilding assets")
-    config = supervisor.config.copy()
-    config['assets.debug'] = True
-    assets_dir = supervisor.exts.assets.env.directory
-    # Remove existing assets
-    for name, bundle in supervisor.exts.assets.env._named_bundles.items():
-        path = os.path.join(assets_dir, bundle.output) % {'version': '*'}
-        for p in glob.iglob(path):
-            os.unlink(p)
-    env = webassets.script.CommandLineEnvironment(supervisor.exts.assets.env,
-                                                  logging.getLogger('assets'))
-    env.invoke('build', {})
+    env = supervisor.exts.assets.env
+    processes = supervisor.config.get('assets.build_processes')
+    start = time.time()
+    report = build_bundles(env,
+                           supervisor.config,
+                           processes=int(processes) if processes else None,
+                           manifest_path=supervisor.config.get(
+                               'assets.build_manifest'))
+    print(format_report(report))
+    print("Built {0} of {1} bundles in {2:.3f}s".format(
+        len([r for r in report if r[1] == 'built']),
+        len(report),
+        time.time() - start))
+    compress_assets(supervisor)
     raise supervisor.EarlyExit("Static assets rebuilt successfully",
                                exit_code=0)
 
@@ -41,19 +50,35 @@ def rebuild_assets(arg, supervisor):
 def collect_assets(arg, supervisor):
     print("Collecting assets")
     bundles = supervisor.exts.assets.env._named_bundles.values()
-    bundled_assets = [name for bundle in bundles
-                      for name, path in bundle.resolve_contents()]
+    bundled_assets = set(name for bundle in bundles
+                         for name, path in bundle.resolve_contents())
 
     assets_dir = supervisor.exts.assets.env.directory
     asset_sources = supervisor.config.get('assets.sources', {})
+    pairs = []
     for path, url in asset_sources.values():
         for subdir in os.listdir(path):
             subpath = os.path.join(path, subdir)
             if os.path.isdir(subpath):
-                copytree(subpath,
-                         os.path.join(assets_dir, subdir),
-                         ignore=bundled_assets,
-                         root=subpath)
+                pairs.extend(find_files(subpath,
+                                        os.path.join(assets_dir, subdir),
+                                        ignore=bundled_assets,
+                                        root=subpath))
 
+    manifest_path = None
+    if supervisor.config.get('assets.collect_hashes', False):
+        manifest_path = supervisor.config.get(
+            'assets.collect_manifest',
+            os.path.join(assets_dir, COLLECT_MANIFEST_NAME))
+    collector = Collector(
+        method=supervisor.config.get('assets.collect_method', COPY),
+        threads=int(supervisor.config.get('assets.collect_threads', 4)),
+        manifest_path=manifest_path)
+    start = time.time()
+    copied = collector.collect(pairs)
+    print("Copied {0} of {1} files in {2:.3f}s".format(copied,
+                                                        len(pairs),
+                                                        time.time() - start))
+    compress_assets(supervisor)
     raise supervisor.EarlyExit("Static assets collected successfully",
                                exit_code=0)
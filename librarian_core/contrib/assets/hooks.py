@@ -2,8 +2,7 @@ import os
 
 import bottle
 
-from .handlers import rebuild_assets, collect_assets
-from .static import Assets
+from ...dependencies import LazyFunction
 
 
 EXPORTS = {
@@ -18,6 +17,8 @@ EXPORTS = {
 
 DEFAULT_STATIC_ROOT = 'static'
 DEFAULT_STATIC_URL = '/static/'
+# webassets is loaded only if the assets are actually needed
+HANDLERS_MODULE = '.'.join([__package__, 'handlers'])
 
 
 def component_member_loaded(supervisor, member, config):
@@ -40,17 +41,21 @@ def component_member_loaded(supervisor, member, config):
 
 def initialize(supervisor):
     supervisor.exts.commands.register('assets',
-                                      rebuild_assets,
+                                      LazyFunction(HANDLERS_MODULE,
+                                                   'rebuild_assets'),
                                       '--assets',
                                       action='store_true',
                                       help='rebuild static assets')
     supervisor.exts.commands.register('collect',
-                                      collect_assets,
+                                      LazyFunction(HANDLERS_MODULE,
+                                                   'collect_assets'),
                                       '--collect',
                                       action='store_true',
                                       help='collect static assets')
 
 
 def init_complete(supervisor):
+    from .static import Assets, StaticIndex
     instance = Assets.from_config(supervisor.config)
     supervisor.exts.assets = bottle.BaseTemplate.defaults['assets'] = instance
+    supervisor.exts.static_index = StaticIndex.from_config(supervisor.config)
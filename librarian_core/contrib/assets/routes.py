@@ -1,30 +1,169 @@
+import email.utils
+import mimetypes
 import os
+import time
 
-from bottle import request, static_file, HTTPError
+from bottle import (request,
+                    parse_date,
+                    parse_range_header,
+                    HTTPError,
+                    HTTPResponse)
 from bottle_utils.lazy import caching_lazy
 
+from ...server import FileWrapper
+from .utils import (ENCODINGS,
+                    is_compressible,
+                    is_versioned,
+                    parse_accept_encoding,
+                    make_etag,
+                    etag_matches)
 
-@caching_lazy
-def static_root():
-    project_root = request.app.config['root']
-    static_dir = request.app.config.get('assets.directory', 'static')
-    return os.path.join(project_root, static_dir)
 
+FAR_FUTURE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
-@caching_lazy
-def static_sources():
-    asset_sources = request.app.config.get('assets.sources', {})
-    paths, _ = zip(*asset_sources.values())
-    return [static_root()] + list(paths)
+
+def get_mimetype(path, charset='UTF-8'):
+    mimetype, _ = mimetypes.guess_type(path)
+    if mimetype and (mimetype.startswith('text/') or
+                     mimetype == 'application/javascript'):
+        mimetype += '; charset=%s' % charset
+    return mimetype
+
+
+def is_fresh(variant, original):
+    """Check whether the precompressed ``variant`` is at least as new as the
+    ``original`` file, i.e. it was not left behind by a change of the
+    original."""
+    try:
+        return os.stat(variant).st_mtime >= os.stat(original).st_mtime
+    except OSError:
+        return False
+
+
+def select_variant(path, static_root, static_index):
+    """Pick the precompressed variant of the requested file that the client
+    accepts, if there is an up to date one in the same static root as the
+    original."""
+    if is_compressible(path):
+        header = request.environ.get('HTTP_ACCEPT_ENCODING')
+        accepted = parse_accept_encoding(header)
+        original = os.path.join(static_root, path)
+        for coding, ext in ENCODINGS:
+            if (coding in accepted and
+                    static_index.lookup(path + ext) == static_root and
+                    is_fresh(original + ext, original)):
+                return (path + ext, coding)
+    return (path, None)
+
+
+def iter_file_range(fobj, offset, length, blksize=8192):
+    """Yield ``length`` bytes of ``fobj`` starting at ``offset``, closing the
+    file when done."""
+    try:
+        fobj.seek(offset)
+        while length > 0:
+            data = fobj.read(min(blksize, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fobj.close()
+
+
+def get_file_body(filename, offset, length, size):
+    """Return the response body transmitting ``length`` bytes of the file
+    found at ``filename``, starting at ``offset``, where ``size`` is the size
+    of the whole file.
+
+    If the request is handled by ``SendfileWSGIHandler``, the open file
+    positioned at ``offset`` is returned, as the handler sends no more than
+    the Content-Length of the response, with ``os.sendfile`` or otherwise.
+    Other servers read files passed on to them up to their end, so the open
+    file is returned only if it is requested as a whole."""
+    fobj = open(filename, 'rb')
+    if request.environ.get('wsgi.file_wrapper') is FileWrapper:
+        fobj.seek(offset)
+        return fobj
+    if offset == 0 and length == size:
+        return fobj
+    return iter_file_range(fobj, offset, length)
+
+
+def send_file(path, root, mimetype=None, encoding=None, headers=None):
+    filename = os.path.join(root, path.strip('/\\'))
+    try:
+        stats = os.stat(filename)
+    except OSError:
+        return HTTPError(404, "File does not exist.")
+
+    headers = dict(headers or {})
+    if mimetype:
+        headers['Content-Type'] = mimetype
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    etag = make_etag(stats)
+    headers['ETag'] = etag
+    headers['Last-Modified'] = email.utils.formatdate(stats.st_mtime,
+                                                      usegmt=True)
+    headers['Date'] = email.utils.formatdate(time.time(), usegmt=True)
+
+    if_none_match = request.environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        if etag_matches(etag, if_none_match):
+            return HTTPResponse(status=304, **headers)
+    else:
+        ims = request.environ.get('HTTP_IF_MODIFIED_SINCE')
+        if ims:
+            ims = parse_date(ims.split(';')[0].strip())
+            if ims is not None and ims >= int(stats.st_mtime):
+                return HTTPResponse(status=304, **headers)
+
+    clen = stats.st_size
+    headers['Accept-Ranges'] = 'bytes'
+    range_header = request.environ.get('HTTP_RANGE')
+    if_range = request.environ.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag):
+        ranges = list(parse_range_header(range_header, clen))
+        if not ranges:
+            headers['Content-Range'] = 'bytes */%d' % clen
+            return HTTPResponse(status=416, **headers)
+        # only the first range is served, multipart responses are not
+        # supported
+        (offset, end) = ranges[0]
+        headers['Content-Range'] = 'bytes %d-%d/%d' % (offset, end - 1, clen)
+        headers['Content-Length'] = end - offset
+        status = 206
+    else:
+        (offset, end) = (0, clen)
+        headers['Content-Length'] = clen
+        status = 200
+
+    if request.method == 'HEAD':
+        body = ''
+    else:
+        body = get_file_body(filename, offset, end - offset, clen)
+    return HTTPResponse(body, status=status, **headers)
 
 
 def send_static(path):
-    for static_root in static_sources():
-        res = static_file(path, static_root)
-        if not isinstance(res, HTTPError):
-            break
+    static_index = request.app.supervisor.exts.static_index
+    path = static_index.normalize(path)
+    static_root = static_index.lookup(path)
+    if static_root is None:
+        return HTTPError(404, "File does not exist.")
 
-    return res
+    (filename, encoding) = select_variant(path, static_root, static_index)
+    headers = {}
+    if is_compressible(path):
+        headers['Vary'] = 'Accept-Encoding'
+    if is_versioned(path):
+        headers['Cache-Control'] = FAR_FUTURE_CACHE_CONTROL
+    return send_file(filename,
+                     static_root,
+                     mimetype=get_mimetype(path),
+                     encoding=encoding,
+                     headers=headers)
 
 
 @caching_lazy
@@ -3,6 +3,110 @@ import os
 import webassets.script
 
 
+def get_static_roots(config):
+    """
+    Return the list of directories from which static files are served, in the
+    order of precedence: the project's own static directory first, followed
+    by the static directories of the installed components.
+    """
+    static_dir = config.get('assets.directory', 'static')
+    roots = [os.path.abspath(os.path.join(config['root'], static_dir))]
+    for path, url in config.get('assets.sources', {}).values():
+        path = os.path.abspath(path)
+        if path not in roots:
+            roots.append(path)
+    return roots
+
+
+class StaticIndex:
+    """
+    Index of static files mapping relative file paths to the root directory
+    that contains them, so requests do not have to probe every source root
+    in turn
+
+    If ``watch`` is set, the modification times of all indexed directories
+    are checked on each lookup, and the index is rebuilt when any of them has
+    changed. This is meant to be used in debug mode only.
+    """
+    def __init__(self, roots, watch=False):
+        self.roots = roots
+        self.watch = watch
+        self._index = {}
+        self._mtimes = {}
+        self.rebuild()
+
+    @staticmethod
+    def normalize(path):
+        return os.path.normpath(path.strip('/\\'))
+
+    def rebuild(self):
+        index = {}
+        mtimes = {}
+        # roots are walked in reverse order so files found in roots with
+        # higher precedence overwrite the entries of the ones that follow
+        for root in reversed(self.roots):
+            # symlinks are followed, except the ones pointing to a directory
+            # that is being walked already, which would loop forever
+            ancestors = {root: frozenset()}
+            for dirpath, dirnames, filenames in os.walk(root,
+                                                        followlinks=True):
+                stat = os.stat(dirpath)
+                walked = ancestors.pop(dirpath, frozenset()).union(
+                    [(stat.st_dev, stat.st_ino)])
+                subdirs = []
+                for name in dirnames:
+                    path = os.path.join(dirpath, name)
+                    if self._dir_id(path) not in walked:
+                        ancestors[path] = walked
+                        subdirs.append(name)
+                dirnames[:] = subdirs
+                mtimes[dirpath] = stat.st_mtime
+                relpath = os.path.relpath(dirpath, root)
+                for name in filenames:
+                    index[self.normalize(os.path.join(relpath, name))] = root
+        self._index = index
+        self._mtimes = mtimes
+
+    @staticmethod
+    def _dir_id(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def is_stale(self):
+        for dirpath, mtime in self._mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        # a root which did not exist before may have been created since
+        return any(root not in self._mtimes and os.path.isdir(root)
+                   for root in self.roots)
+
+    def lookup(self, path):
+        """
+        Return the root directory containing the file at ``path``, or
+        ``None`` if no such file was indexed.
+        """
+        if self.watch and self.is_stale():
+            self.rebuild()
+        return self._index.get(self.normalize(path))
+
+    def __contains__(self, path):
+        return self.lookup(path) is not None
+
+    def __len__(self):
+        return len(self._index)
+
+    @classmethod
+    def from_config(cls, config):
+        """ Create StaticIndex instance from dict-like config object """
+        return cls(get_static_roots(config), watch=config.get('app.debug'))
+
+
 class Assets:
     """
     Wrapper class for webassets.Environment
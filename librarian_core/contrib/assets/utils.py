@@ -0,0 +1,128 @@
+import gzip
+import io
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.json', '.svg', '.html',
+                           '.htm', '.xml', '.txt', '.ico', '.ttf', '.otf',
+                           '.eot')
+MIN_COMPRESS_SIZE = 256  # in bytes, smaller files are not worth it
+# webassets inserts a hex hash in the names of the bundles it builds
+VERSIONED_RE = re.compile(r'-[0-9a-f]{8,}\.\w+$')
+# content codings mapped to the file extensions of precompressed variants, in
+# the order of preference
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+
+def gzip_compress(data):
+    buf = io.BytesIO()
+    # a fixed ``mtime`` keeps the output identical if the input is unchanged
+    gz = gzip.GzipFile(filename='', mode='wb', fileobj=buf, compresslevel=9,
+                       mtime=0)
+    try:
+        gz.write(data)
+    finally:
+        gz.close()
+    return buf.getvalue()
+
+
+def get_compressors(use_brotli=True):
+    compressors = [('.gz', gzip_compress)]
+    if use_brotli and brotli is not None:
+        compressors.append(('.br', brotli.compress))
+    return compressors
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def is_versioned(path):
+    """Return whether ``path`` points to a hash-versioned bundle, which is
+    safe to be cached by clients indefinitely."""
+    return VERSIONED_RE.search(path) is not None
+
+
+def precompress(path, compressors, min_size=MIN_COMPRESS_SIZE):
+    """Write compressed siblings of the file at ``path`` for every passed in
+    compressor, unless they already exist and are up to date. Returns the
+    number of written files."""
+    stat = os.stat(path)
+    if stat.st_size < min_size:
+        return 0
+
+    data = None
+    written = 0
+    for ext, compress in compressors:
+        target = path + ext
+        if (os.path.exists(target) and
+                os.stat(target).st_mtime >= stat.st_mtime):
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            # compression would not pay off, make sure no stale variant is
+            # left around either
+            if os.path.exists(target):
+                os.unlink(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written += 1
+    return written
+
+
+def precompress_tree(directory, compressors, min_size=MIN_COMPRESS_SIZE):
+    """Precompress all compressible files found within ``directory``."""
+    written = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            if is_compressible(name):
+                path = os.path.join(dirpath, name)
+                written += precompress(path, compressors, min_size=min_size)
+    return written
+
+
+def parse_accept_encoding(header):
+    """Return the set of content codings accepted by the client."""
+    accepted = set()
+    for item in (header or '').split(','):
+        params = [p.strip() for p in item.split(';')]
+        coding = params[0].lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        for param in params[1:]:
+            if param.startswith('q='):
+                try:
+                    qvalue = float(param[2:])
+                except ValueError:
+                    qvalue = 0.0
+        if qvalue > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def make_etag(stat):
+    return '"{0:x}-{1:x}"'.format(int(stat.st_mtime), stat.st_size)
+
+
+def etag_matches(etag, header):
+    """Check whether ``etag`` is listed in the If-None-Match ``header``."""
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(',')]
+    # weak comparison is used for If-None-Match as per RFC 7232
+    return '*' in tags or any(t[2:] == etag if t.startswith('W/') else
+                              t == etag for t in tags)
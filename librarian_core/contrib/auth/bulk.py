@@ -0,0 +1,262 @@
+"""
+bulk.py: Import and export of many users at once
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import collections
+import csv
+import datetime
+import functools
+import hashlib
+import multiprocessing
+import re
+import sys
+import time
+
+from ..databases import serializers
+from ..databases.utils import from_csv, is_string, row_to_dict, to_csv, utcnow
+
+from .passwords import PREFIX, crypt
+from .users import USERNAME_REGEX
+
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+USER_COLUMNS = ('username', 'password', 'reset_token', 'created', 'options',
+                'groups')
+SHA1_RE = re.compile(r'^[0-9a-f]{40}$')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on')
+DEFAULT_BATCH_SIZE = 500
+# the csv module of python 2 reads and writes byte strings only, so users
+# files are opened in binary mode, and their content is converted by hand
+PY2 = sys.version_info[0] == 2
+
+
+def get_format(path):
+    """Return the format of the users file at ``path``, based on its
+    extension. Files which are not JSON lines are assumed to be CSV."""
+    if path.lower().endswith(('.jsonl', '.json')):
+        return JSONL
+    return CSV
+
+
+def to_text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def to_bytes(value):
+    if is_string(value) and not isinstance(value, bytes):
+        return value.encode('utf-8')
+    return value
+
+
+def read_users(f, fmt):
+    """Iterate over the user records in the file ``f`` one by one. Lines of
+    JSON lines files which cannot be decoded are yielded as they are, so
+    they are reported as invalid records along with the others."""
+    if fmt == CSV:
+        for record in csv.DictReader(f):
+            yield dict((to_text(key), to_text(value))
+                       for (key, value) in record.items())
+        return
+    for line in f:
+        line = to_text(line).strip()
+        if not line:
+            continue
+        try:
+            yield serializers.loads(line, datetimes=False)
+        except ValueError:
+            yield line
+
+
+def hash_reset_token(token):
+    sha1 = hashlib.sha1()
+    sha1.update(token.encode('utf8'))
+    return sha1.hexdigest()
+
+
+def is_true(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def get_text(record, key):
+    """Return the stripped string stored under ``key`` in ``record``, or an
+    empty string if it's missing. Raises ``ValueError`` if it's not a
+    string."""
+    value = record.get(key) or ''
+    if not is_string(value):
+        raise ValueError('invalid {0}'.format(key))
+    return value.strip()
+
+
+def to_row(record, iterations):
+    """Return the database row of the user described by ``record``. Clear
+    text passwords and reset tokens are hashed, while ones that are already
+    hashed, e.g. when importing exported users, are stored as they are.
+
+    Raises ``ValueError`` if the record is invalid."""
+    if not isinstance(record, dict):
+        raise ValueError('not a user record')
+    username = get_text(record, 'username')
+    password = get_text(record, 'password')
+    if not USERNAME_REGEX.match(username) or not password:
+        raise ValueError('invalid username or password')
+    if not password.startswith(PREFIX):
+        password = crypt(password, None, iterations)
+    groups = record.get('groups') or []
+    if is_string(groups):
+        groups = from_csv(groups)
+    elif (not isinstance(groups, list) or
+            not all(is_string(name) for name in groups)):
+        raise ValueError('invalid groups')
+    groups = list(groups)
+    if is_true(record.get('is_superuser')):
+        groups.append('superuser')
+    reset_token = get_text(record, 'reset_token') or None
+    if reset_token and not SHA1_RE.match(reset_token):
+        reset_token = hash_reset_token(reset_token)
+    created = record.get('created') or utcnow()
+    if is_string(created):
+        created = serializers.parse_datetime(created)
+    if not isinstance(created, datetime.datetime):
+        raise ValueError('invalid creation time')
+    options = record.get('options') or {}
+    if is_string(options):
+        options = serializers.loads(options, datetimes=False)
+    if not isinstance(options, dict):
+        raise ValueError('invalid options')
+    return dict(username=username,
+                password=password,
+                reset_token=reset_token,
+                created=created,
+                options=serializers.dumps(options),
+                groups=to_csv(collections.OrderedDict.fromkeys(groups)))
+
+
+def prepare_user(iterations, record):
+    """Return the ``(row, error)`` pair of ``record``, one of which is
+    ``None``. Invoked in the worker processes."""
+    try:
+        return (to_row(record, iterations), None)
+    except (TypeError, ValueError) as exc:
+        if isinstance(record, dict):
+            record = record.get('username')
+        return (None, '{0}: {1}'.format(record, exc))
+
+
+def write_users(db, rows):
+    """Store the users in ``rows``, replacing the existing users with the
+    same usernames, in a single transaction."""
+    # only the last of the records of the same user is kept
+    rows = list(collections.OrderedDict((row['username'], row)
+                                        for row in rows).values())
+    memberships = [dict(username=row['username'], group_name=name)
+                   for row in rows
+                   for name in from_csv(row['groups'])]
+    users_query = db.Replace('users',
+                             constraints=['username'],
+                             cols=USER_COLUMNS)
+    delete_query = db.Delete('user_groups',
+                             where='username = %(username)s')
+    groups_query = db.Insert('user_groups', cols=('username', 'group_name'))
+    with db.transaction() as cursor:
+        cursor.executemany(users_query.serialize(), rows)
+        cursor.executemany(delete_query.serialize(), rows)
+        if memberships:
+            cursor.executemany(groups_query.serialize(), memberships)
+    return len(rows)
+
+
+def get_group_names(db):
+    query = db.Select(what='name', sets='groups')
+    return set(row['name'] for row in db.fetchall(query))
+
+
+def report_progress(count, skipped, elapsed):
+    print('{0} users imported, {1} skipped ({2:.0f} users/s)'.format(
+        count, skipped, count / elapsed if elapsed else 0))
+
+
+def import_users(db, records, iterations, processes=None,
+                 batch_size=DEFAULT_BATCH_SIZE, report=report_progress):
+    """Import the users described by the ``records`` iterable, hashing their
+    passwords in a pool of ``processes`` processes, and storing them in
+    batches of ``batch_size`` users.
+
+    Returns the number of imported users and the list of error messages of
+    the records which were skipped. ``report`` is invoked with the number of
+    imported and skipped users and the elapsed time after each batch."""
+    known_groups = get_group_names(db)
+    errors = []
+    count = 0
+    batch = []
+    start = time.time()
+    prepare = functools.partial(prepare_user, iterations)
+    pool = multiprocessing.Pool(processes)
+    try:
+        for (row, error) in pool.imap(prepare, records, chunksize=16):
+            if row is not None:
+                unknown = set(from_csv(row['groups'])) - known_groups
+                if unknown:
+                    error = '{0}: unknown groups: {1}'.format(
+                        row['username'], to_csv(sorted(unknown)))
+            if error:
+                errors.append(error)
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                count += write_users(db, batch)
+                batch = []
+                report(count, len(errors), time.time() - start)
+        if batch:
+            count += write_users(db, batch)
+        report(count, len(errors), time.time() - start)
+    finally:
+        pool.terminate()
+        pool.join()
+    return (count, errors)
+
+
+def export_users(db, f, fmt, report=None):
+    """Write all users to the file ``f`` in the ``fmt`` format, and return
+    their number. Passwords and reset tokens are exported hashed, and can be
+    imported as they are."""
+    query = db.Select(sets='users', order='username')
+    if fmt == CSV:
+        writer = csv.DictWriter(f, fieldnames=USER_COLUMNS,
+                                extrasaction='ignore')
+        writer.writeheader()
+    count = 0
+    start = time.time()
+    for row in db.fetchiter(query):
+        row = row_to_dict(row)
+        if isinstance(row['created'], datetime.datetime):
+            row['created'] = row['created'].isoformat()
+        if fmt == CSV:
+            if PY2:
+                row = dict((key, to_bytes(value))
+                           for (key, value) in row.items())
+            writer.writerow(row)
+        else:
+            row['options'] = serializers.loads(row['options'] or '{}',
+                                               datetimes=False)
+            row['groups'] = from_csv(row['groups'])
+            line = serializers.dumps(dict((key, row[key])
+                                          for key in USER_COLUMNS)) + '\n'
+            f.write(to_bytes(line) if PY2 else line)
+        count += 1
+        if report and not count % DEFAULT_BATCH_SIZE:
+            report(count, time.time() - start)
+    if report:
+        report(count, time.time() - start)
+    return count
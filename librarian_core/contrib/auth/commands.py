@@ -1,5 +1,7 @@
 import getpass
+import io
 
+from . import bulk
 from .users import User
 
 try:
@@ -29,3 +31,48 @@ def create_superuser(arg, supervisor):
         create_superuser(arg, supervisor)
 
     raise supervisor.EarlyExit()
+
+
+def open_users_file(path, mode):
+    if bulk.PY2:
+        # the content is encoded and decoded by ``bulk`` itself
+        return open(path, mode + 'b')
+    # the csv module handles newlines itself
+    return io.open(path, mode, encoding='utf-8', newline='')
+
+
+def import_users(path, supervisor):
+    fmt = bulk.get_format(path)
+    try:
+        with open_users_file(path, 'r') as f:
+            (count, errors) = bulk.import_users(
+                supervisor.exts.databases.auth,
+                bulk.read_users(f, fmt),
+                iterations=User.hasher.iterations,
+                processes=supervisor.config.get('auth.import_processes'))
+    except (IOError, ValueError) as exc:
+        print("Import failed: {}".format(exc))
+        raise supervisor.EarlyExit("Import failed", exit_code=1)
+
+    for error in errors:
+        print("Skipped {}".format(error))
+    raise supervisor.EarlyExit(exit_code=1 if errors else 0)
+
+
+def report_export_progress(count, elapsed):
+    print("{} users exported ({:.0f} users/s)".format(
+        count, count / elapsed if elapsed else 0))
+
+
+def export_users(path, supervisor):
+    try:
+        with open_users_file(path, 'w') as f:
+            bulk.export_users(supervisor.exts.databases.auth,
+                              f,
+                              bulk.get_format(path),
+                              report=report_export_progress)
+    except IOError as exc:
+        print("Export failed: {}".format(exc))
+        raise supervisor.EarlyExit("Export failed", exit_code=1)
+
+    raise supervisor.EarlyExit()
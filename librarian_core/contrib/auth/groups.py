@@ -28,6 +28,14 @@ class Group(BaseGroup):
 
         raise GroupNotFound(group_name)
 
+    def get_members(self):
+        """Return the usernames of the members of the group."""
+        query = self.db.Select(what='username',
+                               sets='user_groups',
+                               where='group_name = %s')
+        return [row['username']
+                for row in self.db.fetchall(query, (self.name,))]
+
     def save(self):
         query = self.db.Replace(
             'groups',
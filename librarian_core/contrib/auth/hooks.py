@@ -1,4 +1,6 @@
-from .commands import create_superuser
+from .commands import create_superuser, export_users, import_users
+from .passwords import DEFAULT_ITERATIONS, DEFAULT_THREADS, PasswordHasher
+from .users import User
 
 
 EXPORTS = {
@@ -9,10 +11,28 @@ EXPORTS = {
 
 
 def initialize(supervisor):
+    User.hasher = PasswordHasher(
+        iterations=supervisor.config.get('auth.password_iterations',
+                                         DEFAULT_ITERATIONS),
+        threads=supervisor.config.get('auth.password_threads',
+                                      DEFAULT_THREADS))
     supervisor.exts.commands.register('su',
                                       create_superuser,
                                       '--su',
                                       action='store_true')
+    supervisor.exts.commands.register('import_users',
+                                      import_users,
+                                      '--import-users',
+                                      metavar='PATH',
+                                      help='create or update the users '
+                                           'listed in a CSV or JSON lines '
+                                           '(.jsonl) file')
+    supervisor.exts.commands.register('export_users',
+                                      export_users,
+                                      '--export-users',
+                                      metavar='PATH',
+                                      help='write all users to a CSV or '
+                                           'JSON lines (.jsonl) file')
     supervisor.exts.commands.register('no_auth',
                                       None,
                                       '--no-auth',
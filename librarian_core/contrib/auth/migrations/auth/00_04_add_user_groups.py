@@ -0,0 +1,22 @@
+SQL = """
+create table user_groups
+(
+    username varchar not null,    -- username of the member
+    group_name varchar not null,  -- name of the group
+    primary key (username, group_name)
+);
+create index user_groups_group_name_idx on user_groups (group_name);
+create index users_reset_token_idx on users (reset_token);
+"""
+
+
+def up(db, conf):
+    db.executescript(SQL)
+    # copy memberships from the comma separated lists of groups
+    users = db.fetchall(db.Select(what=['username', 'groups'], sets='users'))
+    rows = [dict(username=user['username'], group_name=name)
+            for user in users
+            for name in set(filter(None, (user['groups'] or '').split(',')))]
+    if rows:
+        query = db.Insert('user_groups', cols=('username', 'group_name'))
+        db.executemany(query, rows)
@@ -9,9 +9,8 @@ file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
 """
 
 import copy
-import json
 
-from ..databases.serializers import DateTimeDecoder, DateTimeEncoder
+from ..databases import serializers
 
 
 class Options(object):
@@ -25,7 +24,7 @@ class Options(object):
         if isinstance(data, dict):
             self.__data = data
         else:
-            self.__data = json.loads(data or '{}', cls=DateTimeDecoder)
+            self.__data = serializers.loads(data or '{}')
 
     def get(self, key, default=None):
         return self.__data.get(key, default)
@@ -51,7 +50,7 @@ class Options(object):
         return len(self.__data)
 
     def to_json(self):
-        return json.dumps(self.__data, cls=DateTimeEncoder)
+        return serializers.dumps(self.__data)
 
     def to_native(self):
         return copy.copy(self.__data)
@@ -0,0 +1,111 @@
+"""
+passwords.py: Password hashing outside of the event loop
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+
+import pbkdf2
+
+from gevent.threadpool import ThreadPool
+
+
+PREFIX = '$p5k2$'
+# iteration count used by ``pbkdf2.crypt`` if none is specified
+DEFAULT_ITERATIONS = 400
+DEFAULT_THREADS = 2
+HASH_SIZE = 24
+
+
+def to_text(value):
+    if isinstance(value, bytes):
+        return value.decode('ascii')
+    return value
+
+
+def make_salt():
+    return base64.b64encode(os.urandom(6), b'./').decode('ascii')
+
+
+def get_iterations(encrypted):
+    """Return the iteration count ``encrypted`` was hashed with."""
+    parts = encrypted.split('$')
+    # '', 'p5k2', iterations in hex, salt, hash
+    if len(parts) != 5 or parts[1] != 'p5k2':
+        raise ValueError('Unknown password hash format')
+    return int(parts[2], 16) if parts[2] else DEFAULT_ITERATIONS
+
+
+def crypt(password, salt=None, iterations=DEFAULT_ITERATIONS):
+    """Return the same result as ``pbkdf2.crypt``, computed by hashlib where
+    available. It is much faster, and it does not hold the GIL while
+    hashing, so other threads keep running meanwhile.
+
+    If ``salt`` is a previously encrypted password, its salt and iteration
+    count are used."""
+    if salt is None:
+        salt = make_salt()
+    elif salt.startswith(PREFIX):
+        iterations = get_iterations(salt)
+        salt = salt.split('$')[3]
+    if not hasattr(hashlib, 'pbkdf2_hmac'):
+        return pbkdf2.crypt(password, salt, iterations)
+    if iterations == DEFAULT_ITERATIONS:
+        salt = '{0}${1}'.format(PREFIX, salt)
+    else:
+        salt = '{0}{1:x}${2}'.format(PREFIX, iterations, salt)
+    if not isinstance(password, bytes):
+        password = password.encode('utf8')
+    raw = hashlib.pbkdf2_hmac('sha1', password, salt.encode('ascii'),
+                              iterations, HASH_SIZE)
+    return '{0}${1}'.format(salt, base64.b64encode(raw, b'./').decode('ascii'))
+
+
+class PasswordHasher(object):
+    """Hashes and verifies passwords in a pool of threads, so greenlets are
+    not blocked while the hashes are computed.
+
+    :param iterations:  iteration count of new hashes
+    :param threads:     maximum number of passwords hashed at a time
+    """
+    def __init__(self, iterations=DEFAULT_ITERATIONS,
+                 threads=DEFAULT_THREADS):
+        self.iterations = iterations
+        self.threads = threads
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.threads)
+        return self._pool
+
+    def encrypt(self, password):
+        return self.pool.apply(crypt, (password, None, self.iterations))
+
+    def verify(self, password, encrypted):
+        try:
+            encrypted = to_text(encrypted)
+            expected = self.pool.apply(crypt, (password, encrypted))
+            # both sides must be of the same type, which on python 2 they
+            # aren't, as hashes read from the database are unicode
+            return hmac.compare_digest(expected.encode('ascii'),
+                                       encrypted.encode('ascii'))
+        except (TypeError, ValueError):
+            return False
+
+    def needs_upgrade(self, encrypted):
+        """Return whether ``encrypted`` was hashed with a different iteration
+        count than the configured one."""
+        try:
+            return get_iterations(encrypted) != self.iterations
+        except ValueError:
+            return True
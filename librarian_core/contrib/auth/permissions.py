@@ -1,8 +1,7 @@
 import functools
-import json
 
 from ...utils import is_string
-from ..databases.serializers import DateTimeDecoder, DateTimeEncoder
+from ..databases import serializers
 
 from .base import BasePermission
 from .helpers import identify_database
@@ -25,14 +24,14 @@ class BaseDynamicPermission(BasePermission):
         result = self.db.fetchone(q, dict(name=self.name,
                                           identifier=self.identifier))
         if result:
-            return json.loads(result['data'], cls=DateTimeDecoder)
+            return serializers.loads(result['data'])
         return {}
 
     def save(self):
         q = self.db.Replace('permissions',
                             constraints=('name', 'identifier'),
                             cols=('name', 'identifier', 'data'))
-        data = json.dumps(self.data, cls=DateTimeEncoder)
+        data = serializers.dumps(self.data)
         self.db.execute(q, dict(name=self.name,
                                 identifier=self.identifier,
                                 data=data))
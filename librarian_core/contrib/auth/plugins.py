@@ -20,14 +20,18 @@ def user_plugin(supervisor):
     def store_user_in_session():
         if hasattr(request, 'session') and hasattr(request, 'user'):
             request.user.options.collect()
-            request.session['user'] = request.user.to_json()
+            user_data = request.user.to_session()
+            # avoid writing the session when only the user record would be
+            # stored, and it has not changed
+            if request.session.get('user') != user_data:
+                request.session['user'] = user_data
 
     def plugin(callback):
         @functools.wraps(callback)
         def wrapper(*args, **kwargs):
             request.no_auth = supervisor.config['args'].no_auth
-            user_data = request.session.get('user', '{}')
-            request.user = User.from_json(user_data)
+            user_data = request.session.get('user')
+            request.user = User.from_session(user_data)
             request.user.options.process()
             return callback(*args, **kwargs)
 
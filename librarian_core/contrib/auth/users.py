@@ -1,19 +1,18 @@
+import copy
 import functools
 import hashlib
-import json
 import re
 
-import pbkdf2
-
 from bottle import request
 
-from ..databases.serializers import DateTimeDecoder, DateTimeEncoder
+from ..databases import serializers
 from ..databases.utils import utcnow, from_csv, to_csv, row_to_dict
 
 from .base import BaseUser
 from .groups import Group
 from .helpers import identify_database
 from .options import Options
+from .passwords import PasswordHasher
 from .utils import generate_random_key
 
 
@@ -35,6 +34,8 @@ class InvalidUserCredentials(Exception):
 class User(BaseUser):
 
     InvalidUserCredentials = InvalidUserCredentials
+    # replaced by the one configured when the component is initialized
+    hasher = PasswordHasher()
 
     @identify_database
     def __init__(self, username=None, password=None, reset_token=None,
@@ -45,7 +46,11 @@ class User(BaseUser):
         self.created = created
         self.options = Options(options, onchange=self.save)
         self.db = db
-        groups = [Group.from_name(name, db=db) for name in from_csv(groups)]
+        group_names = from_csv(groups)
+        # memberships as they are stored in the ``user_groups`` table, which
+        # is written only when they change
+        self._saved_groups = set(group_names)
+        groups = [Group.from_name(name, db=db) for name in group_names]
         super(User, self).__init__(groups=groups)
 
     @property
@@ -80,20 +85,64 @@ class User(BaseUser):
                     created=self.created,
                     options=self.options.to_json(),
                     groups=to_csv([group.name for group in self.groups]))
-        self.db.execute(query, data)
+        groups_changed = self.get_group_names() != self._saved_groups
+        with self.db.transaction() as cursor:
+            cursor.execute(query.serialize(), data)
+            if groups_changed:
+                self._write_groups(cursor)
 
-    def to_json(self):
-        data = dict(username=self.username,
+    @authenticated_only
+    def save_groups(self):
+        """Store the memberships of the user in the ``user_groups`` table,
+        which is used to look up the members of groups. The ``groups`` column
+        of the user is kept up to date by ``save``."""
+        with self.db.transaction() as cursor:
+            self._write_groups(cursor)
+
+    def get_group_names(self):
+        return set(group.name for group in self.groups)
+
+    def _write_groups(self, cursor):
+        query = self.db.Delete('user_groups', where='username = %s')
+        cursor.execute(query.serialize(), (self.username,))
+        rows = [dict(username=self.username, group_name=group.name)
+                for group in self.groups]
+        if rows:
+            query = self.db.Insert('user_groups',
+                                   cols=('username', 'group_name'))
+            cursor.executemany(query.serialize(), rows)
+        self._saved_groups = self.get_group_names()
+
+    def to_native(self):
+        return dict(username=self.username,
                     password=self.password,
                     reset_token=self.reset_token,
                     created=self.created,
                     options=self.options.to_native(),
                     groups=to_csv([group.name for group in self.groups]))
-        return json.dumps(data, cls=DateTimeEncoder)
+
+    def to_session(self):
+        """Return the user record in the form it is stored in sessions, with
+        datetimes as ISO 8601 strings."""
+        return serializers.encode_datetimes(self.to_native())
+
+    def to_json(self):
+        return serializers.dumps(self.to_native())
 
     @classmethod
     def from_json(cls, data):
-        return cls(**json.loads(data, cls=DateTimeDecoder))
+        return cls(**serializers.loads(data))
+
+    @classmethod
+    def from_session(cls, data):
+        """Return the user stored in a session by ``to_session``. Sessions
+        stored before user records were, contain them as JSON."""
+        if not data:
+            return cls()
+        if isinstance(data, dict):
+            # the session data itself is left intact
+            return cls(**serializers.decode_datetimes(copy.deepcopy(data)))
+        return cls.from_json(data)
 
     @classmethod
     @identify_database
@@ -107,7 +156,9 @@ class User(BaseUser):
     @classmethod
     @identify_database
     def from_group(cls, group, db):
-        query = db.Select(sets='users', where='groups = %s')
+        query = db.Select(sets='users',
+                          where=('username IN (SELECT username '
+                                 'FROM user_groups WHERE group_name = %s)'))
         users = db.fetchall(query, (group,))
         if users is None:
             return None
@@ -153,6 +204,8 @@ class User(BaseUser):
                      'options': {},
                      'groups': groups}
         user = cls(db=db, **user_data)
+        # none of the memberships of a new user are stored yet
+        user._saved_groups = set()
         user.save()
         return user
 
@@ -163,6 +216,9 @@ class User(BaseUser):
         password = (password or '').strip()
         user = cls.from_username(username, db=db)
         if user and cls.is_valid_password(password, user.password):
+            if cls.password_needs_upgrade(user.password):
+                # hashed with a different cost than currently configured
+                user.password = cls.set_password(username, password, db=db)
             request.user = user
             request.session.rotate()
             return user
@@ -178,14 +234,19 @@ class User(BaseUser):
                           password='%(password)s',
                           where='username = %(username)s')
         db.execute(query, dict(username=username, password=password))
+        return password
 
-    @staticmethod
-    def encrypt_password(password):
-        return pbkdf2.crypt(password)
+    @classmethod
+    def encrypt_password(cls, password):
+        return cls.hasher.encrypt(password)
 
-    @staticmethod
-    def is_valid_password(password, encrypted_password):
-        return encrypted_password == pbkdf2.crypt(password, encrypted_password)
+    @classmethod
+    def is_valid_password(cls, password, encrypted_password):
+        return cls.hasher.verify(password, encrypted_password)
+
+    @classmethod
+    def password_needs_upgrade(cls, encrypted_password):
+        return cls.hasher.needs_upgrade(encrypted_password)
 
     @staticmethod
     def generate_reset_token():
@@ -24,10 +24,11 @@ def cached(prefix='', timeout=None):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            if not request.app.supervisor.exts.is_installed('cache'):
+            exts = request.app.supervisor.exts
+            if not exts.is_installed('cache'):
                 return func(*args, **kwargs)
 
-            backend = request.app.supervisor.exts.cache
+            backend = exts.cache
             generated = generate_key(func.__name__, *args, **kwargs)
             parsed_prefix = backend.parse_prefix(prefix)
             key = '{0}{1}'.format(parsed_prefix, generated)
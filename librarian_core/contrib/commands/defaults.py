@@ -1,3 +1,4 @@
+import logging
 import os
 import pprint
 
@@ -12,6 +13,24 @@ def debug_conf(arg, supervisor):
     raise supervisor.EarlyExit()
 
 
+def log_event_stats(supervisor):
+    rows = supervisor.exts.events.stats()
+    lines = ['{0:<20} {1:>8} {2:>10} {3:>10}  {4}'.format(
+        'event', 'calls', 'total (s)', 'max (s)', 'listener')]
+    for (event, listener, calls, total, maximum) in rows:
+        lines.append('{0:<20} {1:>8} {2:>10.4f} {3:>10.4f}  {4}'.format(
+            event, calls, total, maximum, listener))
+    logging.info('Event listener statistics:\n%s', '\n'.join(lines))
+
+
+def debug_events(arg, supervisor):
+    supervisor.exts.events.enable_stats()
+    # lowest priority, so the shutdown hooks themselves are included as well
+    supervisor.exts.events.subscribe(supervisor.SHUTDOWN,
+                                     log_event_stats,
+                                     priority=-1000)
+
+
 def install_default_commands(supervisor):
     default_path = os.path.join(supervisor.config['root'],
                                 supervisor.DEFAULT_CONFIG_FILENAME)
@@ -25,10 +44,35 @@ def install_default_commands(supervisor):
                                       debug_on,
                                       '--debug',
                                       action='store_true',
+                                      early=True,
                                       help='enable debugging')
     supervisor.exts.commands.register('debug_conf',
                                       debug_conf,
                                       '--debug-conf',
                                       action='store_true',
+                                      early=True,
                                       help='print out the configuration in '
                                            'use and exit')
+    supervisor.exts.commands.register('debug_events',
+                                      debug_events,
+                                      '--debug-events',
+                                      action='store_true',
+                                      early=True,
+                                      help='record execution times of event '
+                                           'listeners and log them on '
+                                           'shutdown')
+    # both are processed by the supervisor before the components are loaded
+    supervisor.exts.commands.register('profile_startup',
+                                      None,
+                                      '--profile-startup',
+                                      metavar='PATH',
+                                      help='write a flamegraph of the startup '
+                                           'to PATH, as collapsed stacks, or '
+                                           'speedscope JSON if PATH ends '
+                                           'with .json')
+    supervisor.exts.commands.register('profile_cprofile',
+                                      None,
+                                      '--profile-cprofile',
+                                      action='store_true',
+                                      help='also profile the startup with '
+                                           'cProfile, written to PATH.prof')
@@ -9,10 +9,20 @@ EXPORTS = {
     'init_complete': {}
 }
 
+# early commands are handled before all other `init_complete` listeners
+EARLY_COMMANDS_PRIORITY = 1000
+
+
+def handle_early_commands(supervisor):
+    supervisor.exts.commands.handle_early()
+
 
 def initialize(supervisor):
     supervisor.exts.commands = CommandLineHandler(supervisor)
     install_default_commands(supervisor)
+    supervisor.exts.events.subscribe(supervisor.INIT_COMPLETE,
+                                     handle_early_commands,
+                                     priority=EARLY_COMMANDS_PRIORITY)
 
 
 def init_complete(supervisor):
@@ -3,22 +3,46 @@ import sys
 
 
 class CommandLineHandler:
+    """Registry of command line options and their handlers.
+
+    Handlers of options registered with ``early=True`` are invoked before
+    any other component gets to process the ``init_complete`` event, so they
+    should not rely on anything that's set up at that point, such as the
+    databases. Options which only print out information and exit, like
+    ``--version``, are good candidates, as they don't pay for the rest of
+    the startup then.
+    """
 
     def __init__(self, supervisor):
         self._supervisor = supervisor
         self._parser = argparse.ArgumentParser()
         self._handlers = {}
+        self._early = set()
         self.args = None
 
     def register(self, name, fn, *args, **kwargs):
+        if kwargs.pop('early', False):
+            self._early.add(name)
         self._handlers[name] = fn
         self._parser.add_argument(*args, **kwargs)
 
-    def handle(self):
-        args = self._parser.parse_args(sys.argv[1:])
+    def parse(self):
+        if self.args is None:
+            self.args = self._parser.parse_args(sys.argv[1:])
+        return self.args
+
+    def _invoke(self, early):
+        args = self.parse()
         for (name, fn) in self._handlers.items():
+            if (name in self._early) != early:
+                continue
             arg = getattr(args, name, None)
-            if arg:
+            if arg and fn is not None:
                 fn(arg, self._supervisor)
-
         return args
+
+    def handle_early(self):
+        return self._invoke(early=True)
+
+    def handle(self):
+        return self._invoke(early=False)
@@ -1,3 +1,9 @@
+import logging
+
+from .helpers import get_pool_stats
+
+
+POOL_STATS_ROW = '{0:<16} {1:>5} {2:>6} {3:>5} {4:>9} {5:>6} {6:>12} {7:>12}'
 
 
 def dump_tables(arg, supervisor):
@@ -10,3 +16,27 @@ def dump_tables(arg, supervisor):
         print('\n'.join(schema))
 
     raise supervisor.EarlyExit()
+
+
+def log_pool_stats(supervisor):
+    stats = get_pool_stats(supervisor.exts.databases)
+    lines = [POOL_STATS_ROW.format('database', 'size', 'in use', 'peak',
+                                   'checkouts', 'waits', 'avg wait (s)',
+                                   'max wait (s)')]
+    for (name, s) in sorted(stats.items()):
+        lines.append(POOL_STATS_ROW.format(name,
+                                           s['size'],
+                                           s['in_use'],
+                                           s['peak'],
+                                           s['checkouts'],
+                                           s['waits'],
+                                           '%.4f' % s['avg_wait'],
+                                           '%.4f' % s['max_wait']))
+    logging.info('Connection pool statistics:\n%s', '\n'.join(lines))
+
+
+def debug_db_pools(arg, supervisor):
+    # before the databases are closed
+    supervisor.exts.events.subscribe(supervisor.SHUTDOWN,
+                                     log_pool_stats,
+                                     priority=1000)
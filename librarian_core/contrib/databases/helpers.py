@@ -8,20 +8,45 @@ This software is free software licensed under the terms of GPLv3. See COPYING
 file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
 """
 
+import contextlib
+import functools
+import logging
 import os
+import time
+
+from multiprocessing.pool import ThreadPool
 
 import bottle
 
+from gevent.lock import Semaphore
+from gevent.pool import Pool
+
+from .pool import (ConnectionPool,
+                   DEFAULT_MINSIZE,
+                   DEFAULT_MAXSIZE,
+                   DEFAULT_IDLE_TIMEOUT,
+                   DEFAULT_CHECK_AFTER)
+from .timing import TimedDatabase, untimed
+
 
 POSTGRES_BACKEND = 'postgres'
 SQLITE_BACKEND = 'sqlite'
 SERVERLESS_DATABASE_BACKENDS = (SQLITE_BACKEND,)
+DEFAULT_SQLITE_READERS = 4
+DEFAULT_MIGRATION_WORKERS = 4
+# pragmas set on SQLite connections, as (name, config key, default) tuples
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'database.journal_mode', 'WAL'),
+    ('synchronous', 'database.synchronous', 'NORMAL'),
+    ('mmap_size', 'database.mmap_size', 64 * 1024 * 1024),
+    ('busy_timeout', 'database.busy_timeout', 5000),
+)
 
 
 def import_squery(conf):
     backend = conf['database.backend']
     if backend == SQLITE_BACKEND:
-        from squery_lite.squery import Database, DatabaseContainer
+        from .sqlite import Database, DatabaseContainer
     elif backend == POSTGRES_BACKEND:
         from squery_pg.squery_pg import Database, DatabaseContainer
     else:
@@ -55,41 +80,293 @@ def get_database_configs(conf):
     return databases
 
 
+def get_pool_options(conf, maxsize=DEFAULT_MAXSIZE):
+    """Return the keyword arguments of ``ConnectionPool`` found in the
+    configuration. With SQLite, the pool holds the reader connections."""
+    timeout = conf.get('database.pool_timeout')
+    return dict(
+        minsize=int(conf.get('database.pool_minsize', DEFAULT_MINSIZE)),
+        maxsize=int(conf.get('database.pool_maxsize', maxsize)),
+        idle_timeout=float(conf.get('database.pool_idle_timeout',
+                                    DEFAULT_IDLE_TIMEOUT)),
+        check_after=float(conf.get('database.pool_check_after',
+                                   DEFAULT_CHECK_AFTER)),
+        timeout=float(timeout) if timeout else None)
+
+
+def get_timing_options(conf):
+    """Return the keyword arguments of ``TimedDatabase``, or ``None`` if
+    queries are not timed, which is the case unless debugging is enabled or a
+    slow query threshold is set."""
+    threshold = conf.get('database.slow_query_threshold')
+    if not conf.get('app.debug') and not threshold:
+        return None
+    return dict(threshold=float(threshold) if threshold else None)
+
+
+def get_pragmas(conf):
+    return [(name, conf.get(key, default))
+            for (name, key, default) in SQLITE_PRAGMAS]
+
+
+def install_pool(database, options):
+    """Replace the pool of a ``squery_pg`` database with a ``ConnectionPool``
+    which creates connections the same way the original pool does."""
+    original = database.pool
+    pool = ConnectionPool(original.create_connection, **options)
+    original.closeall()
+    database.pool = pool
+    pool.start()
+    return database
+
+
+class LazyDatabase(object):
+    """Proxy of a database which is connected on first attribute access, by
+    invoking ``connect``. Once connected, the proxy replaces itself with the
+    database in the ``container`` it was stored in under ``name``, so the
+    database is accessed directly from then on.
+
+    :param container:  database container holding the proxy
+    :param name:       name of the database within the container
+    :param connect:    callable returning the connected database
+    """
+    def __init__(self, container, name, connect):
+        self._container = container
+        self._name = name
+        self._connect = connect
+        self._database = None
+        self._lock = Semaphore()
+
+    @property
+    def is_connected(self):
+        return self._database is not None
+
+    def _resolve(self):
+        # the lock makes greenlets that access the database while it's still
+        # connecting wait, instead of connecting again
+        with self._lock:
+            if self._database is None:
+                self._database = self._connect()
+                self._container[self._name] = self._database
+        return self._database
+
+    def __getattr__(self, attr):
+        database = self._database
+        if database is None:
+            database = self._resolve()
+        return getattr(database, attr)
+
+    def close(self):
+        # there's nothing to close if it was never connected
+        if self._database is not None:
+            self._database.close()
+
+    def __repr__(self):
+        if self._database is None:
+            return '<LazyDatabase {0} (not connected)>'.format(self._name)
+        return repr(self._database)
+
+
+def get_pools(databases):
+    # not yet connected databases are skipped, so they're not connected only
+    # to look up their pools
+    return [(name, db.pool) for (name, db) in databases.items()
+            if not isinstance(db, LazyDatabase) and
+            isinstance(getattr(db, 'pool', None), ConnectionPool)]
+
+
+def get_pool_stats(databases):
+    """Return the statistics of the connection pools of ``databases`` mapped
+    to the names of the databases."""
+    return dict((name, pool.stats()) for (name, pool) in get_pools(databases))
+
+
+@contextlib.contextmanager
+def bind_connections(databases):
+    """Make the current greenlet keep the connections it checks out from the
+    pools of ``databases`` until the block exits."""
+    binds = []
+    try:
+        for (_, pool) in get_pools(databases):
+            bind = pool.bind()
+            bind.__enter__()
+            binds.append(bind)
+        yield
+    finally:
+        for bind in reversed(binds):
+            bind.__exit__(None, None, None)
+
+
+def connect_database(database_cls, db_config, host, port, user, password,
+                     debug=False, pool_options=None, connect_options=None,
+                     timing_options=None):
+    database = database_cls.connect(host=host,
+                                    port=port,
+                                    database=db_config['database'],
+                                    user=user,
+                                    password=password,
+                                    debug=debug,
+                                    **(connect_options or {}))
+    if pool_options is not None:
+        install_pool(database, pool_options)
+    if timing_options is not None:
+        database = TimedDatabase(database, **timing_options)
+    return database
+
+
 def get_databases(database_cls, container_cls, db_confs, host, port, user,
-                  password, debug=False):
+                  password, debug=False, pool_options=None,
+                  connect_options=None, timing_options=None):
     databases = dict((name,
-                      database_cls.connect(host=host,
-                                           port=port,
-                                           database=db_config['database'],
-                                           user=user,
-                                           password=password,
-                                           debug=debug))
+                      connect_database(database_cls,
+                                       db_config,
+                                       host,
+                                       port,
+                                       user,
+                                       password,
+                                       debug=debug,
+                                       pool_options=pool_options,
+                                       connect_options=connect_options,
+                                       timing_options=timing_options))
                      for name, db_config in db_confs.items())
     return container_cls(databases, debug=debug)
 
 
+def get_lazy_databases(container_cls, db_confs, connect, debug=False):
+    """Return a container of ``LazyDatabase`` proxies, which obtain their
+    databases by invoking ``connect(name, db_config)``."""
+    databases = container_cls({}, debug=debug)
+    for (name, db_config) in db_confs.items():
+        databases[name] = LazyDatabase(databases, name, functools.partial(
+            connect, name, db_config))
+    return databases
+
+
+def get_migration_package(db_name, db_config):
+    return '{0}.migrations.{1}'.format(db_config['package_name'], db_name)
+
+
+def run_migrations(migrate, database_configs, workers, pool_cls):
+    """Invoke ``migrate(name, config)`` for all database configs, using
+    a pool of the specified class to migrate up to ``workers`` databases
+    concurrently."""
+    items = list(database_configs.items())
+
+    def run(item):
+        start = time.time()
+        migrate(*item)
+        logging.debug('Migrations of %s done in %.3fs',
+                      item[0], time.time() - start)
+
+    workers = min(workers, len(items))
+    if workers < 2:
+        for item in items:
+            run(item)
+        return
+    pool = pool_cls(workers)
+    try:
+        pool.map(run, items)
+    finally:
+        # unlike thread pools, gevent pools do not need to be closed
+        if hasattr(pool, 'close'):
+            pool.close()
+        pool.join()
+
+
+def migrate_serverless(database_cls, database_configs, config,
+                       connect_options, workers):
+    """Migrate serverless databases in a thread pool. Each migration uses a
+    connection of its own, as connections cannot be shared between
+    threads."""
+    def migrate(db_name, db_config):
+        db = database_cls.connect(database=db_config['database'],
+                                  debug=bottle.DEBUG,
+                                  **connect_options)
+        try:
+            database_cls.migrate(db,
+                                 get_migration_package(db_name, db_config),
+                                 config)
+        finally:
+            db.close()
+
+    run_migrations(migrate, database_configs, workers, ThreadPool)
+
+
+def migrate_databases(database_cls, databases, database_configs, config,
+                      workers):
+    """Migrate already connected databases concurrently in greenlets."""
+    def migrate(db_name, db_config):
+        database_cls.migrate(databases[db_name],
+                             get_migration_package(db_name, db_config),
+                             config)
+
+    run_migrations(migrate, database_configs, workers, Pool)
+
+
 def init_databases(config):
+    """Return a container of all databases, migrated to the latest version.
+
+    Unless ``database.lazy`` is disabled, databases are connected and
+    migrated on first use. Otherwise it is done for all of them right away,
+    migrating up to ``database.migration_workers`` databases concurrently.
+    """
     (database_cls, container_cls) = import_squery(config)
     database_configs = get_database_configs(config)
-    if is_serverless(config):
+    serverless = is_serverless(config)
+    if serverless:
+        pool_options = None
+        connect_options = dict(
+            pragmas=get_pragmas(config),
+            pool_options=get_pool_options(config,
+                                          maxsize=DEFAULT_SQLITE_READERS))
         # Make sure all necessary directories are present
         for db_config in database_configs.values():
             ensure_dir(os.path.dirname(db_config['database']))
+    else:
+        pool_options = get_pool_options(config)
+        connect_options = None
+    timing_options = get_timing_options(config)
+    connect = functools.partial(connect_database,
+                                database_cls,
+                                host=config['database.host'],
+                                port=config['database.port'],
+                                user=config['database.user'],
+                                password=config['database.password'],
+                                debug=bottle.DEBUG,
+                                pool_options=pool_options,
+                                connect_options=connect_options,
+                                timing_options=timing_options)
 
-    databases = get_databases(database_cls,
-                              container_cls,
-                              database_configs,
-                              config['database.host'],
-                              config['database.port'],
-                              config['database.user'],
-                              config['database.password'],
-                              debug=bottle.DEBUG)
-    # Run migrations on all databases
-    for db_name, db_config in database_configs.items():
-        migration_pkg = '{0}.migrations.{1}'.format(db_config['package_name'],
-                                                    db_name)
-        database_cls.migrate(databases[db_name], migration_pkg, config)
+    if config.get('database.lazy', True):
+        def open_database(db_name, db_config):
+            database = connect(db_config)
+            # usually invoked while handling the first request using the
+            # database, which should not be charged with the migrations
+            with untimed():
+                database_cls.migrate(database,
+                                     get_migration_package(db_name,
+                                                           db_config),
+                                     config)
+            return database
+        return get_lazy_databases(container_cls,
+                                  database_configs,
+                                  open_database,
+                                  debug=bottle.DEBUG)
 
+    workers = int(config.get('database.migration_workers',
+                             DEFAULT_MIGRATION_WORKERS))
+    if serverless:
+        # migrating may delete and recreate the database files, so it's done
+        # before the connections that will be used later are opened
+        migrate_serverless(database_cls, database_configs, config,
+                           connect_options, workers)
+    databases = container_cls(dict((name, connect(db_config))
+                                   for (name, db_config)
+                                   in database_configs.items()),
+                              debug=bottle.DEBUG)
+    if not serverless:
+        migrate_databases(database_cls, databases, database_configs, config,
+                          workers)
     return databases
 
 
@@ -1,4 +1,4 @@
-from .commands import dump_tables
+from .commands import debug_db_pools, dump_tables
 from .helpers import close_databases, init_databases
 
 
@@ -20,6 +20,12 @@ def initialize(supervisor):
                                       dump_tables,
                                       '--dump-tables',
                                       action='store_true')
+    supervisor.exts.commands.register('debug_db_pools',
+                                      debug_db_pools,
+                                      '--debug-db-pools',
+                                      action='store_true',
+                                      help='log connection pool statistics '
+                                           'on shutdown')
 
 
 def component_member_loaded(supervisor, member, config):
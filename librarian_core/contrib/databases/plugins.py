@@ -2,12 +2,24 @@ import functools
 
 from bottle import request
 
+from .helpers import bind_connections
+from .timing import add_timing_headers
+
 
 def plugin(supervisor):
+    if supervisor.config.get('app.debug'):
+        # registered before the hooks of the plugins that depend on this one,
+        # which makes it run after them, so their queries are included
+        supervisor.app.hook('after_request')(add_timing_headers)
+
     def decorator(callback):
         @functools.wraps(callback)
         def wrapper(*args, **kwargs):
-            request.db = supervisor.exts.databases
-            return callback(*args, **kwargs)
+            databases = supervisor.exts.databases
+            request.db = databases
+            # the connections are returned to the pools once the response
+            # is ready, while hooks that run later check out their own
+            with bind_connections(databases):
+                return callback(*args, **kwargs)
         return wrapper
     return decorator
@@ -0,0 +1,339 @@
+"""
+pool.py: Gevent-aware connection pool
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import collections
+import contextlib
+import logging
+import time
+
+import gevent
+
+from gevent import getcurrent
+from gevent.lock import BoundedSemaphore
+
+
+DEFAULT_MINSIZE = 1
+DEFAULT_MAXSIZE = 10
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_CHECK_AFTER = 30
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the timeout."""
+    pass
+
+
+def check_connection(conn):
+    """Return whether ``conn`` is still usable, by running a trivial query
+    on it."""
+    if conn.closed:
+        return False
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT 1;')
+        finally:
+            cursor.close()
+        conn.rollback()
+    except Exception:
+        return False
+    return True
+
+
+class ConnectionPool(object):
+    """Pool of database connections shared by greenlets.
+
+    It provides the same interface as the pool of ``squery_pg``, so it can be
+    used by its ``Database`` objects in place of the original one. Idle
+    connections are reused most recently returned first, health checked if
+    they were not used for ``check_after`` seconds, and closed after
+    ``idle_timeout`` seconds, as long as at least ``minsize`` connections
+    remain open.
+
+    Within a ``bind`` block, the first connection obtained by a greenlet
+    stays checked out for it until the block exits, so all queries of a
+    request are run over the same connection.
+
+    :param connect:       callable which returns a new connection
+    :param minsize:       number of connections kept open at all times
+    :param maxsize:       maximum number of connections
+    :param idle_timeout:  seconds after which idle connections are closed
+    :param check_after:   seconds of idling after which a connection is
+                          checked before it's handed out
+    :param timeout:       seconds to wait for a connection before giving up
+                          with ``PoolTimeout``, or ``None`` to wait forever
+    :param check:         callable which returns whether a connection is
+                          usable
+    """
+    def __init__(self, connect, minsize=DEFAULT_MINSIZE,
+                 maxsize=DEFAULT_MAXSIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 check_after=DEFAULT_CHECK_AFTER, timeout=None,
+                 check=check_connection):
+        if not 0 <= minsize <= maxsize or maxsize < 1:
+            raise ValueError('Invalid pool size: {0}-{1}'.format(minsize,
+                                                                 maxsize))
+        self.connect = connect
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.timeout = timeout
+        self.check = check
+        self.closed = False
+        # number of open connections, idle and checked out
+        self.size = 0
+        self.in_use = 0
+        # one slot per connection that may be checked out
+        self._slots = BoundedSemaphore(maxsize)
+        # (connection, returned at) pairs, the most recently returned last
+        self._idle = collections.deque()
+        # greenlets within a ``bind`` block mapped to their connection
+        self._bound = dict()
+        # checked out connections mapped to the nesting level of the
+        # ``connection`` blocks using them
+        self._depth = dict()
+        self._reaper = None
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+        self._peak = 0
+
+    def start(self):
+        """Open ``minsize`` connections and start closing the ones which
+        idle for too long in the background."""
+        self._fill()
+        if self._reaper is None:
+            self._reaper = gevent.spawn(self._reap_periodically)
+
+    def _fill(self):
+        while self.size < self.minsize:
+            self._idle.appendleft((self.connect(), time.time()))
+            self.size += 1
+
+    def _discard(self, conn):
+        self.size -= 1
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _get_idle(self):
+        while self._idle:
+            (conn, since) = self._idle.pop()
+            if conn.closed:
+                self._discard(conn)
+            elif (time.time() - since >= self.check_after and
+                    not self.check(conn)):
+                logging.debug('Discarding broken connection %r', conn)
+                self._discard(conn)
+            else:
+                return conn
+        return None
+
+    def _acquire(self):
+        if self.closed:
+            raise RuntimeError('Connection pool is closed')
+        start = time.time()
+        if self._slots.locked():
+            self._waits += 1
+        if not self._slots.acquire(timeout=self.timeout):
+            self._timeouts += 1
+            raise PoolTimeout('No connection available after {0}s'.format(
+                self.timeout))
+        waited = time.time() - start
+        self._wait_time += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._checkouts += 1
+        try:
+            conn = self._get_idle()
+            if conn is None:
+                conn = self.connect()
+                self.size += 1
+        except Exception:
+            self._slots.release()
+            raise
+        self.in_use += 1
+        self._peak = max(self._peak, self.in_use)
+        return conn
+
+    def _release(self, conn):
+        self.in_use -= 1
+        if self.closed or conn.closed:
+            self._discard(conn)
+        else:
+            self._idle.append((conn, time.time()))
+        self._slots.release()
+
+    def get(self):
+        greenlet = getcurrent()
+        conn = self._bound.get(greenlet)
+        if conn is not None:
+            return conn
+        conn = self._acquire()
+        if greenlet in self._bound:
+            self._bound[greenlet] = conn
+        return conn
+
+    def put(self, conn, greenlet=None):
+        """Return ``conn`` to the pool. If it's returned by another greenlet
+        than the one that obtained it, e.g. when a cursor over it is garbage
+        collected, the latter is passed as ``greenlet``."""
+        greenlet = greenlet or getcurrent()
+        if self._bound.get(greenlet) is conn:
+            if not conn.closed:
+                # returned to the pool when the ``bind`` block exits
+                return
+            self._bound[greenlet] = None
+        self._release(conn)
+
+    @contextlib.contextmanager
+    def bind(self):
+        """Keep the connection obtained first by the current greenlet
+        checked out for it until the block exits. Nested blocks have no
+        effect."""
+        greenlet = getcurrent()
+        if greenlet in self._bound:
+            yield
+            return
+        self._bound[greenlet] = None
+        try:
+            yield
+        finally:
+            conn = self._bound.pop(greenlet)
+            if conn is not None:
+                self._release(conn)
+
+    def reap(self):
+        """Close connections which have been idle for longer than
+        ``idle_timeout``, and reopen connections if there are less than
+        ``minsize``."""
+        now = time.time()
+        while (self._idle and self.size > self.minsize and
+               now - self._idle[0][1] >= self.idle_timeout):
+            (conn, _) = self._idle.popleft()
+            self._discard(conn)
+        self._fill()
+
+    def _reap_periodically(self):
+        while not self.closed:
+            gevent.sleep(max(self.idle_timeout / 2.0, 1))
+            try:
+                self.reap()
+            except Exception:
+                logging.exception('Error while maintaining connection pool')
+
+    def closeall(self):
+        """Close all idle connections and stop handing out new ones.
+        Connections which are checked out are closed when returned."""
+        self.closed = True
+        if self._reaper is not None:
+            self._reaper.kill(block=False)
+            self._reaper = None
+        while self._idle:
+            (conn, _) = self._idle.pop()
+            self._discard(conn)
+
+    def stats(self):
+        """Return a dict of the current utilization of the pool and the time
+        spent waiting for connections, in seconds."""
+        return dict(size=self.size,
+                    in_use=self.in_use,
+                    idle=len(self._idle),
+                    minsize=self.minsize,
+                    maxsize=self.maxsize,
+                    peak=self._peak,
+                    utilization=self.in_use / float(self.maxsize),
+                    checkouts=self._checkouts,
+                    waits=self._waits,
+                    wait_time=self._wait_time,
+                    avg_wait=self._wait_time / (self._checkouts or 1),
+                    max_wait=self._max_wait,
+                    timeouts=self._timeouts,
+                    discarded=self._discarded)
+
+    @contextlib.contextmanager
+    def connection(self, isolation_level=None):
+        """Check out a connection, committing the transaction when the block
+        exits, or rolling it back if it raises. Only the outermost block
+        commits when blocks using the same connection are nested."""
+        conn = self.get()
+        depth = self._depth.get(conn, 0)
+        self._depth[conn] = depth + 1
+        previous_level = None
+        try:
+            if (isolation_level is not None and
+                    conn.isolation_level != isolation_level):
+                previous_level = conn.isolation_level
+                conn.set_isolation_level(isolation_level)
+            yield conn
+        except BaseException:
+            # also when the greenlet is killed, so the connection is not
+            # returned to the pool in the middle of a transaction
+            if not depth and not conn.closed:
+                self._rollback(conn)
+            raise
+        else:
+            if not depth:
+                conn.commit()
+        finally:
+            if depth:
+                self._depth[conn] = depth
+            else:
+                del self._depth[conn]
+            if previous_level is not None and not conn.closed:
+                conn.set_isolation_level(previous_level)
+            self.put(conn)
+
+    def _rollback(self, conn):
+        try:
+            conn.rollback()
+        except Exception:
+            logging.exception('Rollback failed, closing connection %r', conn)
+            conn.close()
+
+    @contextlib.contextmanager
+    def cursor(self, *args, **kwargs):
+        isolation_level = kwargs.pop('isolation_level', None)
+        with self.connection(isolation_level) as conn:
+            yield conn.cursor(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        with self.cursor(**kwargs) as cursor:
+            cursor.execute(*args)
+            return cursor.rowcount
+
+    def executemany(self, *args, **kwargs):
+        with self.cursor(**kwargs) as cursor:
+            cursor.executemany(*args)
+            return cursor.rowcount
+
+    def fetchone(self, *args, **kwargs):
+        with self.cursor(**kwargs) as cursor:
+            cursor.execute(*args)
+            return cursor.fetchone()
+
+    def fetchall(self, *args, **kwargs):
+        with self.cursor(**kwargs) as cursor:
+            cursor.execute(*args)
+            return cursor.fetchall()
+
+    def fetchiter(self, *args, **kwargs):
+        with self.cursor(**kwargs) as cursor:
+            cursor.execute(*args)
+            while True:
+                items = cursor.fetchmany()
+                if not items:
+                    break
+                for item in items:
+                    yield item
@@ -2,10 +2,76 @@ import datetime
 import json
 import re
 
-from .utils import to_datetime
+from dateutil.tz import tzoffset, tzutc
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-NUMERIC_RE = re.compile(r'^[\d\.]+$')
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+
+try:
+    STRING_TYPES = basestring
+except NameError:
+    STRING_TYPES = str
+
+# datetimes in the format written by ``datetime.isoformat``, also allowing a
+# 'Z' suffix, and offsets without a colon
+ISO_DATETIME_RE = re.compile(r'^(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)'
+                             r'(?:\.(\d{1,6})\d*)?'
+                             r'(?:(Z)|([+-])(\d\d):?(\d\d))?$')
+UTC = tzutc()
+
+
+def parse_datetime(value):
+    """Convert an ISO 8601 formatted datetime string to a datetime object, or
+    return the original value if it's not such a string."""
+    match = ISO_DATETIME_RE.match(value)
+    if not match:
+        return value
+    (year, month, day, hour, minute, second, fraction, zulu, sign, tz_hours,
+     tz_minutes) = match.groups()
+    if zulu:
+        tzinfo = UTC
+    elif sign:
+        offset = int(tz_hours) * 3600 + int(tz_minutes) * 60
+        if sign == '-':
+            offset = -offset
+        tzinfo = tzoffset(None, offset) if offset else UTC
+    else:
+        tzinfo = None
+    microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+    try:
+        return datetime.datetime(int(year),
+                                 int(month),
+                                 int(day),
+                                 int(hour),
+                                 int(minute),
+                                 int(second),
+                                 microsecond,
+                                 tzinfo)
+    except ValueError:
+        # matched the format, but e.g. the month is out of range
+        return value
+
+
+def decode_object(obj):
+    """Convert the datetime strings among the values of ``obj``, keeping the
+    original values if they're not datetimes."""
+    for key, value in obj.items():
+        if isinstance(value, STRING_TYPES):
+            obj[key] = parse_datetime(value)
+    return obj
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -18,6 +84,9 @@ class DateTimeEncoder(json.JSONEncoder):
 
 
 class DateTimeDecoder(json.JSONDecoder):
+    """Decoder converting strings written by ``DateTimeEncoder`` back to
+    datetime objects. Other strings are left alone, including ones which
+    represent dates in other formats."""
 
     def __init__(self, *args, **kargs):
         super(DateTimeDecoder, self).__init__(object_hook=self.object_hook,
@@ -25,8 +94,145 @@ class DateTimeDecoder(json.JSONDecoder):
                                               **kargs)
 
     def object_hook(self, obj):
-        for key, value in obj.items():
-            # keeps original value if not datetime
-            obj[key] = to_datetime(value)
+        return decode_object(obj)
+
+
+def encode_default(obj):
+    """Serialize objects that JSON has no type for, the same way
+    ``DateTimeEncoder`` does."""
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    raise TypeError('{0!r} is not JSON serializable'.format(obj))
+
+
+def encode_datetimes(obj):
+    """Return a copy of ``obj`` with the datetime objects within it replaced
+    by ISO 8601 strings, for formats which have no datetime type."""
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    if isinstance(obj, dict):
+        return dict((key, encode_datetimes(value))
+                    for (key, value) in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [encode_datetimes(item) for item in obj]
+    return obj
+
+
+def decode_datetimes(obj):
+    """Convert the datetime strings within the decoded ``obj`` in place, the
+    same way ``DateTimeDecoder`` does, for backends without object hooks."""
+    if isinstance(obj, dict):
+        for value in obj.values():
+            if isinstance(value, (dict, list)):
+                decode_datetimes(value)
+        decode_object(obj)
+    elif isinstance(obj, list):
+        for item in obj:
+            if isinstance(item, (dict, list)):
+                decode_datetimes(item)
+    return obj
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, cls=DateTimeEncoder)
+
+
+def stdlib_loads(s, datetimes=True):
+    if datetimes:
+        return json.loads(s, cls=DateTimeDecoder)
+    return json.loads(s)
+
+
+if orjson is not None:
+    # dates, times and dataclasses are passed to ``encode_default``, so they
+    # are serialized the same way regardless of the backend
+    ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS |
+                      orjson.OPT_PASSTHROUGH_DATETIME |
+                      orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+def orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj,
+                            default=encode_default,
+                            option=ORJSON_OPTIONS).decode('utf8')
+    except TypeError:
+        # e.g. integers which do not fit in 64 bits
+        return stdlib_dumps(obj)
+
+
+def orjson_loads(s, datetimes=True):
+    try:
+        obj = orjson.loads(s)
+    except ValueError:
+        # e.g. NaN, which is not valid JSON, but accepted by the stdlib
+        return stdlib_loads(s, datetimes)
+    return decode_datetimes(obj) if datetimes else obj
+
+
+def ujson_dumps(obj):
+    return ujson.dumps(obj, default=encode_default)
+
+
+def ujson_loads(s, datetimes=True):
+    obj = ujson.loads(s)
+    return decode_datetimes(obj) if datetimes else obj
+
+
+def simplejson_dumps(obj):
+    return simplejson.dumps(obj, default=encode_default)
+
+
+def simplejson_loads(s, datetimes=True):
+    if datetimes:
+        return simplejson.loads(s, object_hook=decode_object)
+    return simplejson.loads(s)
+
+
+def has_ujson_default():
+    # the ``default`` argument is supported by more recent versions only
+    try:
+        ujson.dumps(None, default=encode_default)
+    except TypeError:
+        return False
+    return True
+
+
+def has_simplejson_speedups():
+    # without its C extension, simplejson is slower than the stdlib
+    return simplejson._import_c_make_encoder() is not None
+
+
+# backends in the order of preference, as (name, dumps, loads, available)
+BACKENDS = (
+    ('orjson', orjson_dumps, orjson_loads,
+     lambda: orjson is not None),
+    ('ujson', ujson_dumps, ujson_loads,
+     lambda: ujson is not None and has_ujson_default()),
+    ('simplejson', simplejson_dumps, simplejson_loads,
+     lambda: simplejson is not None and has_simplejson_speedups()),
+    ('json', stdlib_dumps, stdlib_loads,
+     lambda: True),
+)
+
+backend = None
+dumps = None
+loads = None
+
+
+def use_backend(name=None):
+    """Serialize with the backend called ``name``, or the fastest one which
+    is available if no name is passed. Regardless of the backend, datetime
+    objects are serialized as ISO 8601 strings, and converted back when
+    deserializing, unless ``loads`` is invoked with ``datetimes=False``."""
+    global backend, dumps, loads
+    for (backend_name, backend_dumps, backend_loads, available) in BACKENDS:
+        if name in (None, backend_name) and available():
+            (backend, dumps, loads) = (backend_name,
+                                       backend_dumps,
+                                       backend_loads)
+            return backend
+    raise ValueError('JSON backend not available: {0}'.format(name))
+
 
-        return obj
+use_backend()
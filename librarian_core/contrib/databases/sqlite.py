@@ -0,0 +1,279 @@
+"""
+sqlite.py: SQLite databases with a single writer and pooled readers
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import contextlib
+import importlib
+import logging
+import os
+import re
+import sqlite3
+
+from gevent import getcurrent
+from gevent.lock import RLock
+from squery_lite import migrations, squery
+
+from .pool import ConnectionPool
+
+
+READ_RE = re.compile(r'^\s*SELECT\b', re.I)
+
+
+def get_latest_migration(package):
+    """Return the ``(major, minor)`` version of the newest migration in the
+    migrations ``package``, which is looked up without importing it."""
+    (parent, _, name) = package.rpartition('.')
+    parent_dir = os.path.dirname(importlib.import_module(parent).__file__)
+    versions = [(int(match.group(2)), int(match.group(3)))
+                for match in map(migrations.PYMOD_RE.match,
+                                 os.listdir(os.path.join(parent_dir, name)))
+                if match]
+    return max(versions) if versions else (0, 0)
+
+
+def migrate(db, package, conf={}):
+    """Run the migrations of ``package`` which have not been run yet. If the
+    recorded version is already the newest one, the migrations package is
+    not imported at all."""
+    version = db.query(migrations.GET_VERSION_SQL).result[0]
+    if version:
+        current = migrations.unpack_version(version)
+        if current >= get_latest_migration(package):
+            logging.debug('Migration version for %s is current', package)
+            return
+    migrations.migrate(db, package, conf)
+
+
+class Connection(squery.Connection):
+    """Connection which sets the passed in pragmas each time it connects.
+
+    :param path:       path of the database file
+    :param pragmas:    iterable of ``(name, value)`` pairs
+    :param read_only:  reject writes on this connection
+    """
+    def __init__(self, path, pragmas=(), read_only=False):
+        self.pragmas = list(pragmas)
+        if read_only:
+            self.pragmas.append(('query_only', 'ON'))
+        super(Connection, self).__init__(path)
+
+    def connect(self):
+        super(Connection, self).connect()
+        cursor = self._conn.cursor()
+        for (name, value) in self.pragmas:
+            cursor.execute('PRAGMA {0}={1};'.format(name, value))
+        object.__setattr__(self, 'closed', False)
+
+    def close(self):
+        super(Connection, self).close()
+        object.__setattr__(self, 'closed', True)
+
+    def new(self):
+        return self.__class__(self.path, pragmas=self.pragmas)
+
+
+class ReaderCursor(squery.Cursor):
+    """Cursor over a connection checked out from the reader ``pool``, which
+    is returned to the pool once all rows are fetched, or the cursor is
+    closed."""
+    def __init__(self, connection, pool, debug=False):
+        super(ReaderCursor, self).__init__(connection, debug=debug)
+        self._pool = pool
+        self._greenlet = getcurrent()
+
+    def close(self):
+        if self._pool is None:
+            return
+        (pool, self._pool) = (self._pool, None)
+        try:
+            # an unfinished statement would keep the reader on its snapshot
+            self.cursor.close()
+        finally:
+            pool.put(self.conn, greenlet=self._greenlet)
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def results(self):
+        try:
+            return self.cursor.fetchall()
+        finally:
+            self.close()
+
+    @property
+    def result(self):
+        row = self.cursor.fetchone()
+        if row is None:
+            self.close()
+        return row
+
+    def __iter__(self):
+        try:
+            for row in self.cursor:
+                yield row
+        finally:
+            self.close()
+
+
+class Database(squery.Database):
+    """Database which runs SELECT queries over a pool of read-only
+    connections, and everything else over a single writer connection.
+
+    In WAL mode, readers see the last committed state of the database and
+    are not blocked by writes in progress. Greenlets take turns writing:
+    while one is within a ``transaction`` block, writes of the others wait
+    for it to finish, instead of becoming part of its transaction. Within
+    its own transaction, a greenlet reads over the writer connection, so it
+    sees its uncommitted changes.
+
+    It also provides the ``fetchone``, ``fetchall`` and ``fetchiter``
+    methods of the PostgreSQL databases.
+
+    The reader pool is created on first use.
+
+    :param conn:          writer ``Connection``
+    :param pool_options:  keyword arguments of the reader ``ConnectionPool``
+    """
+    migrate = staticmethod(migrate)
+    # wrapper of values stored as blobs
+    Binary = staticmethod(sqlite3.Binary)
+
+    def __init__(self, conn, pool_options=None, debug=False):
+        super(Database, self).__init__(conn, debug=debug)
+        self.pool_options = pool_options or dict()
+        self.lock = RLock()
+        self.writer = None
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = self._create_pool()
+        return self._pool
+
+    def _create_pool(self):
+        conn = self.conn
+
+        def connect():
+            return Connection(conn.path, pragmas=conn.pragmas, read_only=True)
+
+        pool = ConnectionPool(connect, **self.pool_options)
+        pool.start()
+        return pool
+
+    def _is_read(self, qry):
+        if self.writer is getcurrent():
+            return False
+        if hasattr(qry, 'serialize'):
+            qry = qry.serialize()
+        return bool(READ_RE.match(qry))
+
+    @contextlib.contextmanager
+    def _reader(self):
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def _read(self, method, qry, *args, **kwargs):
+        """Run ``qry`` over a reader connection, which stays checked out
+        until the returned ``ReaderCursor`` is exhausted or closed."""
+        conn = self.pool.get()
+        try:
+            cursor = ReaderCursor(conn, self.pool, debug=self.debug)
+        except Exception:
+            self.pool.put(conn)
+            raise
+        try:
+            return getattr(cursor, method)(qry, *args, **kwargs)
+        except Exception:
+            cursor.close()
+            raise
+
+    def query(self, qry, *params, **kwparams):
+        if self._is_read(qry):
+            return self._read('query', qry, *params, **kwparams)
+        with self.lock:
+            return super(Database, self).query(qry, *params, **kwparams)
+
+    def execute(self, qry, *args, **kwargs):
+        if self._is_read(qry):
+            return self._read('execute', qry, *args, **kwargs)
+        with self.lock:
+            return super(Database, self).execute(qry, *args, **kwargs)
+
+    def executemany(self, qry, *args, **kwargs):
+        with self.lock:
+            return super(Database, self).executemany(qry, *args, **kwargs)
+
+    def executescript(self, sql):
+        with self.lock:
+            return super(Database, self).executescript(sql)
+
+    def fetchone(self, qry, *args, **kwargs):
+        if self._is_read(qry):
+            # rows are fetched while the reader is still checked out
+            with self._reader() as conn:
+                cursor = self.cursor(connection=conn)
+                try:
+                    return cursor.execute(qry, *args, **kwargs).result
+                finally:
+                    # an unfinished statement would keep the reader on its
+                    # snapshot
+                    cursor.cursor.close()
+        cursor = self.execute(qry, *args, **kwargs)
+        try:
+            return cursor.result
+        finally:
+            cursor.cursor.close()
+
+    def fetchall(self, qry, *args, **kwargs):
+        if self._is_read(qry):
+            with self._reader() as conn:
+                cursor = self.cursor(connection=conn)
+                return cursor.execute(qry, *args, **kwargs).results
+        return self.execute(qry, *args, **kwargs).results
+
+    def fetchiter(self, qry, *args, **kwargs):
+        # ``ReaderCursor`` returns the reader once it's exhausted
+        return iter(self.execute(qry, *args, **kwargs))
+
+    @contextlib.contextmanager
+    def transaction(self, *args, **kwargs):
+        with self.lock:
+            writer = self.writer
+            self.writer = getcurrent()
+            try:
+                with super(Database, self).transaction(*args,
+                                                       **kwargs) as cursor:
+                    yield cursor
+            finally:
+                self.writer = writer
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+        return super(Database, self).close()
+
+    @classmethod
+    def connect(cls, database, pragmas=(), pool_options=None, debug=False,
+                **kwargs):
+        return cls(Connection(database, pragmas=pragmas),
+                   pool_options=pool_options,
+                   debug=debug)
+
+
+class DatabaseContainer(dict):
+
+    def __init__(self, databases, **kwargs):
+        super(DatabaseContainer, self).__init__(databases)
+        self.__dict__ = self
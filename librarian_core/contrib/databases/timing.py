@@ -0,0 +1,132 @@
+"""
+timing.py: Timing of database queries
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import contextlib
+import logging
+import time
+
+from bottle import request, response
+
+
+class QueryStats(object):
+    """Number of queries executed while handling a request, and the total
+    time they took in seconds."""
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def get_request_stats():
+    """Return the ``QueryStats`` of the current request, or ``None`` if
+    there is no request being handled in the current thread."""
+    try:
+        return request.db_queries
+    except AttributeError:
+        stats = request.db_queries = QueryStats()
+        return stats
+    except RuntimeError:
+        return None
+
+
+@contextlib.contextmanager
+def untimed():
+    """Leave the queries run within the block out of the statistics of the
+    current request, e.g. the migrations of a database connected on first
+    use."""
+    stats = get_request_stats()
+    if stats is None:
+        yield
+        return
+    (count, duration) = (stats.count, stats.duration)
+    try:
+        yield
+    finally:
+        (stats.count, stats.duration) = (count, duration)
+
+
+def to_sql(qry):
+    return qry.serialize() if hasattr(qry, 'serialize') else qry
+
+
+def timed(name):
+    """Return a method which invokes the method ``name`` of the wrapped
+    database, and records how long it took."""
+    def method(self, qry, *args, **kwargs):
+        start = time.time()
+        try:
+            return getattr(self.database, name)(qry, *args, **kwargs)
+        finally:
+            self.record(qry, time.time() - start)
+    method.__name__ = name
+    return method
+
+
+class TimedDatabase(object):
+    """Wrapper of a database which counts the executed queries per request,
+    and logs the ones that take longer than ``threshold`` seconds. All other
+    attributes are looked up on the wrapped ``database``.
+
+    Queries run on cursors obtained from the database directly, e.g. within
+    ``transaction`` blocks, are not included.
+    """
+    def __init__(self, database, threshold=None):
+        self.database = database
+        self.threshold = threshold
+
+    def record(self, qry, duration):
+        stats = get_request_stats()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+        if self.threshold is not None and duration >= self.threshold:
+            logging.warning('Slow query (%.3fs): %s', duration, to_sql(qry))
+
+    query = timed('query')
+    execute = timed('execute')
+    executemany = timed('executemany')
+    executescript = timed('executescript')
+    fetchone = timed('fetchone')
+    fetchall = timed('fetchall')
+
+    def fetchiter(self, qry, *args, **kwargs):
+        # only the time spent fetching the rows is included, not the time
+        # the caller spends processing them
+        duration = 0.0
+        rows = iter(self.database.fetchiter(qry, *args, **kwargs))
+        try:
+            while True:
+                start = time.time()
+                try:
+                    row = next(rows)
+                finally:
+                    duration += time.time() - start
+                yield row
+        except StopIteration:
+            pass
+        finally:
+            self.record(qry, duration)
+
+    def __getattr__(self, attr):
+        return getattr(self.database, attr)
+
+    def __repr__(self):
+        return '<TimedDatabase {0!r}>'.format(self.database)
+
+
+def add_timing_headers():
+    """Report the queries of the current request in the response headers."""
+    stats = get_request_stats()
+    if stats is None:
+        return
+    response.set_header('X-DB-Queries', str(stats.count))
+    response.add_header('Server-Timing', 'db;dur={0:.1f};desc="{1} '
+                        'queries"'.format(stats.duration * 1000, stats.count))
@@ -40,5 +40,13 @@ def to_csv(values):
     return ','.join(values)
 
 
+def to_binary(db, value):
+    """Wrap the bytes ``value`` so the driver of ``db`` stores it as binary.
+    Databases may provide a ``Binary`` wrapper of their own, and the others
+    get a ``bytearray``, which psycopg2 stores as ``bytea``."""
+    binary = getattr(db, 'Binary', bytearray)
+    return binary(value)
+
+
 def row_to_dict(row):
     return dict((key, row[key]) for key in row.keys()) if row else {}
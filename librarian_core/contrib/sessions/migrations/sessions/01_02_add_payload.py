@@ -0,0 +1,7 @@
+SQL = """
+alter table sessions add column payload bytea;  -- binary session data
+"""
+
+
+def up(db, conf):
+    db.executescript(SQL)
@@ -0,0 +1,99 @@
+"""
+payload.py: Binary format of the stored session data
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import marshal
+import struct
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from ..databases.serializers import encode_datetimes, encode_default
+
+
+# the payload starts with the version of the format, which identifies how
+# the rest is encoded, followed by flags
+HEADER = struct.Struct('!BB')
+VERSION_MSGPACK = 1
+VERSION_MARSHAL = 2
+FLAG_ZLIB = 1
+# version 2 of the marshal format is understood by all supported Pythons
+MARSHAL_VERSION = 2
+DEFAULT_COMPRESS_THRESHOLD = 512
+
+
+class PayloadError(ValueError):
+    """Raised when a payload cannot be decoded."""
+    pass
+
+
+def encode(data):
+    """Return the format version and the encoded ``data``, using msgpack if
+    it's installed, and marshal otherwise. Datetime objects are encoded as
+    ISO 8601 strings either way.
+
+    marshal is only a fallback, since it's not meant for data that may have
+    been tampered with."""
+    if msgpack is not None:
+        return (VERSION_MSGPACK, msgpack.packb(data,
+                                               default=encode_default,
+                                               use_bin_type=True))
+    return (VERSION_MARSHAL, marshal.dumps(encode_datetimes(data),
+                                           MARSHAL_VERSION))
+
+
+def decode(version, body):
+    if version == VERSION_MSGPACK:
+        if msgpack is None:
+            raise PayloadError('msgpack is required to decode the payload')
+        return msgpack.unpackb(body, raw=False)
+    if version == VERSION_MARSHAL:
+        try:
+            return marshal.loads(body)
+        except (EOFError, TypeError, ValueError) as exc:
+            raise PayloadError('Invalid marshal data: {0}'.format(exc))
+    raise PayloadError('Unknown payload version: {0}'.format(version))
+
+
+def pack(data, compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """Return ``data`` as a binary payload. Encoded data longer than
+    ``compress_threshold`` bytes is compressed with zlib, if that makes it
+    shorter. Pass ``None`` to never compress."""
+    (version, body) = encode(data)
+    flags = 0
+    if compress_threshold is not None and len(body) > compress_threshold:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= FLAG_ZLIB
+    return HEADER.pack(version, flags) + body
+
+
+def unpack(payload):
+    """Return the data stored in the binary ``payload``. Raises
+    ``PayloadError`` if it cannot be decoded, or does not hold a mapping."""
+    payload = bytes(payload)
+    if len(payload) < HEADER.size:
+        raise PayloadError('Payload is too short')
+    (version, flags) = HEADER.unpack_from(payload)
+    body = payload[HEADER.size:]
+    try:
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        data = decode(version, body)
+    except PayloadError:
+        raise
+    except Exception as exc:
+        raise PayloadError('Invalid payload: {0}'.format(exc))
+    if not isinstance(data, dict):
+        raise PayloadError('Payload does not hold a mapping')
+    return data
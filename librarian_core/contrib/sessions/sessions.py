@@ -9,14 +9,18 @@ file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
 """
 
 import uuid
-import json
+import logging
 import datetime
 import functools
 
 from bottle import request, response
 from bottle_utils.common import basestring
 
-from ..databases.utils import utcnow
+from ..databases import serializers
+from ..databases.utils import to_binary, utcnow
+
+from .payload import (DEFAULT_COMPRESS_THRESHOLD, PayloadError, pack,
+                      unpack)
 
 
 class SessionError(Exception):
@@ -46,13 +50,22 @@ def modifies(func):
 
 
 class Session(object):
-    """ Represents a user session """
+    """ Represents a user session
+
+    Session data is stored as a binary ``payload``. Sessions stored as JSON
+    in the ``data`` column before are still loaded, and converted when saved
+    again.
+    """
     modifiable_attributes = ('id', 'expires', 'data')
 
-    def __init__(self, session_id, data, expires, modified=False):
+    def __init__(self, session_id, data, expires, modified=False,
+                 payload=None):
         self.id = session_id
         self.expires = expires
-        self.data = self._load(data)
+        if payload is not None:
+            self.data = self._load_payload(payload)
+        else:
+            self.data = self._load(data)
         self.modified = modified
 
     # Serialization
@@ -60,25 +73,36 @@ class Session(object):
     def _load(self, s):
         """ Load data from buffer """
         if isinstance(s, basestring):
-            return json.loads(s)
+            return serializers.loads(s, datetimes=False)
 
         if isinstance(s, dict):
             return s
 
         return {}
 
-    def _dump(self):
-        return json.dumps(self.data)
+    def _load_payload(self, payload):
+        """ Load data from binary payload """
+        try:
+            return unpack(payload)
+        except PayloadError as exc:
+            logging.warning('Discarding data of session %s: %s', self.id, exc)
+            return {}
+
+    def _dump(self, compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+        return pack(self.data, compress_threshold)
 
     # Session management
 
     def save(self):
         db = request.db.sessions
+        threshold = request.app.config.get('session.compress_threshold',
+                                           DEFAULT_COMPRESS_THRESHOLD)
         query = db.Replace('sessions',
                            constraints=['session_id'],
-                           cols=['session_id', 'data', 'expires'])
+                           cols=['session_id', 'data', 'payload', 'expires'])
         db.execute(query, dict(session_id=self.id,
-                               data=self._dump(),
+                               data=None,
+                               payload=to_binary(db, self._dump(threshold)),
                                expires=self.expires))
         self.modified = False
         return self
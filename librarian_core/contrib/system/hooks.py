@@ -1,14 +1,20 @@
-from .commands import display_version
-from .routes import error_403, error_404, error_500, error_503
+from ...dependencies import LazyFunction
+
+
+# error handlers render templates, so their module is imported only when the
+# first error occurs
+ROUTES_MODULE = '.'.join([__package__, 'routes'])
+COMMANDS_MODULE = '.'.join([__package__, 'commands'])
 
 
 def initialize(supervisor):
-    supervisor.app.error(403)(error_403)
-    supervisor.app.error(404)(error_404)
-    supervisor.app.error(500)(error_500)
-    supervisor.app.error(503)(error_503)
+    for code in (403, 404, 500, 503):
+        handler = LazyFunction(ROUTES_MODULE, 'error_{0}'.format(code))
+        supervisor.app.error(code)(handler)
     supervisor.exts.commands.register('version',
-                                      display_version,
+                                      LazyFunction(COMMANDS_MODULE,
+                                                   'display_version'),
                                       '--version',
                                       action='store_true',
+                                      early=True,
                                       help='print out version number and exit')
@@ -1,5 +1,3 @@
-import datetime
-import json
 import os
 
 import bottle
@@ -8,20 +6,12 @@ from bottle_utils import csrf
 from bottle_utils import html
 from bottle_utils.common import to_unicode, html_escape, attr_escape
 
+from ..databases import serializers
 from .decorators import template_helper
 
 
-class DateTimeCapableEncoder(json.JSONEncoder):
-
-    def default(self, obj):
-        if isinstance(obj, datetime.datetime):
-            return obj.isoformat()
-
-        return super(DateTimeCapableEncoder, self).default(obj)
-
-
 def json_dumps(s):
-    return json.dumps(s, cls=DateTimeCapableEncoder)
+    return serializers.dumps(s)
 
 
 def install_view_root(pkg_path, view_path):
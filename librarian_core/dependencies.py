@@ -1,10 +1,16 @@
+import ast
 import collections
+import hashlib
+import heapq
 import importlib
+import json
 import logging
 import os
 import pkgutil
 import sys
 
+from . import __version__
+
 
 class UnresolvableDependency(Exception):
     """Exception raised if a component referenced as another's dependency is
@@ -26,6 +32,89 @@ def module_name(mod):
     return mod.__name__.split('.')[-1]
 
 
+def noop(supervisor):
+    pass
+
+
+class LazyFunction(object):
+    """Stand-in for the function ``name`` of the module found at
+    ``mod_path``, which imports the module only when it's invoked for the
+    first time. It carries the same ``__module__`` and ``__name__`` as the
+    function it represents, so it can be subscribed to events in its place.
+    """
+    # may be replaced to measure the time spent importing modules
+    import_module = staticmethod(importlib.import_module)
+
+    def __init__(self, mod_path, name):
+        self.__module__ = mod_path
+        self.__name__ = name
+        self._fn = None
+
+    def resolve(self):
+        if self._fn is None:
+            mod = self.import_module(self.__module__)
+            self._fn = getattr(mod, self.__name__)
+        return self._fn
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return '<LazyFunction {0}.{1}>'.format(self.__module__, self.__name__)
+
+
+def get_bound_names(node):
+    """Return the set of names bound by the statement ``node`` in the
+    namespace of the module it belongs to."""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, (ast.FunctionDef, ast.ClassDef)):
+            names.add(child.name)
+        elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+            names.add(child.id)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            for alias in child.names:
+                names.add(alias.asname or alias.name.split('.')[0])
+    return names
+
+
+def scan_module(path):
+    """Find the ``EXPORTS`` specification and the plain functions of the
+    module at ``path`` by parsing its source, without importing it.
+
+    Returns a ``(exports, functions, others)`` tuple, where ``exports`` is
+    ``None`` if the module does not define it, ``functions`` is the set of
+    names of undecorated functions defined at module level and ``others`` is
+    the set of all other names the module binds, which can only be
+    determined by importing it. Returns ``None`` if ``EXPORTS`` is not a
+    literal or the module uses star imports.
+    """
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), path)
+    exports = None
+    functions = set()
+    others = set()
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and any(alias.name == '*'
+                                                    for alias in node.names):
+            return None
+        if isinstance(node, ast.FunctionDef) and not node.decorator_list:
+            functions.add(node.name)
+            others.discard(node.name)
+            continue
+        names = get_bound_names(node)
+        if 'EXPORTS' in names:
+            if not (isinstance(node, ast.Assign) and len(node.targets) == 1):
+                return None
+            try:
+                exports = ast.literal_eval(node.value)
+            except ValueError:
+                return None
+        functions.difference_update(names)
+        others.update(names)
+    return (exports, functions, others)
+
+
 class DependencyLoader(object):
     """Components may define an `EXPORTS` section in each of their significant
     modules, which are inspected during component loading. If it's omitted, a
@@ -39,91 +128,165 @@ class DependencyLoader(object):
             'required_by': ['first_pkg.a_mod.a_fn']
         }
     }
+
+    If ``cache_path`` is specified, the resolved order is stored in it, and
+    reused as long as the list of components, their versions and the
+    modification times of their modules stay the same.
     """
-    def __init__(self, components, component_meta):
+    NOOP = 'noop'
+    LAZY = 'lazy'
+    ATTR = 'attr'
+    # whether a failure to write the cache was already reported
+    _cache_warned = False
+
+    def __init__(self, components, component_meta, cache_path=None):
         self._components = components
         self._component_meta = component_meta
+        self._cache_path = cache_path
         self._dep_tree = collections.OrderedDict()
+        # component package names mapped to their path and found modules
+        self._packages = None
+        # dependency ids mapped to the module and the attribute name under
+        # which the function was exported
+        self._exported = dict()
+        self._is_cacheable = True
 
-    def _import_modules(self, pkg_name, whitelist=None):
+    def _find_modules(self, pkg_name, whitelist=None):
         """
         :param pkg_name:   component package name (must be on pythonpath)
-        :param whitelist:  list of modules to be imported only
+        :param whitelist:  list of modules to be found only
+        :returns:          package path and a list of ``(mod_path,
+                           source_path)`` pairs, where source path is
+                           ``None`` if the module has no python source
         """
         pkg = importlib.import_module(pkg_name)
         pkg_path = os.path.dirname(os.path.abspath(pkg.__file__))
         if pkg_path not in sys.path:
             sys.path.append(pkg_path)
 
-        is_broken = False
         modules = []
         for (loader, mod_name, is_pkg) in pkgutil.iter_modules([pkg_path]):
             if whitelist is None or mod_name in whitelist:
                 mod_path = '.'.join([pkg_name, mod_name])
-                try:
-                    mod = importlib.import_module(mod_path)
-                except Exception:
-                    logging.exception("Component {0} encountered an error "
-                                      "during it's loading, installation "
-                                      "skipped.".format(pkg_name))
-                    # make sure component won't be partially installed
-                    modules = []
-                    is_broken = True
-                    break
+                if is_pkg:
+                    source = os.path.join(pkg_path, mod_name, '__init__.py')
                 else:
-                    modules.append(mod)
+                    source = os.path.join(pkg_path, mod_name + '.py')
+                if not os.path.exists(source):
+                    source = None
+                modules.append((mod_path, source))
+        return (pkg_path, modules)
 
-        return (pkg_path, modules, is_broken)
+    def _discover(self):
+        if self._packages is None:
+            module_names = self._component_meta.keys()
+            self._packages = collections.OrderedDict()
+            for pkg_name in self._components:
+                self._packages[pkg_name] = self._find_modules(pkg_name,
+                                                              module_names)
+        return self._packages
 
-    def _get_exports_spec(self, module):
-        try:
-            exports = getattr(module, 'EXPORTS')
-        except AttributeError:
-            comp_meta = self._component_meta[module_name(module)]
+    def _get_exports_spec(self, mod_path, exports):
+        if exports is None:
+            comp_meta = self._component_meta[mod_path.split('.')[-1]]
             return (comp_meta['exports'], comp_meta['is_strict'])
-        else:
-            return (exports, True)
+        return (exports, True)
+
+    def _inspect_module(self, mod_path, source):
+        """Return the exports specification, strictness and the exported
+        functions of a module, as a list of ``(fn_name, fn, dependencies)``
+        tuples. Modules are only parsed, and their functions are represented
+        by ``LazyFunction`` objects, unless they cannot be inspected without
+        being imported."""
+        scanned = scan_module(source) if source else None
+        if scanned is not None:
+            (exports, functions, others) = scanned
+            (exports, is_strict) = self._get_exports_spec(mod_path, exports)
+            if not others.intersection(exports):
+                return (exports, is_strict, functions, None)
+        # exported names are bound by means other than plain function
+        # definitions, so the objects they refer to are known only after
+        # importing the module
+        mod = importlib.import_module(mod_path)
+        exports = getattr(mod, 'EXPORTS', None)
+        (exports, is_strict) = self._get_exports_spec(mod_path, exports)
+        return (exports, is_strict, None, mod)
+
+    def _resolve(self, fn, member_type):
+        """Import the module of the lazily referenced function ``fn``, unless
+        members of ``member_type`` are installed only after initialization,
+        so a module which fails to import is found before any member of its
+        component is installed."""
+        meta = self._component_meta.get(member_type, {})
+        if isinstance(fn, LazyFunction) and not meta.get('is_deferred'):
+            fn.resolve()
+
+    def _get_exported(self, mod_path, source):
+        (exports, is_strict, functions, mod) = self._inspect_module(mod_path,
+                                                                    source)
+        exported = []
+        for (fn_name, dependencies) in exports.items():
+            if mod is None:
+                fn = LazyFunction(mod_path, fn_name)
+                is_missing = fn_name not in functions
+            else:
+                fn = getattr(mod, fn_name, None)
+                is_missing = fn is None
+            if is_missing:
+                if is_strict:
+                    msg = "[{0}] module has no attribute '{1}'"
+                    raise DependencyNotFound(msg.format(mod_path, fn_name))
+                continue
+            exported.append((fn_name, fn, dependencies))
+        return exported
 
     def _build(self):
         """Assemble initial dependency tree, preserving the order as specified
-        in the component list."""
-        module_names = self._component_meta.keys()
-        for pkg_name in self._components:
-            (pkg_path, modules, is_broken) = self._import_modules(pkg_name,
-                                                                  module_names)
-            if not modules and not is_broken:
+        in the component list. The modules of components are not imported at
+        this point, unless it's necessary to find out what they export."""
+        for (pkg_name, (pkg_path, modules)) in self._discover().items():
+            if not modules:
                 # in case an installed app has no significant members for core
                 # to be loaded, add a noop `initialize` hook so it will be
                 # installed nevertheless
                 mod_name = '.'.join([pkg_name, 'hooks'])
                 dep_id = '{0}.initialize'.format(mod_name)
-                self._dep_tree[dep_id] = dict(fn=lambda x: x,
+                self._dep_tree[dep_id] = dict(fn=noop,
                                               name='initialize',
                                               type='hooks',
                                               mod_name=mod_name,
                                               pkg_name=pkg_name,
                                               pkg_path=pkg_path)
                 continue
+            members = collections.OrderedDict()
+            try:
+                for (mod_path, source) in modules:
+                    for (attr, fn, deps) in self._get_exported(mod_path,
+                                                               source):
+                        self._resolve(fn, mod_path.split('.')[-1])
+                        members[(mod_path, attr, fn)] = deps
+            except DependencyNotFound:
+                raise
+            except Exception:
+                logging.exception("Component {0} encountered an error "
+                                  "during it's loading, installation "
+                                  "skipped.".format(pkg_name))
+                # the error may go away without any change to the components,
+                # e.g. by installing a missing library
+                self._is_cacheable = False
+                # make sure component won't be partially installed
+                continue
             # build initial unparsed and unordered dependency tree
-            for mod in modules:
-                exports, is_strict = self._get_exports_spec(mod)
-                for (fn_name, dependencies) in exports.items():
-                    try:
-                        fn = getattr(mod, fn_name)
-                    except AttributeError as exc:
-                        if is_strict:
-                            msg = '[{0}] {1}'.format(mod.__name__, exc)
-                            raise DependencyNotFound(msg)
-                        continue
-                    else:
-                        dep_id = '.'.join([fn.__module__, fn.__name__])
-                        self._dep_tree[dep_id] = dict(fn=fn,
-                                                      name=fn.__name__,
-                                                      type=module_name(mod),
-                                                      mod_name=mod.__name__,
-                                                      pkg_name=pkg_name,
-                                                      pkg_path=pkg_path,
-                                                      **dependencies)
+            for ((mod_path, attr, fn), dependencies) in members.items():
+                dep_id = '.'.join([fn.__module__, fn.__name__])
+                self._exported[dep_id] = (mod_path, attr)
+                self._dep_tree[dep_id] = dict(fn=fn,
+                                              name=fn.__name__,
+                                              type=mod_path.split('.')[-1],
+                                              mod_name=mod_path,
+                                              pkg_name=pkg_name,
+                                              pkg_path=pkg_path,
+                                              **dependencies)
 
     def _parse(self):
         """Generates reverse dependencies. Essentially turns `required_by`
@@ -141,40 +304,163 @@ class DependencyLoader(object):
                     deps = existing_deps + [dep_id]
                     self._dep_tree[dependent_dep_id]['depends_on'] = deps
 
-    def _collect(self, dependent_id, collected=None):
-        """Recursively assemble the list of dependencies."""
-        if collected is None:
-            collected = collections.deque([dependent_id])
+    def _sort(self, dep_ids, dependents, pending, key):
+        """Kahn's algorithm. Of the members whose dependencies are all
+        satisfied, the one with the lowest ``key`` is always picked next."""
+        pending = dict(pending)
+        ready = [(key[dep_id], dep_id) for dep_id in dep_ids
+                 if not pending[dep_id]]
+        heapq.heapify(ready)
+        ordered = []
+        while ready:
+            (_, dep_id) = heapq.heappop(ready)
+            ordered.append(dep_id)
+            for dependent_id in dependents[dep_id]:
+                pending[dependent_id] -= 1
+                if not pending[dependent_id]:
+                    heapq.heappush(ready, (key[dependent_id], dependent_id))
+        if len(ordered) < len(dep_ids):
+            remaining = [dep_id for dep_id in dep_ids
+                         if pending[dep_id]]
+            msg = 'Circular dependencies between: {0}'
+            raise CircularDependency(msg.format(', '.join(remaining)))
+        return ordered
 
+    def _order(self):
+        """Sort the dependency tree topologically, preserving the order of
+        the component list as far as the dependencies permit: members are
+        moved only as far ahead as needed to precede the members that depend
+        on them."""
+        dep_ids = list(self._dep_tree)
+        index = dict((dep_id, i) for (i, dep_id) in enumerate(dep_ids))
+        dependents = dict((dep_id, []) for dep_id in dep_ids)
+        pending = dict()
+        for dep_id in dep_ids:
+            needed_dep_ids = set(self._dep_tree[dep_id].get('depends_on', []))
+            for needed_dep_id in needed_dep_ids:
+                try:
+                    dependents[needed_dep_id].append(dep_id)
+                except KeyError as exc:
+                    msg = "Dependency {0} is missing.".format(exc)
+                    raise UnresolvableDependency(msg)
+            pending[dep_id] = len(needed_dep_ids)
+
+        # the first pass yields a valid order, which is used to find out the
+        # position of the earliest member that depends on each member,
+        # directly or indirectly
+        first_pass = self._sort(dep_ids, dependents, pending, index)
+        rank = dict()
+        for dep_id in reversed(first_pass):
+            rank[dep_id] = min([index[dep_id]] +
+                               [rank[dependent_id]
+                                for dependent_id in dependents[dep_id]])
+        key = dict((dep_id, (rank[dep_id], index[dep_id]))
+                   for dep_id in dep_ids)
+        ordered = self._sort(dep_ids, dependents, pending, key)
+        self._dep_tree = collections.OrderedDict(
+            (dep_id, self._dep_tree[dep_id]) for dep_id in ordered)
+
+    def _get_cache_key(self):
+        """Return a hash of everything that influences the resolved order:
+        the component list, the exports of the component modules, versions
+        of the component packages and the modification times of their
+        modules."""
+        data = [__version__,
+                sorted((name, sorted(meta['exports']), meta['is_strict'])
+                       for (name, meta) in self._component_meta.items())]
+        for (pkg_name, (pkg_path, modules)) in self._discover().items():
+            pkg = sys.modules[pkg_name]
+            data.append([pkg_name, pkg_path,
+                         getattr(pkg, '__version__', None)])
+            for (mod_path, source) in modules:
+                stat = os.stat(source) if source else None
+                data.append([mod_path,
+                             stat and stat.st_mtime,
+                             stat and stat.st_size])
+        serialized = json.dumps(data, sort_keys=True).encode('utf8')
+        return hashlib.sha1(serialized).hexdigest()
+
+    def _serialize_fn(self, dep_id, fn):
+        if fn is noop:
+            return [self.NOOP]
+        (mod_path, attr) = self._exported[dep_id]
+        if isinstance(fn, LazyFunction):
+            return [self.LAZY, fn.__module__, fn.__name__]
+        return [self.ATTR, mod_path, attr]
+
+    def _deserialize_fn(self, spec):
+        if spec[0] == self.NOOP:
+            return noop
+        (kind, mod_path, name) = spec
+        if kind == self.LAZY:
+            return LazyFunction(mod_path, name)
+        return getattr(importlib.import_module(mod_path), name)
+
+    def _load_cache(self, key):
+        """Restore the resolved dependency tree from the cache file if it was
+        stored under ``key``. Returns whether it succeeded."""
         try:
-            dependent = self._dep_tree[dependent_id]
-        except KeyError as exc:
-            msg = "Dependency {0} is missing.".format(exc)
-            raise UnresolvableDependency(msg)
-        else:
-            for needed_dep_id in dependent.get('depends_on', []):
-                if needed_dep_id in collected:
-                    msg = 'Dependent module {0} referenced {1}'
-                    raise CircularDependency(msg.format(dependent_id,
-                                                        needed_dep_id))
-                collected.appendleft(needed_dep_id)
-                self._collect(needed_dep_id, collected=collected)
-
-        return collected
+            with open(self._cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached['key'] != key:
+                return False
+            dep_tree = collections.OrderedDict()
+            for (dep_id, member) in cached['members']:
+                member['fn'] = self._deserialize_fn(member['fn'])
+                self._resolve(member['fn'], member['type'])
+                dep_tree[dep_id] = member
+        except Exception:
+            logging.debug("Dependency cache %s could not be used.",
+                          self._cache_path)
+            return False
+        self._dep_tree = dep_tree
+        return True
 
-    def _order(self):
-        """Reorder the list of dependencies according to the results of the
-        recursive dependency analysis."""
-        ordered_deps = collections.OrderedDict()
-        for dep_id in self._dep_tree:
-            for needed_dep_id in self._collect(dep_id):
-                if needed_dep_id not in ordered_deps:
-                    ordered_deps[needed_dep_id] = self._dep_tree[needed_dep_id]
+    def _save_cache(self, key):
+        members = []
+        for (dep_id, member) in self._dep_tree.items():
+            member = dict(member)
+            member['fn'] = self._serialize_fn(dep_id, member['fn'])
+            members.append((dep_id, member))
+        tmp_path = self._cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(key=key, members=members), f)
+            os.rename(tmp_path, self._cache_path)
+        except (IOError, OSError, TypeError, ValueError) as exc:
+            if not DependencyLoader._cache_warned:
+                DependencyLoader._cache_warned = True
+                logging.warning("Dependency cache %s could not be written: "
+                                "%s", self._cache_path, exc)
 
-        self._dep_tree = ordered_deps
+    def get_levels(self):
+        """Split the resolved order into consecutive levels, such that no
+        member depends on another member of the same level. Members of a
+        level may therefore be installed concurrently, once all members of
+        the previous levels are installed."""
+        levels = []
+        level = []
+        level_ids = set()
+        for (dep_id, member) in self._dep_tree.items():
+            if level_ids.intersection(member.get('depends_on', [])):
+                levels.append(level)
+                level = []
+                level_ids = set()
+            level.append(member)
+            level_ids.add(dep_id)
+        if level:
+            levels.append(level)
+        return levels
 
     def load(self):
+        key = None
+        if self._cache_path:
+            key = self._get_cache_key()
+            if self._load_cache(key):
+                return self._dep_tree.values()
         self._build()
         self._parse()
         self._order()
+        if self._cache_path and self._is_cacheable:
+            self._save_cache(key)
         return self._dep_tree.values()
@@ -8,11 +8,10 @@ This software is free software licensed under the terms of GPLv3. See COPYING
 file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
 """
 
+import collections
 import functools
 import logging
 
-from Queue import Queue, Empty as QueueEmpty
-
 
 class ExtensionAlreadyExists(Exception):
     pass
@@ -32,15 +31,27 @@ class Placeholder(object):
     """Dummy object, returned by ``ExtContainer`` when non-existent extensions
     are accessed or methods are invoked on them.
 
+    Placeholders of nested attributes are cached, so repeated access to the
+    same attribute path does not create new objects. Invoking a placeholder
+    returns a new one, representing the return value of that particular call.
+
     :param onfail: Value to be returned or exception to be raised if a method
                    is invoked.
     """
+    __slots__ = ('__name',
+                 '__attrpath',
+                 '__parent',
+                 '__onfail',
+                 '__resolved',
+                 '__children')
+
     def __init__(self, name, attrpath, parent, onfail):
         self.__name = name
         self.__attrpath = attrpath
         self.__parent = parent
         self.__onfail = onfail
         self.__resolved = Nothing
+        self.__children = None
 
     def __call__(self, *args, **kwargs):
         if self.__onfail is not Nothing:
@@ -51,25 +62,37 @@ class Placeholder(object):
                 raise self.__onfail
             return self.__onfail
         # default behavior: store the called method name and params and return
-        # the same ``Placeholder`` object to continue with the charade
+        # a ``Placeholder`` object to continue with the charade, which will
+        # be resolved to the actual return value once the call is replayed
+        result = Placeholder(self.__name,
+                             self.__attrpath,
+                             self.__parent,
+                             self.__onfail)
         self.__parent.store_call(self.__name,
                                  self.__attrpath,
                                  args,
                                  kwargs,
-                                 self.__resolve)
-        return self
+                                 result.__resolve)
+        return result
 
     def __getattr__(self, attrname):
         # later access to ``Placeholder`` objects e.g. during replay calls
         # should be delegated to their resolved state, if it became available
         if self.__resolved is not Nothing:
             return getattr(self.__resolved, attrname)
-        # create a new ``Placeholder`` with the same configuration, just add
-        # the nested attribute name to the exisiting name
-        return Placeholder(self.__name,
-                           '.'.join([self.__attrpath, attrname]),
-                           self.__parent,
-                           self.__onfail)
+        # create a ``Placeholder`` with the same configuration, just add the
+        # nested attribute name to the exisiting name
+        if self.__children is None:
+            self.__children = dict()
+        try:
+            return self.__children[attrname]
+        except KeyError:
+            child = Placeholder(self.__name,
+                                '.'.join([self.__attrpath, attrname]),
+                                self.__parent,
+                                self.__onfail)
+            self.__children[attrname] = child
+            return child
 
     def __resolve(self, result):
         self.__resolved = result
@@ -80,12 +103,14 @@ class ExtContainer(object):
     the dependencies in question are not installed. Mainly meant to avoid
     putting boilerplate checks in such code to check for their existence.
 
-    :param onfail: Value to be returned or exception to be raised by a
-                   ``Placeholder`` if a method is invoked on a non-existent
-                   extension.
-    :param exts:   Used internally for cloning an ``ExtContainer`` object
-    :param calls:  Used internally for cloning an ``ExtContainer`` object
-    :param ignore: Used internally for cloning an ``ExtContainer`` object
+    :param onfail:    Value to be returned or exception to be raised by a
+                      ``Placeholder`` if a method is invoked on a
+                      non-existent extension.
+    :param max_calls: Maximum number of calls recorded per extension, or
+                      ``None`` for no limit
+    :param exts:      Used internally for cloning an ``ExtContainer`` object
+    :param calls:     Used internally for cloning an ``ExtContainer`` object
+    :param ignore:    Used internally for cloning an ``ExtContainer`` object
 
     Usage:
 
@@ -105,15 +130,33 @@ class ExtContainer(object):
         ...
     Exception: test
     """
-    _members = ('_extensions', '_onfail', '_calls', '_ignore')
+    DEFAULT_MAX_CALLS = 1000
+
+    _members = ('_extensions',
+                '_onfail',
+                '_calls',
+                '_ignore',
+                '_max_calls',
+                '_placeholders')
 
-    def __init__(self, onfail=Nothing, exts=None, calls=None, ignore=None):
+    def __init__(self, onfail=Nothing, max_calls=DEFAULT_MAX_CALLS, exts=None,
+                 calls=None, ignore=None):
         self._onfail = onfail
+        self._max_calls = max_calls
         self._extensions = exts or dict()
         self._calls = calls or dict()
         self._ignore = ignore or []
+        # placeholders of missing extensions, reused on repeated access
+        self._placeholders = dict()
+        # see ``__install_extension``
+        self.__dict__.update(self._extensions)
+        # ``is_installed`` is called on hot paths, so it's shortcut to a
+        # plain dict lookup for the instance
+        self.__dict__['is_installed'] = self._extensions.__contains__
 
     def __get_extension(self, name):
+        # installed extensions are normally found as instance attributes, so
+        # this is reached mostly for missing ones, or when accessed by key.
         # ``object.__getattribute__`` must be used to avoid infinite loops by
         # recursively calling ``__getattr__``.
         # just like assignments, all get operations are delegated to the
@@ -124,11 +167,17 @@ class ExtContainer(object):
         try:
             return exts[name]
         except KeyError:
-            onfail = object.__getattribute__(self, '_onfail')
-            return Placeholder(name=name,
-                               attrpath='',
-                               parent=self,
-                               onfail=onfail)
+            placeholders = object.__getattribute__(self, '_placeholders')
+            try:
+                return placeholders[name]
+            except KeyError:
+                onfail = object.__getattribute__(self, '_onfail')
+                placeholder = Placeholder(name=name,
+                                          attrpath='',
+                                          parent=self,
+                                          onfail=onfail)
+                placeholders[name] = placeholder
+                return placeholder
 
     def __install_extension(self, name, extension):
         # protect against overwriting existing extensions
@@ -140,6 +189,10 @@ class ExtContainer(object):
             raise ExtensionNameUnavailable(name)
 
         self._extensions[name] = extension
+        # bound as a regular instance attribute as well, so accessing it
+        # doesn't go through ``__getattr__`` at all
+        self.__dict__[name] = extension
+        self._placeholders.pop(name, None)
         self.__replay_calls(name, extension)
 
     def __resolve(self, obj):
@@ -160,21 +213,16 @@ class ExtContainer(object):
             return method(*args, **kwargs)
 
     def __replay_calls(self, name, extension):
-        queue = self._calls.pop(name, None)
-        if not queue:  # there were no registered calls, nothing to be done
+        calls = self._calls.pop(name, None)
+        if not calls:  # there were no registered calls, nothing to be done
             return
-        # retroactively invoke all the methods on the actual extension
-        while True:
-            try:
-                record = queue.get(block=False)
-            except QueueEmpty:
-                break
-            else:
-                (attrpath, args, kwargs, resolve_cb) = record
-                result = self.__invoke(extension, attrpath, args, kwargs)
-                # resolve a ``Placeholder`` so that it has access to the
-                # return value it was expected to represent when invoked
-                resolve_cb(result)
+        # retroactively invoke all the methods on the actual extension, in
+        # the order they were recorded
+        for (attrpath, args, kwargs, resolve_cb) in calls:
+            result = self.__invoke(extension, attrpath, args, kwargs)
+            # resolve a ``Placeholder`` so that it has access to the
+            # return value it was expected to represent when invoked
+            resolve_cb(result)
 
     def __getattr__(self, name):
         return self.__get_extension(name)
@@ -196,6 +244,7 @@ class ExtContainer(object):
         # if methods are invoked on a non-existent extension, ``onfail`` will
         # be used as a return value, instead of another ``Placeholder`` object.
         return ExtContainer(onfail=onfail,
+                            max_calls=self._max_calls,
                             exts=self._extensions,
                             calls=self._calls,
                             ignore=self._ignore)
@@ -204,9 +253,20 @@ class ExtContainer(object):
         """Called by ``Placeholder`` objects to record calls to extension
         methods which will be replayed later when the extension is installed.
         """
-        if name not in self._ignore:
-            self._calls.setdefault(name, Queue())
-            self._calls[name].put((attrpath, args, kwargs, resolve_cb))
+        if name in self._ignore:
+            return
+        try:
+            calls = self._calls[name]
+        except KeyError:
+            calls = self._calls[name] = collections.deque()
+        if self._max_calls is not None and len(calls) >= self._max_calls:
+            # the extension is probably never going to be installed, so the
+            # earliest calls are kept and the rest is discarded
+            logging.debug("Limit of {0} recorded calls reached for missing "
+                          "extension {1}, call to {2} discarded.".format(
+                              self._max_calls, name, attrpath))
+            return
+        calls.append((attrpath, args, kwargs, resolve_cb))
 
     def is_installed(self, name):
         """Check whether extension known by ``name`` is installed or not.
@@ -228,6 +288,14 @@ class ExtContainer(object):
         for key in names:
             self._calls.pop(key, None)
 
+    def limit_calls(self, max_calls):
+        """Set the maximum number of calls recorded per extension while it's
+        not installed. Calls beyond the limit are discarded.
+
+        :param max_calls:  number of calls, or ``None`` for no limit
+        """
+        self._max_calls = max_calls
+
     def ignore_calls_from(self, *extensions):
         """Add names of specified extensions to ignore list so no calls will be
         recorded for them while they are not installed.
@@ -0,0 +1,212 @@
+"""
+profiling.py: Startup profiler
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import argparse
+import collections
+import contextlib
+import cProfile
+import json
+import logging
+import time
+
+from gevent import getcurrent
+
+from .dependencies import LazyFunction
+
+
+class NullProfiler(object):
+    """Profiler used when profiling is not requested, doing nothing."""
+    enabled = False
+
+    @contextlib.contextmanager
+    def span(self, name):
+        yield
+
+    def install(self, events):
+        pass
+
+    def finish(self):
+        pass
+
+
+class StartupProfiler(object):
+    """Records the time spent in the named, possibly nested, spans of the
+    startup, and writes it out as a flamegraph-compatible report.
+
+    If ``path`` ends with ``.json``, the report is written in the speedscope
+    format, otherwise as collapsed stacks, which can be processed by
+    ``flamegraph.pl`` and most other flamegraph tools. Sample weights are in
+    microseconds.
+
+    :param path:          path of the report file
+    :param use_cprofile:  also run cProfile, which is written to ``path``
+                          with the ``.prof`` extension appended
+    """
+    enabled = True
+    ROOT = 'startup'
+
+    def __init__(self, path, use_cprofile=False):
+        self.path = path
+        self.started_at = time.time()
+        # greenlets mapped to their stack of span names
+        self._stacks = dict()
+        # (stack, start, end) tuples of finished spans
+        self._spans = []
+        self._profile = cProfile.Profile() if use_cprofile else None
+        self._events = None
+        self._original_publish = None
+        self._publish_wrapper = None
+        self._importer = None
+        if self._profile:
+            self._profile.enable()
+
+    @classmethod
+    def from_argv(cls, argv):
+        """Return a profiler if ``--profile-startup`` is among the command
+        line arguments, otherwise a ``NullProfiler``. The arguments are
+        inspected directly, since the command line is parsed only after the
+        components are loaded."""
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument('--profile-startup', metavar='PATH')
+        parser.add_argument('--profile-cprofile', action='store_true')
+        (args, _) = parser.parse_known_args(argv)
+        if not args.profile_startup:
+            return NullProfiler()
+        return cls(args.profile_startup, use_cprofile=args.profile_cprofile)
+
+    def _get_stack(self):
+        greenlet = getcurrent()
+        try:
+            return self._stacks[greenlet]
+        except KeyError:
+            # spans of a new greenlet are nested within the span in which it
+            # was spawned
+            spawned_by = getattr(greenlet, 'spawning_greenlet', None)
+            parent = spawned_by() if spawned_by else None
+            stack = list(self._stacks.get(parent, [self.ROOT]))
+            self._stacks[greenlet] = stack
+            return stack
+
+    @contextlib.contextmanager
+    def span(self, name):
+        stack = self._get_stack()
+        stack.append(name)
+        path = tuple(stack)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._spans.append((path, start, time.time()))
+            stack.pop()
+
+    def _publish(self, events, event, *args, **kwargs):
+        scope = kwargs.pop('scope', None)
+        # statistics enabled before the profiler was installed keep being
+        # recorded, the same way ``PubSub`` records them itself
+        record_stats = self._original_publish is not None
+        for listener in events._get_listeners(event, scope):
+            name = '{0} {1}'.format(event, events._get_name(listener))
+            with self.span(name):
+                start = time.time()
+                try:
+                    listener(*args, **kwargs)
+                finally:
+                    if record_stats:
+                        events._record(event, listener, time.time() - start)
+
+    def _import_module(self, name):
+        with self.span('import {0}'.format(name)):
+            return self._importer(name)
+
+    def install(self, events):
+        """Record the time spent in each listener of the events published
+        through ``events``, and the time spent importing component modules
+        on first use. Instrumentation is removed by ``finish``."""
+        self._events = events
+        # publishing may already be instrumented for collecting statistics
+        self._original_publish = events.__dict__.get('publish')
+        self._publish_wrapper = lambda *args, **kwargs: self._publish(
+            events, *args, **kwargs)
+        events.publish = self._publish_wrapper
+        self._importer = LazyFunction.import_module
+        LazyFunction.import_module = staticmethod(self._import_module)
+
+    def uninstall(self):
+        if self._importer:
+            LazyFunction.import_module = staticmethod(self._importer)
+            self._importer = None
+        if self._events is not None:
+            # publishing may have been instrumented differently meanwhile
+            if self._events.__dict__.get('publish') is self._publish_wrapper:
+                del self._events.publish
+                if self._original_publish:
+                    self._events.publish = self._original_publish
+            self._events = None
+
+    def get_self_times(self):
+        """Return an ordered dict of stacks mapped to the time spent in them,
+        excluding the time spent in the spans nested within them, in
+        microseconds."""
+        total = collections.OrderedDict()
+        total[(self.ROOT,)] = time.time() - self.started_at
+        nested = collections.defaultdict(float)
+        for (path, start, end) in sorted(self._spans, key=lambda s: s[1]):
+            total[path] = total.get(path, 0.0) + end - start
+            nested[path[:-1]] += end - start
+        # concurrent spans may add up to more than their parent took
+        return collections.OrderedDict(
+            (path, max(int((duration - nested[path]) * 1e6), 0))
+            for (path, duration) in total.items())
+
+    def format_collapsed(self, self_times):
+        return '\n'.join('{0} {1}'.format(';'.join(path), weight)
+                         for (path, weight) in self_times.items()) + '\n'
+
+    def format_speedscope(self, self_times):
+        frames = []
+        indices = dict()
+        samples = []
+        weights = []
+        for (path, weight) in self_times.items():
+            for name in path:
+                if name not in indices:
+                    indices[name] = len(frames)
+                    frames.append(dict(name=name))
+            samples.append([indices[name] for name in path])
+            weights.append(weight)
+        profile = dict(type='sampled',
+                       name='Startup',
+                       unit='microseconds',
+                       startValue=0,
+                       endValue=sum(weights),
+                       samples=samples,
+                       weights=weights)
+        return json.dumps({
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': dict(frames=frames),
+            'profiles': [profile],
+            'name': 'Startup',
+            'exporter': 'librarian-core',
+        })
+
+    def finish(self):
+        """Stop profiling and write the report."""
+        if self._profile:
+            self._profile.disable()
+            self._profile.dump_stats(self.path + '.prof')
+        self.uninstall()
+        self_times = self.get_self_times()
+        if self.path.endswith('.json'):
+            report = self.format_speedscope(self_times)
+        else:
+            report = self.format_collapsed(self_times)
+        with open(self.path, 'w') as f:
+            f.write(report)
+        logging.info('Startup profile written to %s', self.path)
@@ -8,12 +8,44 @@ This software is free software licensed under the terms of GPLv3. See COPYING
 file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
 """
 
+import collections
+import logging
+import time
+
+from gevent import Timeout
+from gevent.event import AsyncResult
+from gevent.pool import Pool
+
+
+Subscription = collections.namedtuple('Subscription',
+                                      ['scope', 'priority', 'timeout'])
+
 
 class PubSub(object):
+    """Event dispatcher. Listeners with a higher priority are invoked before
+    the ones with a lower priority, and listeners with the same priority are
+    invoked in the order they subscribed.
 
-    def __init__(self):
+    Call counts and execution times of listeners can be recorded after
+    invoking ``enable_stats``. To keep the overhead at zero when it's not
+    needed, instrumentation works by swapping the implementation of the
+    dispatching methods on the instance.
+
+    :param pool_size:  maximum number of listeners running concurrently when
+                       events are published with ``publish_async``
+    """
+    DEFAULT_POOL_SIZE = 10
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        # event names mapped to ordered dicts which are used as ordered sets
+        # of listeners, each listener mapped to its ``Subscription``
         self._subscribers = dict()
-        self._scopes = dict()
+        # cached tuples of listeners per event and scope, invalidated when
+        # the subscribers of an event change
+        self._dispatch = dict()
+        self._pool = Pool(pool_size)
+        # (event, listener) pairs mapped to [calls, total time, max time]
+        self._stats = dict()
 
     def _get_scope(self, fn):
         """Determine the scope of the passed in function."""
@@ -21,10 +53,68 @@ class PubSub(object):
             fn = fn.func
         return fn.__module__
 
-    def _is_within_scope(self, fn, scope):
-        """Determine whether the passed in function is within the passed in
-        scope."""
-        return self._get_scope(fn).startswith(scope)
+    def _get_listeners(self, event, scope):
+        """Return a tuple of the listeners of ``event`` that are within the
+        passed in ``scope``, or all of them if no scope is specified, ordered
+        by their priority."""
+        try:
+            return self._dispatch[event][scope]
+        except KeyError:
+            subscribers = self._subscribers.get(event, {})
+            # sorting is stable, so the subscription order is preserved for
+            # listeners of the same priority
+            ordered = sorted(subscribers.items(),
+                             key=lambda item: -item[1].priority)
+            listeners = tuple(listener for (listener, sub) in ordered
+                              if not scope or sub.scope.startswith(scope))
+            self._dispatch.setdefault(event, dict())[scope] = listeners
+            return listeners
+
+    def _record(self, event, listener, duration):
+        try:
+            entry = self._stats[(event, listener)]
+        except KeyError:
+            self._stats[(event, listener)] = [1, duration, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]:
+                entry[2] = duration
+
+    def _deliver(self, result, event, listener, timeout, args, kwargs):
+        """Invoke a single listener on behalf of ``publish_async``, storing
+        its return value or exception in ``result``."""
+        try:
+            with Timeout(timeout):
+                value = listener(*args, **kwargs)
+        except Timeout as exc:
+            logging.error("Listener %r of event '%s' timed out after %ss.",
+                          listener, event, timeout)
+            result.set_exception(exc)
+        except Exception as exc:
+            logging.exception("Listener %r of event '%s' raised an error.",
+                              listener, event)
+            result.set_exception(exc)
+        else:
+            result.set(value)
+
+    def _deliver_instrumented(self, result, event, listener, timeout, args,
+                              kwargs):
+        start = time.time()
+        try:
+            PubSub._deliver(self, result, event, listener, timeout, args,
+                            kwargs)
+        finally:
+            self._record(event, listener, time.time() - start)
+
+    def _publish_instrumented(self, event, *args, **kwargs):
+        scope = kwargs.pop('scope', None)
+        for listener in self._get_listeners(event, scope):
+            start = time.time()
+            try:
+                listener(*args, **kwargs)
+            finally:
+                self._record(event, listener, time.time() - start)
 
     def publish(self, event, *args, **kwargs):
         """Publish an event with arbitary arguments. All the subscriberes of
@@ -34,21 +124,92 @@ class PubSub(object):
         :param scope:  scope to which event emission should be limited
         """
         scope = kwargs.pop('scope', None)
-        listeners = self._subscribers.get(event, [])
-        for listener in listeners:
-            if not scope or self._is_within_scope(listener, scope):
-                listener(*args, **kwargs)
+        for listener in self._get_listeners(event, scope):
+            listener(*args, **kwargs)
+
+    def publish_async(self, event, *args, **kwargs):
+        """Publish an event like ``publish`` does, but invoke the listeners
+        in separate greenlets of a bounded pool. Exceptions raised by a
+        listener are logged and do not affect delivery to the others, and
+        listeners which take longer than their ``timeout`` are interrupted.
+
+        If the pool is full, this call blocks until enough listeners finish.
+
+        :param event:  unique string identifier of the event
+        :param scope:  scope to which event emission should be limited
+        :returns:      list of ``AsyncResult`` objects, one per listener, in
+                       the order of invocation
+        """
+        scope = kwargs.pop('scope', None)
+        subscribers = self._subscribers.get(event, {})
+        results = []
+        for listener in self._get_listeners(event, scope):
+            result = AsyncResult()
+            # the listener may have been unsubscribed while waiting for the
+            # pool, in which case it's still invoked, just without timeout
+            subscription = subscribers.get(listener)
+            timeout = subscription.timeout if subscription else None
+            self._pool.spawn(self._deliver,
+                             result,
+                             event,
+                             listener,
+                             timeout,
+                             args,
+                             kwargs)
+            results.append(result)
+        return results
+
+    @property
+    def stats_enabled(self):
+        return 'publish' in self.__dict__
+
+    def enable_stats(self):
+        """Start recording call counts and execution times of listeners."""
+        self.publish = self._publish_instrumented
+        self._deliver = self._deliver_instrumented
+
+    def disable_stats(self):
+        """Stop recording listener statistics. Already recorded data is kept
+        until ``clear_stats`` is called."""
+        self.__dict__.pop('publish', None)
+        self.__dict__.pop('_deliver', None)
+
+    def clear_stats(self):
+        self._stats = dict()
+
+    def stats(self):
+        """Return the recorded statistics as a list of ``(event, listener,
+        calls, total, max)`` tuples, where ``listener`` is the dotted path of
+        the listener and times are in seconds, sorted by the total time spent
+        in the listener in descending order."""
+        result = [(event, self._get_name(listener), calls, total, maximum)
+                  for ((event, listener), (calls, total, maximum))
+                  in self._stats.items()]
+        return sorted(result, key=lambda row: row[3], reverse=True)
+
+    def _get_name(self, fn):
+        name = getattr(fn, '__name__', None)
+        if name is None:
+            # e.g. ``functools.partial`` objects
+            name = getattr(getattr(fn, 'func', None), '__name__', repr(fn))
+        return '.'.join([self._get_scope(fn), name])
 
-    def subscribe(self, event, listener):
+    def subscribe(self, event, listener, priority=0, timeout=None):
         """Register a callback function for a specific event.
 
         :param event:     unique string identifier of the event
         :param listener:  a callable object
+        :param priority:  listeners with higher priority are invoked first
+        :param timeout:   number of seconds after which the listener is
+                          interrupted when invoked through ``publish_async``
         """
-        subscribers = self._subscribers.setdefault(event, [])
+        subscribers = self._subscribers.setdefault(event,
+                                                   collections.OrderedDict())
         if listener not in subscribers:
-            subscribers.append(listener)
-            self._scopes[id(listener)] = self._get_scope(listener)
+            subscribers[listener] = Subscription(self._get_scope(listener),
+                                                 priority,
+                                                 timeout)
+            self._dispatch.pop(event, None)
 
     def unsubscribe(self, event, listener):
         """Unregister a callback for a specific event type.
@@ -56,10 +217,10 @@ class PubSub(object):
         :param event:     unique string identifier of the event
         :param listener:  a callable object
         """
-        subscribers = self._subscribers.get(event, [])
+        subscribers = self._subscribers.get(event, {})
         if listener in subscribers:
-            subscribers.remove(listener)
-            self._scopes.pop(id(listener), None)
+            del subscribers[listener]
+            self._dispatch.pop(event, None)
 
     def get_subscribers(self, event):
         """Returns a copy of the list of subscribers to a specific event type.
@@ -69,4 +230,4 @@ class PubSub(object):
 
         :param event:     unique string identifier of the event
         """
-        return list(self._subscribers.get(event, []))
+        return list(self._get_listeners(event, None))
@@ -0,0 +1,119 @@
+"""
+server.py: WSGI server handler with zero-copy file transmission
+
+Copyright 2014-2015, Outernet Inc.
+Some rights reserved.
+
+This software is free software licensed under the terms of GPLv3. See COPYING
+file that comes with the source code, or http://www.gnu.org/licenses/gpl.txt.
+"""
+
+import errno
+import os
+
+from gevent import pywsgi
+from gevent.socket import wait_write
+
+
+SENDFILE_BLOCK_SIZE = 1024 * 1024  # in bytes
+
+
+class FileWrapper(object):
+    """``wsgi.file_wrapper`` implementation. The wrapped file is transmitted
+    starting from its current position. When returned to
+    ``SendfileWSGIHandler`` the file is sent with ``os.sendfile``, otherwise
+    it is read and iterated over in blocks of ``blksize`` bytes.
+
+    At most ``length`` bytes are transmitted, or everything up to the end of
+    the file if it is ``None``.
+    """
+    def __init__(self, filelike, blksize=8192, length=None):
+        self.filelike = filelike
+        self.blksize = blksize
+        self.length = length
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+
+    def fileno(self):
+        """Return the file descriptor of the wrapped file, or ``None`` if it
+        has no usable one."""
+        try:
+            return self.filelike.fileno()
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+
+    def __iter__(self):
+        read = self.filelike.read
+        blksize = self.blksize
+        remaining = self.length
+        while remaining is None or remaining > 0:
+            if remaining is None:
+                data = read(blksize)
+            else:
+                data = read(min(blksize, remaining))
+                remaining -= len(data)
+            if not data:
+                break
+            yield data
+
+
+class SendfileWSGIHandler(pywsgi.WSGIHandler):
+    """Request handler which provides ``wsgi.file_wrapper`` and hands files
+    returned through it to ``os.sendfile``, so their contents are copied by
+    the kernel directly to the socket instead of being read into memory and
+    written out chunk by chunk.
+    """
+    def get_environ(self):
+        env = super(SendfileWSGIHandler, self).get_environ()
+        env['wsgi.file_wrapper'] = FileWrapper
+        return env
+
+    def can_sendfile(self):
+        return (hasattr(os, 'sendfile') and
+                isinstance(self.result, FileWrapper) and
+                self.result.fileno() is not None and
+                not getattr(self.server, 'ssl_enabled', False))
+
+    def process_result(self):
+        if (isinstance(self.result, FileWrapper) and
+                self.result.length is None and
+                self.provided_content_length is not None):
+            # the wrapped file may be positioned at the start of a range, so
+            # no more than the Content-Length of the response may be sent,
+            # whether the file is sent with ``os.sendfile`` or iterated over
+            self.result.length = int(self.provided_content_length)
+        if self.can_sendfile():
+            # flush the headers first, so that the decision about the content
+            # length and chunked encoding is made
+            self.write(b'')
+            if (self.provided_content_length is not None and
+                    not self.response_use_chunked):
+                self.sendfile(self.result, int(self.provided_content_length))
+                return
+            # the application did not specify the size of the response, so
+            # transmission must fall back to iterating over the file
+        super(SendfileWSGIHandler, self).process_result()
+
+    def sendfile(self, wrapper, length):
+        in_fd = wrapper.fileno()
+        out_fd = self.socket.fileno()
+        offset = wrapper.filelike.tell()
+        remaining = length
+        while remaining > 0:
+            try:
+                sent = os.sendfile(out_fd,
+                                   in_fd,
+                                   offset,
+                                   min(remaining, SENDFILE_BLOCK_SIZE))
+            except OSError as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    # socket buffer is full, yield to other greenlets until
+                    # the socket becomes writable again
+                    wait_write(out_fd)
+                    continue
+                raise
+            if not sent:
+                break  # file got truncated meanwhile
+            offset += sent
+            remaining -= sent
+            self.response_length += sent
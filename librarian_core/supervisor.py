@@ -1,15 +1,19 @@
 import logging
 import os
 import sys
+import time
 
 from bottle import Bottle
-from gevent import pywsgi, sleep
+from gevent import joinall, pywsgi, sleep
+from gevent.pool import Pool
 from confloader import get_config_path, ConfDict
 
 from .dependencies import DependencyLoader
 from .exts import ext_container
 from .logs import configure_logger
+from .profiling import StartupProfiler
 from .pubsub import PubSub
+from .server import SendfileWSGIHandler
 from .signal_handlers import on_interrupt
 
 
@@ -23,6 +27,8 @@ class EarlyExit(Exception):
 class Supervisor:
     LOOP_INTERVAL = 5  # in seconds
     DEFAULT_CONFIG_FILENAME = 'config.ini'
+    # maximum number of `initialize` hooks running concurrently
+    INIT_POOL_SIZE = 10
     CONFIG_DEFAULTS = {
         'autojson': True,
         'catchall': True
@@ -62,18 +68,27 @@ class Supervisor:
     EarlyExit = EarlyExit
 
     def __init__(self, root_dir):
+        self.started_at = time.time()
+        self.profiler = StartupProfiler.from_argv(sys.argv[1:])
         self.server = None
+        self._deferred_members = []
         self.app = self.wsgi = Bottle()
         self.app.supervisor = self
         self.exts = ext_container
         self.exts.events = PubSub()
 
         # Load core configuration
-        self._configure(root_dir)
-        configure_logger(self.config)
+        with self.profiler.span('configure'):
+            self._configure(root_dir)
+            configure_logger(self.config)
+        if self.config.get('app.debug_events'):
+            # enabled this early, so startup hooks are instrumented as well
+            self.exts.events.enable_stats()
+        self.profiler.install(self.exts.events)
 
         # Load components
-        self._load_components()
+        with self.profiler.span('load components'):
+            self._load_components()
 
         # Register interrupt handler
         on_interrupt(self.halt)
@@ -84,14 +99,22 @@ class Supervisor:
         try:
             # Fire init-complete event. Command line handlers should be
             # executed at this point.
-            self.exts.events.publish(self.INIT_COMPLETE, self)
+            with self.profiler.span(self.INIT_COMPLETE):
+                self.exts.events.publish(self.INIT_COMPLETE, self)
         except EarlyExit as exc:
             # One of the command line handlers probably requested early exit
+            self.profiler.finish()
             sys.exit(exc.exit_code)
         except Exception:
             logging.exception("An error occurred during `init_complete`.")
             raise
 
+        # Routes and plugins are needed only for serving requests, so they
+        # are installed once it's certain that the application won't exit
+        with self.profiler.span('install routes and plugins'):
+            self._install_deferred_members()
+        self.profiler.finish()
+
     def _load_config(self, path, strict=True):
         path = os.path.abspath(path)
         if not strict and not os.path.exists(path):
@@ -110,11 +133,9 @@ class Supervisor:
         self.config['root'] = root_dir
 
     def _install_hook(self, name, fn, **kwargs):
+        # the initialize hook is fired by `_load_components` once the whole
+        # level of members it belongs to is installed
         self.exts.events.subscribe(name, fn)
-        # the initialize hook must be fired immediately in the scope to
-        # which it belongs only
-        if name == self.INITIALIZE:
-            self.exts.events.publish(name, self, scope=kwargs['mod_name'])
 
     def _install_routes(self, fn, **kwargs):
         route_config = fn(self.config)
@@ -137,6 +158,7 @@ class Supervisor:
                 'plugin': {}
             },
             'is_strict': True,
+            'is_deferred': True,
             'handler': _install_plugin
         },
         'routes': {
@@ -144,6 +166,7 @@ class Supervisor:
                 'routes': {}
             },
             'is_strict': True,
+            'is_deferred': True,
             'handler': _install_routes
         }
     }
@@ -154,20 +177,79 @@ class Supervisor:
                 for name in self.CORE_COMPONENTS]
 
     def _install_component_member(self, member):
-        handler = self.COMPONENT_META[member['type']]['handler']
+        meta = self.COMPONENT_META[member['type']]
         config_path = os.path.join(member['pkg_path'],
                                    self.DEFAULT_CONFIG_FILENAME)
         config = self.config.import_from_file(config_path, as_defaults=True,
                                               ignore_missing=True)
-        handler(self, **member)
-        # notify possibly other components that a new component has been
-        # installed successfully
-        self.exts.events.publish(self.COMPONENT_MEMBER_LOADED,
-                                 self,
-                                 member=member,
-                                 config=config)
-        logging.debug("LOADED: {0}".format('::'.join([member['pkg_path'],
-                                                      member['name']])))
+        if meta.get('is_deferred'):
+            # the configuration of the component is still processed, only
+            # the import of the member's module is postponed
+            self._deferred_members.append(member)
+        else:
+            with self.profiler.span(self._get_member_name(member)):
+                meta['handler'](self, **member)
+        return config
+
+    def _get_member_name(self, member):
+        return '{0} {1}.{2}'.format(member['type'],
+                                    member['mod_name'],
+                                    member['name'])
+
+    def _initialize_member(self, member):
+        """Fire the initialize hook in the scope of the member only. Returns
+        whether it succeeded."""
+        started = time.time()
+        try:
+            self.exts.events.publish(self.INITIALIZE,
+                                     self,
+                                     scope=member['mod_name'])
+        except Exception:
+            logging.exception('Component member installation failed.')
+            return False
+        finally:
+            finished = time.time()
+            logging.debug("INITIALIZE: %s.%s started at +%.4fs, finished at "
+                          "+%.4fs, took %.4fs",
+                          member['mod_name'],
+                          member['name'],
+                          started - self.started_at,
+                          finished - self.started_at,
+                          finished - started)
+        return True
+
+    def _install_level(self, members, pool):
+        installed = []
+        for member in members:
+            try:
+                config = self._install_component_member(member)
+            except Exception:
+                logging.exception('Component member installation failed.')
+                continue
+            greenlet = None
+            if (member['type'] == 'hooks' and
+                    member['name'] == self.INITIALIZE):
+                # members of the same level do not depend on each other, so
+                # their initialize hooks can run concurrently
+                greenlet = pool.spawn(self._initialize_member, member)
+            installed.append((member, config, greenlet))
+        joinall([greenlet for (_, _, greenlet) in installed
+                 if greenlet is not None])
+        for (member, config, greenlet) in installed:
+            if greenlet is not None and not greenlet.value:
+                continue
+            try:
+                # notify possibly other components that a new component has
+                # been installed successfully
+                self.exts.events.publish(self.COMPONENT_MEMBER_LOADED,
+                                         self,
+                                         member=member,
+                                         config=config)
+            except Exception:
+                logging.exception('Component member installation failed.')
+                continue
+            logging.debug("LOADED: {0}".format('::'.join([member['pkg_path'],
+                                                          member['name']])))
 
     def _load_components(self):
         components = self.config['app.components'] or []
@@ -176,12 +258,31 @@ class Supervisor:
             core_components = self._get_core_components()
             components = core_components + components
 
-        loader = DependencyLoader(components, self.COMPONENT_META)
-        for member in loader.load():
+        # the cache is disabled unless a writable location is configured,
+        # relative paths being resolved against the application root
+        cache_path = self.config.get('app.dependency_cache')
+        if cache_path:
+            cache_path = os.path.join(self.config['root'], cache_path)
+        loader = DependencyLoader(components,
+                                  self.COMPONENT_META,
+                                  cache_path=cache_path or None)
+        with self.profiler.span('resolve dependencies'):
+            loader.load()
+        pool = Pool(self.config.get('app.init_pool_size',
+                                    self.INIT_POOL_SIZE))
+        for (index, members) in enumerate(loader.get_levels()):
+            with self.profiler.span('level {0}'.format(index)):
+                self._install_level(members, pool)
+
+    def _install_deferred_members(self):
+        for member in self._deferred_members:
+            handler = self.COMPONENT_META[member['type']]['handler']
             try:
-                self._install_component_member(member)
+                with self.profiler.span(self._get_member_name(member)):
+                    handler(self, **member)
             except Exception:
                 logging.exception('Component member installation failed.')
+        self._deferred_members = []
 
     def _enter_background_loop(self):
         while self._running:
@@ -194,7 +295,10 @@ class Supervisor:
         self.exts.events.publish(self.PRE_START, self)
         host = self.config['app.bind']
         port = self.config['app.port']
-        self.server = pywsgi.WSGIServer((host, port), self.wsgi, log=None)
+        self.server = pywsgi.WSGIServer((host, port),
+                                        self.wsgi,
+                                        log=None,
+                                        handler_class=SendfileWSGIHandler)
         self.server.start()  # non-blocking
         assert self.server.started, 'Expected server to be running'
         logging.debug("Started server on http://%s:%s/", host, port)
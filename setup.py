@@ -26,6 +26,7 @@ setup(
         'gevent',
         'greentasks',
         'Mako',
+        'msgpack',
         'pbkdf2',
         'psycopg2',
         'python-dateutil',
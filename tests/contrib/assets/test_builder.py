@@ -0,0 +1,66 @@
+import glob
+import os
+
+import pytest
+
+from librarian_core.contrib.assets import builder as mod
+from librarian_core.contrib.assets.static import Assets
+
+
+@pytest.fixture
+def assets(tmpdir):
+    css = tmpdir.mkdir('static').mkdir('css')
+    css.join('a.css').write('body { color: red; }')
+    css.join('b.css').write('p { margin: 0; }')
+    config = {'root': str(tmpdir),
+              'assets.directory': 'static',
+              'assets.url': '/static/',
+              'assets.debug': False,
+              'assets.css_bundles': ['one: a', 'two: b']}
+    return (Assets.from_config(dict(config)), config)
+
+
+def test_build_bundles_incremental(assets):
+    (assets, config) = assets
+    report = mod.build_bundles(assets.env, config, processes=1)
+    assert [(name, status) for (name, status, _) in report] == [
+        ('css/one', 'built'), ('css/two', 'built')]
+    built = glob.glob(os.path.join(assets.env.directory, 'css', 'one-*.css'))
+    assert len(built) == 1
+
+    report = mod.build_bundles(assets.env, config, processes=1)
+    assert [status for (_, status, _) in report] == ['unchanged'] * 2
+
+    with open(os.path.join(assets.env.directory, 'css', 'b.css'), 'a') as f:
+        f.write('a { color: blue; }')
+    report = mod.build_bundles(assets.env, config, processes=1)
+    assert [status for (_, status, _) in report] == ['unchanged', 'built']
+
+
+def test_format_report():
+    report = [('css/main', 'built', 0.5), ('js/app', 'unchanged', 0.0)]
+    lines = mod.format_report(report).splitlines()
+    assert len(lines) == 3
+    assert lines[1].split() == ['css/main', 'built', '0.500']
+
+
+@pytest.mark.parametrize('cache,expected', [
+    (False, False),
+    (True, os.path.join('static', mod.DEFAULT_CACHE_NAME, 'worker-1')),
+    ('cache', os.path.join('cache', 'worker-1')),
+])
+def test_get_worker_cache(assets, tmpdir, cache, expected):
+    (assets, _) = assets
+    assets.env.cache = str(tmpdir.join(cache)) if cache == 'cache' else cache
+    result = mod.get_worker_cache(assets.env, 1)
+    if expected:
+        expected = str(tmpdir.join(expected))
+    assert result == expected
+
+
+def test_build_bundles_worker_caches(assets):
+    (assets, config) = assets
+    report = mod.build_bundles(assets.env, config, processes=2)
+    assert [status for (_, status, _) in report] == ['built'] * 2
+    cache_dir = os.path.join(assets.env.directory, mod.DEFAULT_CACHE_NAME)
+    assert sorted(os.listdir(cache_dir)) == ['worker-0', 'worker-1']
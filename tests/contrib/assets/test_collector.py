@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from librarian_core.contrib.assets import collector as mod
+
+
+@pytest.fixture
+def source(tmpdir):
+    src = tmpdir.mkdir('src')
+    src.join('a.js').write('a')
+    src.join('b.js').write('b')
+    src.mkdir('img').join('logo.png').write('logo')
+    return str(src)
+
+
+def test_find_files_ignore(source, tmpdir):
+    dst = str(tmpdir.join('dst'))
+    pairs = sorted(mod.find_files(source, dst, ignore=['b.js'], root=source))
+    assert pairs == [(os.path.join(source, 'a.js'),
+                      os.path.join(dst, 'a.js')),
+                     (os.path.join(source, 'img', 'logo.png'),
+                      os.path.join(dst, 'img', 'logo.png'))]
+
+
+def test_find_files_ignore_directory(source, tmpdir):
+    dst = str(tmpdir.join('dst'))
+    pairs = list(mod.find_files(source, dst, ignore=['img'], root=source))
+    assert len(pairs) == 2
+
+
+def test_collect_skips_up_to_date(source, tmpdir):
+    dst = str(tmpdir.join('dst'))
+    collector = mod.Collector(threads=2)
+    assert collector.collect(mod.find_files(source, dst)) == 3
+    assert collector.collect(mod.find_files(source, dst)) == 0
+    with open(os.path.join(dst, 'a.js')) as f:
+        assert f.read() == 'a'
+
+
+def test_collect_hashes_ignore_mtime(source, tmpdir):
+    dst = str(tmpdir.join('dst'))
+    manifest = str(tmpdir.join('manifest.json'))
+    assert mod.Collector(manifest_path=manifest).collect(
+        mod.find_files(source, dst)) == 3
+    # simulate packaging resetting modification times of the sources
+    for name in ('a.js', 'b.js'):
+        path = os.path.join(source, name)
+        os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime + 60))
+    assert mod.Collector(manifest_path=manifest).collect(
+        mod.find_files(source, dst)) == 0
+    with open(os.path.join(source, 'a.js'), 'w') as f:
+        f.write('changed')
+    assert mod.Collector(manifest_path=manifest).collect(
+        mod.find_files(source, dst)) == 1
+
+
+def test_copy_file_hardlink(source, tmpdir):
+    src = os.path.join(source, 'a.js')
+    dst = str(tmpdir.join('dst', 'a.js'))
+    mod.copy_file(src, dst, method=mod.HARDLINK)
+    assert os.stat(src).st_ino == os.stat(dst).st_ino
+
+
+def test_copy_file_reflink_fallback(source, tmpdir):
+    src = os.path.join(source, 'a.js')
+    dst = str(tmpdir.join('dst', 'a.js'))
+    mod.copy_file(src, dst, method=mod.REFLINK)
+    with open(dst) as f:
+        assert f.read() == 'a'
+
+
+def test_collector_invalid_method():
+    with pytest.raises(ValueError):
+        mod.Collector(method='invalid')
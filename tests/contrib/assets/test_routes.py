@@ -0,0 +1,145 @@
+import io
+import os
+
+import bottle
+import mock
+import pytest
+
+from librarian_core.contrib.assets import routes as mod
+from librarian_core.contrib.assets.utils import make_etag
+
+
+CONTENT = bytes(bytearray(i % 256 for i in range(1000)))
+
+
+@pytest.fixture
+def static(tmpdir):
+    tmpdir.join('data.bin').write(CONTENT, mode='wb')
+    return str(tmpdir)
+
+
+@pytest.fixture
+def app(static):
+    app = bottle.Bottle()
+    app.route('/<path:path>', ['GET', 'HEAD'],
+              lambda path: mod.send_file(path, static))
+    return app
+
+
+def call(app, path='/data.bin', method='GET', **headers):
+    environ = {'REQUEST_METHOD': method,
+               'PATH_INFO': path,
+               'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80',
+               'wsgi.input': io.BytesIO(),
+               'wsgi.errors': io.StringIO(),
+               'wsgi.url_scheme': 'http'}
+    for (name, value) in headers.items():
+        environ['HTTP_' + name.upper()] = value
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = int(status.split()[0])
+        response['headers'] = dict((name.lower(), value)
+                                   for (name, value) in response_headers)
+
+    result = app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return (response['status'], response['headers'], body)
+
+
+def test_send_file(app):
+    (status, headers, body) = call(app)
+    assert status == 200
+    assert headers['content-length'] == '1000'
+    assert headers['accept-ranges'] == 'bytes'
+    assert body == CONTENT
+
+
+def test_send_file_head(app):
+    (status, headers, body) = call(app, method='HEAD')
+    assert status == 200
+    assert headers['content-length'] == '1000'
+    assert body == b''
+
+
+def test_send_file_missing(app):
+    (status, _, _) = call(app, path='/missing.bin')
+    assert status == 404
+
+
+@pytest.mark.parametrize(('range_header', 'start', 'end'), [
+    ('bytes=0-9', 0, 10),
+    ('bytes=10-19', 10, 20),
+    ('bytes=990-', 990, 1000),
+    ('bytes=-5', 995, 1000),
+    ('bytes=0-9999', 0, 1000),
+])
+def test_send_file_range(app, range_header, start, end):
+    (status, headers, body) = call(app, range=range_header)
+    assert status == 206
+    assert headers['content-length'] == str(end - start)
+    assert headers['content-range'] == 'bytes {0}-{1}/1000'.format(start,
+                                                                  end - 1)
+    assert body == CONTENT[start:end]
+
+
+def test_send_file_range_not_satisfiable(app):
+    (status, headers, body) = call(app, range='bytes=2000-3000')
+    assert status == 416
+    assert headers['content-range'] == 'bytes */1000'
+    assert body == b''
+
+
+def test_send_file_if_range(app, static):
+    etag = make_etag(os.stat(os.path.join(static, 'data.bin')))
+    (status, _, body) = call(app, range='bytes=0-9', if_range=etag)
+    assert status == 206
+    assert body == CONTENT[:10]
+    (status, _, body) = call(app, range='bytes=0-9', if_range='"other"')
+    assert status == 200
+    assert body == CONTENT
+
+
+def test_send_file_not_modified(app):
+    (_, headers, _) = call(app)
+    (status, _, body) = call(app, if_none_match=headers['etag'])
+    assert status == 304
+    assert body == b''
+    (status, _, _) = call(app, if_none_match='"other"')
+    assert status == 200
+
+
+def test_send_file_not_modified_since(app):
+    (_, headers, _) = call(app)
+    (status, _, _) = call(app, if_modified_since=headers['last-modified'])
+    assert status == 304
+    (status, _, _) = call(app,
+                          if_modified_since='Thu, 01 Jan 1970 00:00:00 GMT')
+    assert status == 200
+
+
+@mock.patch.object(mod, 'request')
+def test_select_variant(request, tmpdir):
+    request.environ = {'HTTP_ACCEPT_ENCODING': 'gzip, br'}
+    root = str(tmpdir)
+    static_index = mock.Mock()
+    static_index.lookup.side_effect = lambda path: (
+        root if os.path.exists(os.path.join(root, path)) else None)
+    original = tmpdir.join('app.js')
+    original.write('var a = 1;')
+    gzipped = tmpdir.join('app.js.gz')
+    gzipped.write('compressed')
+    os.utime(str(original), (1000, 1000))
+    os.utime(str(gzipped), (1000, 1000))
+    assert mod.select_variant('app.js', root, static_index) == (
+        'app.js.gz', 'gzip')
+
+    # the original changed after the variant was built
+    os.utime(str(original), (2000, 2000))
+    assert mod.select_variant('app.js', root, static_index) == (
+        'app.js', None)
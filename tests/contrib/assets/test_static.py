@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from librarian_core.contrib.assets import static as mod
+
+
+@pytest.fixture
+def roots(tmpdir):
+    first = tmpdir.mkdir('first')
+    first.join('shared.css').write('first')
+    first.mkdir('js').join('app.js').write('app')
+    second = tmpdir.mkdir('second')
+    second.join('shared.css').write('second')
+    second.mkdir('img').join('logo.png').write('logo')
+    return [str(first), str(second)]
+
+
+def test_get_static_roots(tmpdir):
+    config = {'root': str(tmpdir),
+              'assets.directory': 'static',
+              'assets.sources': {'pkg': ('/pkg/static', '/static/')}}
+    assert mod.get_static_roots(config) == [str(tmpdir.join('static')),
+                                            '/pkg/static']
+
+
+def test_static_index_lookup(roots):
+    index = mod.StaticIndex(roots)
+    assert index.lookup('js/app.js') == roots[0]
+    assert index.lookup('/img/logo.png') == roots[1]
+    assert index.lookup('missing.js') is None
+    assert len(index) == 3
+
+
+def test_static_index_precedence(roots):
+    index = mod.StaticIndex(roots)
+    assert index.lookup('shared.css') == roots[0]
+
+
+def test_static_index_no_traversal(roots):
+    index = mod.StaticIndex([os.path.join(roots[0], 'js')])
+    assert index.lookup('app.js') is not None
+    assert index.lookup('../shared.css') is None
+
+
+def test_static_index_symlink_cycle(roots):
+    js = os.path.join(roots[0], 'js')
+    os.symlink(roots[0], os.path.join(js, 'loop'))
+    os.symlink(js, os.path.join(roots[0], 'scripts'))
+    index = mod.StaticIndex(roots)
+    assert index.lookup('scripts/app.js') == roots[0]
+    assert index.lookup('js/loop/js/app.js') is None
+    assert len(index) == 4
+
+
+def test_static_index_watch(roots):
+    index = mod.StaticIndex(roots, watch=False)
+    open(os.path.join(roots[1], 'new.js'), 'w').close()
+    assert index.lookup('new.js') is None
+    index.watch = True
+    assert index.lookup('new.js') == roots[1]
@@ -0,0 +1,55 @@
+import gzip
+import os
+
+import mock
+
+from librarian_core.contrib.assets import utils as mod
+
+
+def test_is_versioned():
+    assert mod.is_versioned('js/main-1a2b3c4d.js')
+    assert not mod.is_versioned('js/main.js')
+    assert not mod.is_versioned('js/jquery-min.js')
+
+
+def test_parse_accept_encoding():
+    header = 'gzip;q=1.0, br; q=0, identity, *;q=0.1'
+    assert mod.parse_accept_encoding(header) == set(['gzip', 'identity', '*'])
+    assert mod.parse_accept_encoding(None) == set()
+
+
+def test_etag_matches():
+    assert mod.etag_matches('"a-1"', '"b-2", "a-1"')
+    assert mod.etag_matches('"a-1"', 'W/"a-1"')
+    assert mod.etag_matches('"a-1"', '*')
+    assert not mod.etag_matches('"a-1"', '"a-2"')
+    assert not mod.etag_matches('"a-1"', None)
+
+
+def test_gzip_compress_is_deterministic():
+    data = b'body { color: red; }' * 100
+    assert mod.gzip_compress(data) == mod.gzip_compress(data)
+    assert gzip.GzipFile(fileobj=mod.io.BytesIO(
+        mod.gzip_compress(data))).read() == data
+
+
+def test_precompress(tmpdir):
+    path = tmpdir.join('main.css')
+    path.write('body { color: red; }' * 100)
+    compressors = [('.gz', mod.gzip_compress)]
+    assert mod.precompress(str(path), compressors) == 1
+    assert os.path.exists(str(path) + '.gz')
+    # up to date variants are not rewritten
+    assert mod.precompress(str(path), compressors) == 0
+
+
+def test_precompress_skips_small_files(tmpdir):
+    path = tmpdir.join('small.js')
+    path.write('x')
+    assert mod.precompress(str(path), [('.gz', mod.gzip_compress)]) == 0
+    assert not os.path.exists(str(path) + '.gz')
+
+
+@mock.patch.object(mod, 'brotli', None)
+def test_get_compressors_without_brotli():
+    assert [ext for ext, _ in mod.get_compressors()] == ['.gz']
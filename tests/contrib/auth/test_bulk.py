@@ -0,0 +1,197 @@
+import datetime
+import io
+import json
+
+import mock
+import pytest
+import pytz
+
+from librarian_core.contrib.auth import bulk as mod
+from librarian_core.contrib.auth import passwords
+
+
+CREATED = datetime.datetime(2015, 3, 4, 5, 6, 7, tzinfo=pytz.utc)
+
+
+def test_get_format():
+    assert mod.get_format('users.csv') == mod.CSV
+    assert mod.get_format('users.JSONL') == mod.JSONL
+    assert mod.get_format('users') == mod.CSV
+
+
+def test_read_users_csv():
+    f = io.StringIO(u'username,password,groups\n'
+                    u'foo,secret,"a,b"\n'
+                    u'bar,secret,\n')
+    assert list(mod.read_users(f, mod.CSV)) == [
+        dict(username='foo', password='secret', groups='a,b'),
+        dict(username='bar', password='secret', groups='')]
+
+
+def test_read_users_jsonl():
+    f = io.StringIO(u'{"username": "foo", "created": "2015-03-04T05:06:07"}'
+                    u'\n\n{"username": "bar", "groups": ["a"]}\n')
+    assert list(mod.read_users(f, mod.JSONL)) == [
+        dict(username='foo', created='2015-03-04T05:06:07'),
+        dict(username='bar', groups=['a'])]
+
+
+def test_read_users_jsonl_invalid():
+    f = io.StringIO(u'{"username": "foo"}\n{"username": \n')
+    assert list(mod.read_users(f, mod.JSONL)) == [
+        dict(username='foo'), '{"username":']
+
+
+def test_read_users_bytes():
+    # files are opened in binary mode on python 2
+    f = io.BytesIO(u'{"username": "j\xf6rg"}\n'.encode('utf-8'))
+    assert list(mod.read_users(f, mod.JSONL)) == [dict(username=u'j\xf6rg')]
+
+
+def test_to_text_and_bytes():
+    assert mod.to_text(u'j\xf6rg'.encode('utf-8')) == u'j\xf6rg'
+    assert mod.to_bytes(u'j\xf6rg') == u'j\xf6rg'.encode('utf-8')
+    assert mod.to_text(None) is None
+    assert mod.to_bytes(3) == 3
+
+
+def test_to_row():
+    row = mod.to_row(dict(username='foo',
+                          password='secret',
+                          groups='a,b,a',
+                          is_superuser='yes',
+                          reset_token='123456',
+                          created='2015-03-04T05:06:07+00:00',
+                          options='{"language": "en"}'), 1000)
+    assert passwords.crypt('secret', row['password']) == row['password']
+    assert passwords.get_iterations(row['password']) == 1000
+    assert row['reset_token'] == mod.hash_reset_token('123456')
+    assert row['created'] == CREATED
+    assert json.loads(row['options']) == {'language': 'en'}
+    assert row['groups'] == 'a,b,superuser'
+
+
+@mock.patch.object(mod, 'crypt')
+def test_to_row_hashed(crypt):
+    encrypted = '$p5k2$$salt$hash'
+    token = mod.hash_reset_token('123456')
+    row = mod.to_row(dict(username='foo',
+                          password=encrypted,
+                          reset_token=token,
+                          groups=['a']), 1000)
+    assert not crypt.called
+    assert row['password'] == encrypted
+    assert row['reset_token'] == token
+    assert row['groups'] == 'a'
+    assert isinstance(row['created'], datetime.datetime)
+
+
+@pytest.mark.parametrize('record', [
+    dict(username='', password='secret'),
+    dict(username='foo', password=' '),
+    dict(username='foo', password='secret', created='yesterday'),
+    dict(username='foo', password=1234),
+    dict(username=5, password='secret'),
+    dict(username='foo', password='secret', groups=5),
+    dict(username='foo', password='secret', groups=['a', 1]),
+    dict(username='foo', password='secret', reset_token=123456),
+    dict(username='foo', password='secret', options='[1, 2]'),
+])
+def test_prepare_user_invalid(record):
+    (row, error) = mod.prepare_user(1000, record)
+    assert row is None
+    assert error.startswith('{0}: '.format(record['username']))
+
+
+def test_prepare_user_not_a_record():
+    (row, error) = mod.prepare_user(1000, '{"username":')
+    assert row is None
+    assert error == '{"username":: not a user record'
+
+
+def test_write_users():
+    db = mock.MagicMock()
+    cursor = db.transaction.return_value.__enter__.return_value
+    rows = [dict(username='foo', groups='a,b'),
+            dict(username='bar', groups=''),
+            dict(username='foo', groups='c')]
+    assert mod.write_users(db, rows) == 2
+    db.Replace.assert_called_once_with('users',
+                                       constraints=['username'],
+                                       cols=mod.USER_COLUMNS)
+    db.Delete.assert_called_once_with('user_groups',
+                                      where='username = %(username)s')
+    db.Insert.assert_called_once_with('user_groups',
+                                      cols=('username', 'group_name'))
+    users = [dict(username='foo', groups='c'), dict(username='bar', groups='')]
+    cursor.executemany.assert_has_calls([
+        mock.call(db.Replace.return_value.serialize.return_value, users),
+        mock.call(db.Delete.return_value.serialize.return_value, users),
+        mock.call(db.Insert.return_value.serialize.return_value,
+                  [dict(username='foo', group_name='c')])])
+
+
+@mock.patch.object(mod, 'write_users')
+def test_import_users(write_users):
+    write_users.side_effect = lambda db, rows: len(rows)
+    db = mock.Mock()
+    db.fetchall.return_value = [{'name': 'a'}, {'name': 'superuser'}]
+    report = mock.Mock()
+    records = [dict(username='user{0}'.format(i), password='secret',
+                    groups='a')
+               for i in range(5)]
+    records.append(dict(username='bad', password=''))
+    records.append(dict(username='other', password='secret', groups='b'))
+    (count, errors) = mod.import_users(db, iter(records), 400, processes=1,
+                                       batch_size=2, report=report)
+    assert count == 5
+    assert errors == ['bad: invalid username or password',
+                      'other: unknown groups: b']
+    assert [len(c[0][1]) for c in write_users.call_args_list] == [2, 2, 1]
+    assert report.call_count == 3
+    assert report.call_args[0][:2] == (5, 2)
+
+
+def test_export_users():
+    db = mock.Mock()
+    db.fetchiter.return_value = [
+        dict(username='foo', password='$p5k2$$salt$hash', reset_token=None,
+             created=CREATED, options='{"language": "en"}', groups='a,b')]
+    f = io.StringIO()
+    assert mod.export_users(db, f, mod.JSONL) == 1
+    db.Select.assert_called_once_with(sets='users', order='username')
+    assert json.loads(f.getvalue()) == dict(
+        username='foo', password='$p5k2$$salt$hash', reset_token=None,
+        created='2015-03-04T05:06:07+00:00', options={'language': 'en'},
+        groups=['a', 'b'])
+    # exported users can be imported as they are
+    f.seek(0)
+    (record,) = mod.read_users(f, mod.JSONL)
+    row = mod.to_row(record, 400)
+    assert row['password'] == '$p5k2$$salt$hash'
+    assert row['created'] == CREATED
+
+
+@mock.patch.object(mod, 'PY2', True)
+def test_export_users_bytes():
+    db = mock.Mock()
+    db.fetchiter.return_value = [
+        dict(username=u'j\xf6rg', password='$p5k2$$salt$hash',
+             reset_token=None, created=CREATED, options='{}', groups='')]
+    f = io.BytesIO()
+    assert mod.export_users(db, f, mod.JSONL) == 1
+    assert json.loads(f.getvalue().decode('utf-8'))['username'] == u'j\xf6rg'
+
+
+def test_export_users_csv():
+    db = mock.Mock()
+    db.fetchiter.return_value = [
+        dict(username='foo', password='$p5k2$$salt$hash', reset_token=None,
+             created=CREATED, options='{}', groups='a,b')]
+    f = io.StringIO()
+    mod.export_users(db, f, mod.CSV)
+    f.seek(0)
+    (record,) = mod.read_users(f, mod.CSV)
+    assert record == dict(username='foo', password='$p5k2$$salt$hash',
+                          reset_token='', created='2015-03-04T05:06:07+00:00',
+                          options='{}', groups='a,b')
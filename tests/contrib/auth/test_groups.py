@@ -41,3 +41,14 @@ def test_save(cast):
                                      name=group.name,
                                      permissions=group.permissions,
                                      has_superpowers=group.has_superpowers)
+
+
+def test_get_members():
+    db = mock.Mock()
+    db.fetchall.return_value = [{'username': 'a'}, {'username': 'b'}]
+    group = mod.Group(name='grp1', db=db)
+    assert group.get_members() == ['a', 'b']
+    db.Select.assert_called_once_with(what='username',
+                                      sets='user_groups',
+                                      where='group_name = %s')
+    db.fetchall.assert_called_once_with(db.Select.return_value, ('grp1',))
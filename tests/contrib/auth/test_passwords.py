@@ -0,0 +1,69 @@
+import mock
+import pbkdf2
+import pytest
+
+from librarian_core.contrib.auth import passwords as mod
+
+
+@pytest.mark.parametrize('iterations', [mod.DEFAULT_ITERATIONS, 1000])
+def test_crypt_compatible(iterations):
+    encrypted = pbkdf2.crypt(u'p\xe4ssword', iterations=iterations)
+    assert mod.crypt(u'p\xe4ssword', encrypted) == encrypted
+    encrypted = mod.crypt('password', iterations=iterations)
+    assert pbkdf2.crypt('password', encrypted) == encrypted
+
+
+def test_crypt_without_hashlib():
+    with mock.patch.object(mod, 'hashlib', object()):
+        encrypted = mod.crypt('password', 'saltsalt', 1000)
+    assert encrypted == pbkdf2.crypt('password', 'saltsalt', 1000)
+
+
+def test_get_iterations():
+    assert mod.get_iterations('$p5k2$$salt$hash') == 400
+    assert mod.get_iterations('$p5k2$3e8$salt$hash') == 1000
+    with pytest.raises(ValueError):
+        mod.get_iterations('plain')
+
+
+def test_hasher():
+    hasher = mod.PasswordHasher(iterations=1000, threads=1)
+    encrypted = hasher.encrypt('password')
+    assert mod.get_iterations(encrypted) == 1000
+    assert hasher.verify('password', encrypted)
+    assert not hasher.verify('other', encrypted)
+    assert not hasher.verify('password', 'plain')
+
+
+def strict_compare_digest(a, b, compare_digest=mod.hmac.compare_digest):
+    # like on python 2, where comparing str with unicode raises TypeError
+    if type(a) is not type(b):
+        raise TypeError('mismatching types')
+    return compare_digest(a, b)
+
+
+@pytest.mark.parametrize('convert', [
+    lambda encrypted: u'' + encrypted,
+    lambda encrypted: encrypted.encode('ascii'),
+])
+def test_hasher_verify_types(convert):
+    hasher = mod.PasswordHasher(iterations=1000, threads=1)
+    encrypted = convert(hasher.encrypt('password'))
+    with mock.patch.object(mod.hmac, 'compare_digest',
+                           side_effect=strict_compare_digest):
+        assert hasher.verify(u'password', encrypted)
+        assert not hasher.verify(u'other', encrypted)
+    assert not hasher.verify('password', u'$p5k2$$s\xe4lt$hash')
+
+
+@mock.patch.object(mod.hmac, 'compare_digest', side_effect=TypeError)
+def test_hasher_verify_type_error(compare_digest):
+    hasher = mod.PasswordHasher(iterations=1000, threads=1)
+    assert not hasher.verify('password', hasher.encrypt('password'))
+
+
+def test_hasher_needs_upgrade():
+    hasher = mod.PasswordHasher(iterations=1000)
+    assert not hasher.needs_upgrade('$p5k2$3e8$salt$hash')
+    assert hasher.needs_upgrade('$p5k2$$salt$hash')
+    assert hasher.needs_upgrade('plain')
@@ -22,8 +22,8 @@ class TestBaseDynamicPermission(object):
         assert bdp.data == _load.return_value
         _load.assert_called_once_with()
 
-    @mock.patch.object(mod, 'json')
-    def test__load(self, json, dyn_perm_cls):
+    @mock.patch.object(mod, 'serializers')
+    def test__load(self, serializers, dyn_perm_cls):
         db = mock.Mock()
         bdp = dyn_perm_cls('id', db=db)
 
@@ -34,21 +34,20 @@ class TestBaseDynamicPermission(object):
         db.query.assert_called_once_with(db.Select.return_value,
                                          name='dynamo',
                                          identifier='id')
-        json.loads.assert_called_once_with(db.result.data,
-                                           cls=mod.DateTimeDecoder)
-        assert bdp.data == json.loads.return_value
+        serializers.loads.assert_called_once_with(db.result.data)
+        assert bdp.data == serializers.loads.return_value
 
-    @mock.patch.object(mod, 'json')
-    def test__load_no_data(self, json, dyn_perm_cls):
+    @mock.patch.object(mod, 'serializers')
+    def test__load_no_data(self, serializers, dyn_perm_cls):
         db = mock.Mock()
         db.result = None
         bdp = dyn_perm_cls('id', db=db)
-        assert not json.loads.called
+        assert not serializers.loads.called
         assert bdp.data == {}
 
     @mock.patch.object(mod.BaseDynamicPermission, '_load')
-    @mock.patch.object(mod, 'json')
-    def test_save(self, json, _load, dyn_perm_cls):
+    @mock.patch.object(mod, 'serializers')
+    def test_save(self, serializers, _load, dyn_perm_cls):
         db = mock.Mock()
         bdp = dyn_perm_cls('id', db=db)
         bdp.data = {'test': 1}
@@ -61,11 +60,11 @@ class TestBaseDynamicPermission(object):
             data=':data',
             where='name = :name AND identifier = :identifier'
         )
-        json.dumps.assert_called_once_with(bdp.data, cls=mod.DateTimeEncoder)
+        serializers.dumps.assert_called_once_with(bdp.data)
         db.query.assert_called_once_with(db.Replace.return_value,
                                          name=bdp.name,
                                          identifier=bdp.identifier,
-                                         data=json.dumps.return_value)
+                                         data=serializers.dumps.return_value)
 
 
 class TestACLPermission(object):
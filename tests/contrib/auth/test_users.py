@@ -1,5 +1,8 @@
+import datetime
+
 import mock
 import pytest
+import pytz
 
 from librarian_core.contrib.auth import users as mod
 
@@ -79,37 +82,103 @@ def test_logout(request):
     assert request.user.is_authenticated is False
 
 
+def make_group(name):
+    group = mock.Mock()
+    group.name = name
+    return group
+
+
 @mock.patch.object(mod, 'Options')
 def test_save(Options):
-    db = mock.Mock()
+    db = mock.MagicMock()
+    cursor = db.transaction.return_value.__enter__.return_value
     user = mod.User(username='test', db=db)
-    group1 = mock.Mock()
-    group1.name = 'grp1'
-    group2 = mock.Mock()
-    group2.name = 'grp2'
-    user.groups = [group1, group2]
+    user.groups = [make_group('grp1'), make_group('grp2')]
     user.options = Options()
 
     user.save()
 
-    db.Replace.assert_called_once_with('users', cols=('username',
-                                                      'password',
-                                                      'reset_token',
-                                                      'created',
-                                                      'options',
-                                                      'groups'))
-    db.query.assert_called_once_with(db.Replace.return_value,
-                                     username=user.username,
-                                     password=user.password,
-                                     reset_token=user.reset_token,
-                                     created=user.created,
-                                     options=user.options.to_json.return_value,
-                                     groups='grp1,grp2')
+    db.Replace.assert_called_once_with('users',
+                                       constraints=['username'],
+                                       cols=('username',
+                                             'password',
+                                             'reset_token',
+                                             'created',
+                                             'options',
+                                             'groups'))
+    cursor.execute.assert_has_calls([
+        mock.call(db.Replace.return_value.serialize.return_value,
+                  dict(username=user.username,
+                       password=user.password,
+                       reset_token=user.reset_token,
+                       created=user.created,
+                       options=user.options.to_json.return_value,
+                       groups='grp1,grp2')),
+        mock.call(db.Delete.return_value.serialize.return_value, ('test',)),
+    ])
+    cursor.executemany.assert_called_once_with(
+        db.Insert.return_value.serialize.return_value,
+        [dict(username='test', group_name='grp1'),
+         dict(username='test', group_name='grp2')])
+    assert db.transaction.call_count == 1
+
+
+@mock.patch.object(mod, 'Options')
+@mock.patch.object(mod.Group, 'from_name')
+def test_save_groups_unchanged(from_name, Options):
+    from_name.side_effect = lambda name, db: make_group(name)
+    db = mock.MagicMock()
+    cursor = db.transaction.return_value.__enter__.return_value
+    user = mod.User(username='test', groups='grp1,grp2', db=db)
+
+    # e.g. when the options of the user change
+    user.save()
+    assert cursor.execute.call_count == 1
+    assert not db.Delete.called
+    assert not cursor.executemany.called
+
+    user.groups.pop()
+    user.save()
+    assert db.Delete.called
+    cursor.executemany.assert_called_once_with(
+        db.Insert.return_value.serialize.return_value,
+        [dict(username='test', group_name='grp1')])
+
+
+@mock.patch.object(mod, 'Options')
+def test_save_groups(Options):
+    db = mock.MagicMock()
+    cursor = db.transaction.return_value.__enter__.return_value
+    user = mod.User(username='test', db=db)
+    user.groups = [make_group('grp1'), make_group('grp2')]
+
+    user.save_groups()
+
+    db.Delete.assert_called_once_with('user_groups',
+                                      where='username = %s')
+    cursor.execute.assert_called_once_with(
+        db.Delete.return_value.serialize.return_value, ('test',))
+    db.Insert.assert_called_once_with('user_groups',
+                                      cols=('username', 'group_name'))
+    cursor.executemany.assert_called_once_with(
+        db.Insert.return_value.serialize.return_value,
+        [dict(username='test', group_name='grp1'),
+         dict(username='test', group_name='grp2')])
+
+
+@mock.patch.object(mod, 'Options')
+def test_save_groups_no_groups(Options):
+    db = mock.MagicMock()
+    cursor = db.transaction.return_value.__enter__.return_value
+    user = mod.User(username='test', db=db)
+    user.save_groups()
+    assert cursor.execute.called
+    assert not cursor.executemany.called
 
 
 @mock.patch.object(mod, 'Options')
-@mock.patch.object(mod, 'json')
-def test_to_json(json, Options):
+@mock.patch.object(mod, 'serializers')
+def test_to_json(serializers, Options):
     db = mock.Mock()
     user = mod.User(username='test', db=db)
     group1 = mock.Mock()
@@ -119,7 +188,7 @@ def test_to_json(json, Options):
     user.groups = [group1, group2]
     user.options = Options()
 
-    assert user.to_json() == json.dumps.return_value
+    assert user.to_json() == serializers.dumps.return_value
 
     data = dict(username=user.username,
                 password=user.password,
@@ -127,18 +196,58 @@ def test_to_json(json, Options):
                 created=user.created,
                 options=user.options.to_native.return_value,
                 groups='grp1,grp2')
-    json.dumps.assert_called_once_with(data, cls=mod.DateTimeEncoder)
+    serializers.dumps.assert_called_once_with(data)
 
 
 @mock.patch.object(mod.User, '__init__')
-@mock.patch.object(mod, 'json')
-def test_from_json(json, init):
+@mock.patch.object(mod, 'serializers')
+def test_from_json(serializers, init):
     data = '{"a": 1, "b": 2}'
-    json.loads.return_value = {'a': 1, 'b': 2}
+    serializers.loads.return_value = {'a': 1, 'b': 2}
     init.return_value = None
     mod.User.from_json(data)
-    json.loads.assert_called_once_with(data, cls=mod.DateTimeDecoder)
-    init.assert_called_once_with(**json.loads.return_value)
+    serializers.loads.assert_called_once_with(data)
+    init.assert_called_once_with(**serializers.loads.return_value)
+
+
+@mock.patch.object(mod.User, '__init__')
+def test_from_session(init):
+    init.return_value = None
+    data = {'username': 'test', 'created': '2015-03-04T05:06:07+00:00'}
+    mod.User.from_session(data)
+    created = datetime.datetime(2015, 3, 4, 5, 6, 7, tzinfo=pytz.utc)
+    init.assert_called_once_with(username='test', created=created)
+    # the session data is left intact
+    assert data['created'] == '2015-03-04T05:06:07+00:00'
+
+
+@mock.patch.object(mod.User, '__init__')
+def test_from_session_empty(init):
+    init.return_value = None
+    mod.User.from_session(None)
+    init.assert_called_once_with()
+
+
+@mock.patch.object(mod.User, 'from_json')
+def test_from_session_json(from_json):
+    data = '{"username": "test"}'
+    assert mod.User.from_session(data) == from_json.return_value
+    from_json.assert_called_once_with(data)
+
+
+@mock.patch.object(mod, 'row_to_dict')
+@mock.patch.object(mod.User, '__init__')
+def test_from_group(init, row_to_dict):
+    init.return_value = None
+    db = mock.Mock()
+    db.fetchall.return_value = [{'username': 'a'}, {'username': 'b'}]
+    row_to_dict.side_effect = lambda row: row
+    users = mod.User.from_group('grp1', db=db)
+    assert len(users) == 2
+    where = db.Select.call_args[1]['where']
+    assert 'user_groups' in where
+    db.fetchall.assert_called_once_with(db.Select.return_value, ('grp1',))
+    init.assert_has_calls([mock.call(username='a'), mock.call(username='b')])
 
 
 @mock.patch.object(mod.User, '__init__')
@@ -264,14 +373,34 @@ def test_login_invalid_password(request, from_username, is_valid_password):
     assert request.user != from_username.return_value
 
 
+@mock.patch.object(mod.User, 'set_password')
+@mock.patch.object(mod.User, 'password_needs_upgrade')
 @mock.patch.object(mod.User, 'is_valid_password')
 @mock.patch.object(mod.User, 'from_username')
 @mock.patch.object(mod, 'request')
-def test_login_success(request, from_username, is_valid_password):
+def test_login_success(request, from_username, is_valid_password,
+                       password_needs_upgrade, set_password):
     db = mock.Mock()
+    password_needs_upgrade.return_value = False
     assert mod.User.login('name', 'pass', db=db) == from_username.return_value
     assert request.user == from_username.return_value
     request.session.rotate.assert_called_once_with()
+    assert not set_password.called
+
+
+@mock.patch.object(mod.User, 'set_password')
+@mock.patch.object(mod.User, 'password_needs_upgrade')
+@mock.patch.object(mod.User, 'is_valid_password')
+@mock.patch.object(mod.User, 'from_username')
+@mock.patch.object(mod, 'request')
+def test_login_upgrade_password(request, from_username, is_valid_password,
+                                password_needs_upgrade, set_password):
+    db = mock.Mock()
+    user = from_username.return_value
+    password_needs_upgrade.return_value = True
+    assert mod.User.login('name', 'pass', db=db) == user
+    set_password.assert_called_once_with('name', 'pass', db=db)
+    assert user.password == set_password.return_value
 
 
 @mock.patch.object(mod.User, 'encrypt_password')
@@ -287,17 +416,17 @@ def test_set_password(encrypt_password):
                                      password=encrypt_password.return_value)
 
 
-@mock.patch.object(mod, 'pbkdf2')
-def test_encrypt_password(pbkdf2):
-    assert mod.User.encrypt_password('password') == pbkdf2.crypt.return_value
-    pbkdf2.crypt.assert_called_once_with('password')
+@mock.patch.object(mod.User, 'hasher')
+def test_encrypt_password(hasher):
+    assert mod.User.encrypt_password('password') == hasher.encrypt.return_value
+    hasher.encrypt.assert_called_once_with('password')
 
 
-@mock.patch.object(mod, 'pbkdf2')
-def test_is_valid_password(pbkdf2):
-    pbkdf2.crypt.return_value = 'encrypted'
-    assert mod.User.is_valid_password('password', 'encrypted') is True
-    pbkdf2.crypt.assert_called_once_with('password', 'encrypted')
+@mock.patch.object(mod.User, 'hasher')
+def test_is_valid_password(hasher):
+    assert (mod.User.is_valid_password('password', 'encrypted') ==
+            hasher.verify.return_value)
+    hasher.verify.assert_called_once_with('password', 'encrypted')
 
 
 @mock.patch.object(mod, 'generate_random_key')
@@ -0,0 +1,110 @@
+import threading
+
+import bottle
+import gevent
+import mock
+
+from gevent.pool import Pool
+from multiprocessing.pool import ThreadPool
+
+from librarian_core.contrib.databases import helpers as mod
+from librarian_core.contrib.databases.timing import TimedDatabase
+
+
+class Container(dict):
+    def __init__(self, databases, **kwargs):
+        super(Container, self).__init__(databases)
+
+
+CONFIGS = dict(auth=dict(package_name='auth'),
+               sessions=dict(package_name='sessions'))
+
+
+def test_run_migrations_greenlets():
+    running = []
+
+    def migrate(name, config):
+        running.append(name)
+        gevent.sleep(0.01)
+        assert len(running) == 2
+
+    mod.run_migrations(migrate, CONFIGS, 4, Pool)
+
+
+def test_run_migrations_threads():
+    running = []
+    both_running = threading.Event()
+
+    def migrate(name, config):
+        running.append(name)
+        if len(running) == 2:
+            both_running.set()
+        assert both_running.wait(1)
+
+    mod.run_migrations(migrate, CONFIGS, 2, ThreadPool)
+
+
+def test_run_migrations_sequential():
+    migrate = mock.Mock()
+    mod.run_migrations(migrate, CONFIGS, 1, ThreadPool)
+    assert sorted(migrate.call_args_list) == [
+        mock.call('auth', CONFIGS['auth']),
+        mock.call('sessions', CONFIGS['sessions'])]
+
+
+def test_lazy_database_connects_on_first_use():
+    database = mock.Mock()
+    connect = mock.Mock(return_value=database)
+    databases = mod.get_lazy_databases(Container, CONFIGS, connect)
+    proxy = databases['auth']
+    assert not connect.called
+    assert proxy.fetchone is database.fetchone
+    connect.assert_called_once_with('auth', CONFIGS['auth'])
+    # replaced by the database itself
+    assert databases['auth'] is database
+    assert isinstance(databases['sessions'], mod.LazyDatabase)
+
+
+def test_lazy_database_connects_once():
+    def connect(name, config):
+        gevent.sleep(0.01)
+        return mock.Mock()
+
+    connect = mock.Mock(side_effect=connect)
+    proxy = mod.get_lazy_databases(Container, CONFIGS, connect)['auth']
+    results = [g.value for g in gevent.joinall([
+        gevent.spawn(lambda: proxy.execute),
+        gevent.spawn(lambda: proxy.execute)])]
+    assert results[0] is results[1]
+    assert connect.call_count == 1
+
+
+def test_lazy_database_close_without_connecting():
+    connect = mock.Mock()
+    databases = mod.get_lazy_databases(Container, CONFIGS, connect)
+    mod.close_databases(databases)
+    assert not connect.called
+    assert mod.get_pools(databases) == []
+    assert not connect.called
+
+
+@mock.patch.object(mod, 'connect_database')
+@mock.patch.object(mod, 'import_squery')
+def test_lazy_migrations_untimed(import_squery, connect_database):
+    database_cls = mock.Mock()
+    database_cls.migrate.side_effect = lambda db, package, config: (
+        db.execute('CREATE TABLE foo;'), db.execute('CREATE TABLE bar;'))
+    import_squery.return_value = (database_cls, Container)
+    connect_database.return_value = TimedDatabase(mock.Mock())
+    config = {'database.backend': 'postgres',
+              'database.sources': {'librarian_core.contrib.auth': ['auth']},
+              'database.host': None,
+              'database.port': None,
+              'database.user': None,
+              'database.password': None}
+    databases = mod.init_databases(config)
+    bottle.request.bind({})
+    databases['auth'].fetchone('SELECT 1;')
+    assert database_cls.migrate.called
+    # only the query of the request is counted, not the migrations
+    assert bottle.request.db_queries.count == 1
@@ -0,0 +1,152 @@
+import gevent
+import mock
+import pytest
+
+from librarian_core.contrib.databases import pool as mod
+
+
+class Connection(object):
+    isolation_level = 0
+
+    def __init__(self):
+        self.closed = 0
+        self.cursor = mock.Mock()
+        self.commit = mock.Mock()
+        self.rollback = mock.Mock()
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def pool():
+    return mod.ConnectionPool(Connection, minsize=0, maxsize=2,
+                              check=lambda conn: not conn.closed)
+
+
+def test_get_reuses_returned_connection(pool):
+    conn = pool.get()
+    pool.put(conn)
+    assert pool.get() is conn
+    assert pool.size == 1
+
+
+def test_get_waits_for_connection(pool):
+    first = pool.get()
+    pool.get()
+
+    def put_later():
+        gevent.sleep(0.01)
+        pool.put(first)
+
+    gevent.spawn(put_later)
+    assert pool.get() is first
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['max_wait'] > 0
+    assert stats['size'] == stats['peak'] == stats['in_use'] == 2
+    assert stats['utilization'] == 1.0
+
+
+def test_get_timeout(pool):
+    pool.timeout = 0.01
+    pool.get()
+    pool.get()
+    with pytest.raises(mod.PoolTimeout):
+        pool.get()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_get_discards_broken_connection(pool):
+    pool.check_after = 0
+    conn = pool.get()
+    pool.put(conn)
+    conn.closed = 2
+    assert pool.get() is not conn
+    assert pool.size == 1
+    assert pool.stats()['discarded'] == 1
+
+
+def test_bind(pool):
+    with pool.bind():
+        conn = pool.get()
+        pool.put(conn)
+        assert pool.get() is conn
+        pool.put(conn)
+        assert pool.in_use == 1
+    assert pool.in_use == 0
+    assert pool.get() is conn
+
+
+def test_bind_per_greenlet(pool):
+    def worker():
+        with pool.bind():
+            conn = pool.get()
+            pool.put(conn)
+            gevent.sleep(0)
+            return conn
+
+    (first, second) = [g.value for g in gevent.joinall([gevent.spawn(worker),
+                                                        gevent.spawn(worker)])]
+    assert first is not second
+    assert pool.in_use == 0
+
+
+def test_put_by_other_greenlet(pool):
+    with pool.bind():
+        conn = pool.get()
+        owner = gevent.getcurrent()
+        gevent.spawn(pool.put, conn, greenlet=owner).join()
+        # still bound to the greenlet which obtained it
+        assert pool.in_use == 1
+    assert pool.in_use == 0
+
+
+def test_connection_commits_outermost_only(pool):
+    with pool.bind():
+        with pool.connection() as conn:
+            with pool.connection() as nested:
+                assert nested is conn
+            assert not conn.commit.called
+        conn.commit.assert_called_once_with()
+
+
+def test_connection_rolls_back(pool):
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError()
+    conn.rollback.assert_called_once_with()
+    assert not conn.commit.called
+    assert pool.in_use == 0
+
+
+def test_reap(pool):
+    pool.minsize = 1
+    pool.idle_timeout = 0
+    (first, second) = (pool.get(), pool.get())
+    pool.put(first)
+    pool.put(second)
+    pool.reap()
+    assert pool.size == 1
+    assert first.closed
+    assert not second.closed
+
+
+def test_reap_fills_minsize(pool):
+    pool.minsize = 2
+    pool.reap()
+    assert pool.size == 2
+    assert pool.stats()['idle'] == 2
+
+
+def test_closeall(pool):
+    conn = pool.get()
+    idle = pool.get()
+    pool.put(idle)
+    pool.closeall()
+    assert idle.closed
+    pool.put(conn)
+    assert conn.closed
+    assert pool.size == 0
+    with pytest.raises(RuntimeError):
+        pool.get()
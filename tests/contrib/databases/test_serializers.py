@@ -0,0 +1,98 @@
+import datetime
+import json
+
+import pytest
+import pytz
+
+from librarian_core.contrib.databases import serializers as mod
+
+
+def test_parse_datetime():
+    assert (mod.parse_datetime('2015-03-04T05:06:07') ==
+            datetime.datetime(2015, 3, 4, 5, 6, 7))
+    assert (mod.parse_datetime('2015-03-04 05:06:07.25') ==
+            datetime.datetime(2015, 3, 4, 5, 6, 7, 250000))
+
+
+def test_parse_datetime_timezone():
+    expected = datetime.datetime(2015, 3, 4, 5, 6, 7, tzinfo=pytz.utc)
+    assert mod.parse_datetime('2015-03-04T05:06:07Z') == expected
+    assert mod.parse_datetime('2015-03-04T05:06:07+00:00') == expected
+    assert mod.parse_datetime('2015-03-04T07:36:07+0230') == expected
+    assert mod.parse_datetime('2015-03-04T03:06:07-02:00') == expected
+
+
+def test_parse_datetime_other_strings():
+    for value in ('may', 'March 4th', '2015-03-04', '12', '1.5',
+                  '2015-13-04T05:06:07', '2015-03-04T05:06:07 and more'):
+        assert mod.parse_datetime(value) is value
+
+
+def test_roundtrip():
+    data = dict(created=datetime.datetime(2015, 3, 4, 5, 6, 7, 123456,
+                                          tzinfo=pytz.utc),
+                nested=dict(updated=datetime.datetime(2015, 3, 4)),
+                name='may',
+                count=3)
+    encoded = json.dumps(data, cls=mod.DateTimeEncoder)
+    assert json.loads(encoded, cls=mod.DateTimeDecoder) == data
+
+
+@pytest.fixture(params=[name for (name, _, _, available) in mod.BACKENDS
+                        if available()])
+def backend(request):
+    original = mod.backend
+    mod.use_backend(request.param)
+    yield request.param
+    mod.use_backend(original)
+
+
+def test_backend_roundtrip(backend):
+    data = dict(created=datetime.datetime(2015, 3, 4, 5, 6, 7, 123456,
+                                          tzinfo=pytz.utc),
+                items=[dict(updated=datetime.datetime(2015, 3, 4))],
+                name='may',
+                count=3)
+    encoded = mod.dumps(data)
+    assert json.loads(encoded) == json.loads(
+        json.dumps(data, cls=mod.DateTimeEncoder))
+    assert mod.loads(encoded) == data
+
+
+def test_backend_loads_without_datetimes(backend):
+    encoded = '{"created": "2015-03-04T05:06:07", "count": 3}'
+    assert mod.loads(encoded, datetimes=False) == {
+        'created': '2015-03-04T05:06:07', 'count': 3}
+
+
+@pytest.mark.parametrize('value', [object(),
+                                   datetime.date(2015, 3, 4),
+                                   datetime.time(5, 6, 7)])
+def test_backend_not_serializable(backend, value):
+    with pytest.raises(TypeError):
+        mod.dumps(dict(value=value))
+
+
+def test_use_backend():
+    original = mod.backend
+    try:
+        assert mod.use_backend('json') == 'json'
+        assert mod.dumps is mod.stdlib_dumps
+        assert mod.loads is mod.stdlib_loads
+    finally:
+        mod.use_backend(original)
+
+
+def test_use_backend_unavailable():
+    with pytest.raises(ValueError):
+        mod.use_backend('nonexistent')
+
+
+def test_encode_datetimes():
+    created = datetime.datetime(2015, 3, 4, 5, 6, 7, tzinfo=pytz.utc)
+    data = dict(created=created, items=(dict(updated=created), 'may'))
+    assert mod.encode_datetimes(data) == dict(
+        created='2015-03-04T05:06:07+00:00',
+        items=[dict(updated='2015-03-04T05:06:07+00:00'), 'may'])
+    # the original is left intact
+    assert data['created'] is created
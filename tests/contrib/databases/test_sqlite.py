@@ -0,0 +1,144 @@
+import gevent
+import mock
+import pytest
+
+pytest.importorskip('squery_lite')
+
+from librarian_core.contrib.databases import sqlite as mod
+from librarian_core.contrib.databases.utils import to_binary
+
+
+PRAGMAS = [('journal_mode', 'WAL'),
+           ('synchronous', 'NORMAL'),
+           ('busy_timeout', 1000)]
+
+
+@pytest.fixture
+def db(tmpdir):
+    db = mod.Database.connect(str(tmpdir.join('test.db')),
+                              pragmas=PRAGMAS,
+                              pool_options=dict(maxsize=2))
+    db.executescript('CREATE TABLE items (name TEXT);')
+    yield db
+    db.close()
+
+
+def test_connection_pragmas(db):
+    assert db.query('PRAGMA synchronous;').result[0] == 1  # NORMAL
+    assert db.query('PRAGMA busy_timeout;').result[0] == 1000
+    assert db.query('PRAGMA journal_mode;').result[0] == 'wal'
+
+
+def test_reads_use_reader_connection(db):
+    db.execute('INSERT INTO items VALUES (?);', ('a',))
+    assert db.fetchone('SELECT name FROM items;')['name'] == 'a'
+    assert db.pool.stats()['checkouts'] == 1
+    with pytest.raises(Exception):
+        with db.pool.bind():
+            conn = db.pool.get()
+            conn.execute('INSERT INTO items VALUES (?);', ('b',))
+
+
+def test_reads_within_transaction_see_changes(db):
+    with db.transaction():
+        db.execute('INSERT INTO items VALUES (?);', ('a',))
+        assert len(db.fetchall('SELECT * FROM items;')) == 1
+    assert db.pool.stats()['checkouts'] == 0
+
+
+def test_readers_not_affected_by_open_transaction(db):
+    def write():
+        with db.transaction():
+            db.execute('INSERT INTO items VALUES (?);', ('a',))
+            gevent.sleep(0.01)
+
+    writer = gevent.spawn(write)
+    gevent.sleep(0)
+    assert db.fetchall('SELECT * FROM items;') == []
+    writer.join()
+    assert len(db.fetchall('SELECT * FROM items;')) == 1
+
+
+def test_writes_wait_for_open_transaction(db):
+    order = []
+
+    def write():
+        with db.transaction():
+            db.execute('INSERT INTO items VALUES (?);', ('a',))
+            gevent.sleep(0.01)
+            order.append('transaction')
+
+    writer = gevent.spawn(write)
+    gevent.sleep(0)
+    db.execute('INSERT INTO items VALUES (?);', ('b',))
+    order.append('write')
+    writer.join()
+    assert order == ['transaction', 'write']
+
+
+def test_reader_held_until_cursor_exhausted(db):
+    db.executemany('INSERT INTO items VALUES (?);', [('a',), ('b',)])
+    cursor = db.query('SELECT name FROM items;')
+    assert db.pool.in_use == 1
+    assert cursor.result['name'] == 'a'
+    assert db.pool.in_use == 1
+    assert [row['name'] for row in cursor] == ['b']
+    assert db.pool.in_use == 0
+
+    cursor = db.execute('SELECT name FROM items;')
+    cursor.close()
+    assert db.pool.in_use == 0
+    assert len(db.execute('SELECT name FROM items;').results) == 2
+    assert db.pool.in_use == 0
+
+
+def test_fetch_within_checkout(db):
+    db.executemany('INSERT INTO items VALUES (?);', [('a',), ('b',)])
+    rows = db.fetchiter('SELECT name FROM items;')
+    assert next(rows)['name'] == 'a'
+    # the reader is not handed out to others while rows are being read
+    assert db.pool.in_use == 1
+    assert [row['name'] for row in rows] == ['b']
+    assert db.pool.in_use == 0
+    assert db.fetchone('SELECT name FROM items;')['name'] == 'a'
+    assert len(db.fetchall('SELECT name FROM items;')) == 2
+    assert db.pool.in_use == 0
+    assert db.pool.stats()['checkouts'] == 3
+
+
+def test_reader_released_on_error(db):
+    with pytest.raises(Exception):
+        db.query('SELECT * FROM missing;')
+    assert db.pool.in_use == 0
+
+
+def test_reconnect(db):
+    db.close()
+    db.reconnect()
+    assert db.fetchall('SELECT * FROM items;') == []
+
+
+AUTH_MIGRATIONS = 'librarian_core.contrib.auth.migrations.auth'
+
+
+def test_get_latest_migration():
+    assert mod.get_latest_migration(AUTH_MIGRATIONS) == (0, 4)
+
+
+@mock.patch.object(mod.migrations, 'migrate')
+def test_migrate_skips_current(migrate, db):
+    db.query('PRAGMA user_version = 4;')
+    mod.migrate(db, AUTH_MIGRATIONS)
+    assert not migrate.called
+    db.query('PRAGMA user_version = 3;')
+    mod.migrate(db, AUTH_MIGRATIONS)
+    migrate.assert_called_once_with(db, AUTH_MIGRATIONS, {})
+
+
+def test_to_binary(db):
+    db.executescript('CREATE TABLE blobs (data BLOB);')
+    db.execute('INSERT INTO blobs VALUES (?);', (to_binary(db, b'\x00\xff'),))
+    row = db.fetchone('SELECT data, typeof(data) AS type FROM blobs;')
+    assert (bytes(row['data']), row['type']) == (b'\x00\xff', 'blob')
+    # databases without a wrapper of their own get a bytearray
+    assert to_binary(object(), b'\x00') == bytearray(b'\x00')
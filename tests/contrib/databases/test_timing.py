@@ -0,0 +1,81 @@
+import bottle
+import mock
+import pytest
+
+from librarian_core.contrib.databases import timing as mod
+
+
+@pytest.fixture
+def environ():
+    environ = {}
+    bottle.request.bind(environ)
+    bottle.response.bind()
+    return environ
+
+
+@pytest.fixture
+def db():
+    return mod.TimedDatabase(mock.Mock(), threshold=1)
+
+
+def test_counts_queries(environ, db):
+    db.execute('UPDATE sessions;', (1,))
+    db.fetchone('SELECT 1;')
+    db.database.execute.assert_called_once_with('UPDATE sessions;', (1,))
+    stats = bottle.request.db_queries
+    assert stats.count == 2
+    assert stats.duration >= 0
+
+
+def test_counts_failed_queries(environ, db):
+    db.database.fetchall.side_effect = ValueError()
+    with pytest.raises(ValueError):
+        db.fetchall('SELECT 1;')
+    assert bottle.request.db_queries.count == 1
+
+
+def test_fetchiter(environ, db):
+    db.database.fetchiter.return_value = iter([1, 2])
+    assert list(db.fetchiter('SELECT 1;')) == [1, 2]
+    assert bottle.request.db_queries.count == 1
+
+
+def test_untimed(environ, db):
+    db.execute('UPDATE sessions;')
+    with mod.untimed():
+        db.execute('UPDATE sessions;')
+        db.fetchall('SELECT 1;')
+    db.fetchone('SELECT 1;')
+    assert bottle.request.db_queries.count == 2
+
+
+def test_untimed_without_request(db):
+    with mock.patch.object(mod, 'get_request_stats', return_value=None):
+        with mod.untimed():
+            db.execute('UPDATE sessions;')
+
+
+def test_other_attributes(db):
+    assert db.transaction is db.database.transaction
+
+
+@mock.patch.object(mod.time, 'time')
+@mock.patch.object(mod.logging, 'warning')
+def test_logs_slow_queries(warning, time, environ, db):
+    query = mock.Mock()
+    query.serialize.return_value = 'SELECT * FROM users;'
+    time.side_effect = [0, 0.5, 1, 2.5]
+    db.fetchall(query)
+    assert not warning.called
+    db.fetchall(query)
+    warning.assert_called_once_with('Slow query (%.3fs): %s', 1.5,
+                                    'SELECT * FROM users;')
+
+
+def test_add_timing_headers(environ, db):
+    db.fetchone('SELECT 1;')
+    bottle.request.db_queries.duration = 0.0125
+    mod.add_timing_headers()
+    assert bottle.response.get_header('X-DB-Queries') == '1'
+    assert (bottle.response.get_header('Server-Timing') ==
+            'db;dur=12.5;desc="1 queries"')
@@ -0,0 +1,84 @@
+import datetime
+import marshal
+import zlib
+
+import mock
+import pytest
+import pytz
+
+from librarian_core.contrib.sessions import payload as mod
+
+
+DATA = dict(user=dict(username='foo',
+                      created=datetime.datetime(2015, 3, 4, 5, 6, 7,
+                                                tzinfo=pytz.utc),
+                      options=dict(language='en')),
+            messages=['hello', 'world'],
+            count=3)
+EXPECTED = dict(user=dict(username='foo',
+                          created='2015-03-04T05:06:07+00:00',
+                          options=dict(language='en')),
+                messages=['hello', 'world'],
+                count=3)
+
+
+@pytest.fixture(params=['msgpack', 'marshal'])
+def encoding(request):
+    if request.param == 'msgpack':
+        if mod.msgpack is None:
+            pytest.skip('msgpack is not installed')
+        yield mod.VERSION_MSGPACK
+    else:
+        with mock.patch.object(mod, 'msgpack', None):
+            yield mod.VERSION_MARSHAL
+
+
+def test_roundtrip(encoding):
+    payload = mod.pack(DATA)
+    assert mod.HEADER.unpack_from(payload) == (encoding, 0)
+    assert mod.unpack(payload) == EXPECTED
+
+
+def test_compress(encoding):
+    data = dict(messages=['hello'] * 200)
+    payload = mod.pack(data, compress_threshold=100)
+    assert mod.HEADER.unpack_from(payload) == (encoding, mod.FLAG_ZLIB)
+    assert len(payload) < len(mod.pack(data, compress_threshold=None))
+    assert mod.unpack(payload) == data
+
+
+def test_compress_below_threshold(encoding):
+    payload = mod.pack(DATA, compress_threshold=10000)
+    assert mod.HEADER.unpack_from(payload) == (encoding, 0)
+
+
+def test_unpack_buffer(encoding):
+    # binary columns may be returned as buffers, e.g. by psycopg2
+    assert mod.unpack(memoryview(mod.pack(DATA))) == EXPECTED
+
+
+def test_unpack_invalid():
+    for payload in (b'', b'\x01', b'\x7f\x00{}',
+                    mod.HEADER.pack(mod.VERSION_MARSHAL, mod.FLAG_ZLIB) +
+                    b'not compressed'):
+        with pytest.raises(mod.PayloadError):
+            mod.unpack(payload)
+
+
+@pytest.mark.parametrize('body', [
+    b'',
+    b'\xff\x00',
+    b'i\x01\x00',
+    marshal.dumps([1, 2]),
+])
+def test_unpack_invalid_marshal(body):
+    with pytest.raises(mod.PayloadError):
+        mod.unpack(mod.HEADER.pack(mod.VERSION_MARSHAL, 0) + body)
+
+
+def test_unpack_missing_msgpack():
+    payload = (mod.HEADER.pack(mod.VERSION_MSGPACK, mod.FLAG_ZLIB) +
+               zlib.compress(b'\x80'))
+    with mock.patch.object(mod, 'msgpack', None):
+        with pytest.raises(mod.PayloadError):
+            mod.unpack(payload)
@@ -36,25 +36,42 @@ def test__load():
     assert sess._load(111) == {}
 
 
+def test__load_payload():
+    sess = mod.Session('id', None, 'expires', payload=mod.pack({'a': 1}))
+    assert sess.data == {'a': 1}
+
+
+def test__load_payload_invalid():
+    sess = mod.Session('id', '{"a": 1}', 'expires', payload=b'\x7f\x00')
+    assert sess.data == {}
+
+
 def test__dump():
     sess = mod.Session('id', {'a': 1}, 'expires')
-    assert sess._dump() == '{"a": 1}'
+    assert mod.unpack(sess._dump()) == {'a': 1}
 
 
 @mock.patch.object(mod.Session, '_dump')
+@mock.patch.object(mod, 'to_binary')
 @mock.patch.object(mod, 'request')
-def test_save(request, _dump):
+def test_save(request, to_binary, _dump):
+    request.app.config = {}
     sess = mod.Session('id', {'a': 1}, 'expires')
     sess.modified = True
     assert sess.save() is sess
+    assert not sess.modified
 
     db = request.db.sessions
     db.Replace.assert_called_once_with('sessions',
-                                       cols=['session_id', 'data', 'expires'])
-    db.query.assert_called_once_with(db.Replace.return_value,
-                                     session_id=sess.id,
-                                     data=_dump.return_value,
-                                     expires=sess.expires)
+                                       constraints=['session_id'],
+                                       cols=['session_id', 'data', 'payload',
+                                             'expires'])
+    to_binary.assert_called_once_with(db, _dump.return_value)
+    db.execute.assert_called_once_with(db.Replace.return_value,
+                                       dict(session_id=sess.id,
+                                            data=None,
+                                            payload=to_binary.return_value,
+                                            expires=sess.expires))
 
 
 @mock.patch.object(mod, 'request')
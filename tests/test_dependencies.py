@@ -1,3 +1,4 @@
+import mock
 import pytest
 
 from librarian_core import dependencies as mod
@@ -65,3 +66,245 @@ def test__order_missing_dependency():
     loader._dep_tree = dep_tree
     with pytest.raises(mod.UnresolvableDependency):
         loader._order()
+
+
+def make_component(tmpdir, name, hooks_source):
+    pkg = tmpdir.mkdir(name)
+    pkg.join('__init__.py').write('')
+    pkg.join('hooks.py').write(hooks_source)
+    return pkg
+
+
+COMPONENT_META = {
+    'hooks': {
+        'exports': {'initialize': {}, 'init_complete': {}},
+        'is_strict': False,
+    }
+}
+
+
+def test_scan_module(tmpdir):
+    path = tmpdir.join('hooks.py')
+    path.write("import os\n"
+               "from foo import bar as init_complete\n"
+               "EXPORTS = {'initialize': {'depends_on': ['a.b.c']}}\n"
+               "def initialize(supervisor):\n"
+               "    pass\n"
+               "@decorator\n"
+               "def shutdown(supervisor):\n"
+               "    pass\n")
+    (exports, functions, others) = mod.scan_module(str(path))
+    assert exports == {'initialize': {'depends_on': ['a.b.c']}}
+    assert functions == set(['initialize'])
+    assert set(['os', 'init_complete', 'shutdown', 'EXPORTS']) <= others
+
+
+def test_scan_module_dynamic_exports(tmpdir):
+    path = tmpdir.join('hooks.py')
+    path.write("EXPORTS = dict(initialize={})\n")
+    assert mod.scan_module(str(path)) is None
+
+
+def test_lazy_function():
+    fn = mod.LazyFunction('os.path', 'join')
+    assert fn.__module__ == 'os.path'
+    assert fn.__name__ == 'join'
+    assert fn('a', 'b') == mod.os.path.join('a', 'b')
+
+
+def test__build_does_not_import_deferred(tmpdir, monkeypatch):
+    pkg = make_component(tmpdir, 'lazycomp', "def initialize(supervisor):\n"
+                                             "    pass\n")
+    pkg.join('routes.py').write("raise RuntimeError('imported')\n"
+                                "def routes(config):\n"
+                                "    return []\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    meta = dict(COMPONENT_META, routes={'exports': {'routes': {}},
+                                        'is_strict': True,
+                                        'is_deferred': True})
+    loader = mod.DependencyLoader(['lazycomp'], meta)
+    members = list(loader.load())
+    assert [m['name'] for m in members] == ['initialize', 'routes']
+    routes = members[1]
+    assert isinstance(routes['fn'], mod.LazyFunction)
+    assert routes['mod_name'] == 'lazycomp.routes'
+    assert 'lazycomp.hooks' in mod.sys.modules
+    assert 'lazycomp.routes' not in mod.sys.modules
+    with pytest.raises(RuntimeError):
+        routes['fn']({})
+
+
+@mock.patch.object(mod.logging, 'exception')
+def test__build_skips_component_on_import_error(log_exception, tmpdir,
+                                                monkeypatch):
+    make_component(tmpdir, 'goodcomp', "def initialize(supervisor):\n"
+                                       "    pass\n")
+    make_component(tmpdir, 'brokencomp', "import missing_library\n"
+                                         "def initialize(supervisor):\n"
+                                         "    pass\n"
+                                         "def init_complete(supervisor):\n"
+                                         "    pass\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    cache_path = str(tmpdir.join('deps.json'))
+    loader = mod.DependencyLoader(['goodcomp', 'brokencomp'],
+                                  COMPONENT_META,
+                                  cache_path=cache_path)
+    members = list(loader.load())
+    assert [m['pkg_name'] for m in members] == ['goodcomp']
+    (msg,) = log_exception.call_args[0]
+    assert 'brokencomp' in msg
+    assert 'installation skipped' in msg
+    assert not tmpdir.join('deps.json').check()
+
+
+@mock.patch.object(mod.logging, 'exception')
+def test_load_cached_skips_component_on_import_error(log_exception, tmpdir,
+                                                     monkeypatch):
+    make_component(tmpdir, 'flakycomp', "def initialize(supervisor):\n"
+                                        "    pass\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    cache_path = str(tmpdir.join('deps.json'))
+    loader = mod.DependencyLoader(['flakycomp'], COMPONENT_META,
+                                  cache_path=cache_path)
+    assert len(list(loader.load())) == 1
+    assert tmpdir.join('deps.json').check()
+
+    # the module fails to import, e.g. because a library it imports was
+    # removed, although the component itself did not change
+    mod.sys.modules.pop('flakycomp.hooks')
+    monkeypatch.setitem(mod.sys.modules, 'flakycomp.hooks', None)
+    loader = mod.DependencyLoader(['flakycomp'], COMPONENT_META,
+                                  cache_path=cache_path)
+    assert list(loader.load()) == []
+    assert 'installation skipped' in log_exception.call_args[0][0]
+
+
+def test__build_imports_dynamic_exports(tmpdir, monkeypatch):
+    make_component(tmpdir, 'eagercomp', "from os.path import join\n"
+                                        "initialize = join\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    loader = mod.DependencyLoader(['eagercomp'], COMPONENT_META)
+    (member,) = loader.load()
+    assert member['fn'] is mod.os.path.join
+    assert 'eagercomp.hooks' in mod.sys.modules
+
+
+def test__build_strict_missing(tmpdir, monkeypatch):
+    make_component(tmpdir, 'strictcomp', "EXPORTS = {'initialize': {}}\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    loader = mod.DependencyLoader(['strictcomp'], COMPONENT_META)
+    with pytest.raises(mod.DependencyNotFound):
+        loader.load()
+
+
+def test__order_diamond():
+    dep_tree = mod.collections.OrderedDict()
+    dep_tree['a'] = {'fn': 'afn', 'depends_on': ['b', 'c']}
+    dep_tree['b'] = {'fn': 'bfn', 'depends_on': ['d']}
+    dep_tree['c'] = {'fn': 'cfn', 'depends_on': ['d']}
+    dep_tree['d'] = {'fn': 'dfn'}
+
+    loader = mod.DependencyLoader(['a', 'b', 'c', 'd'], {})
+    loader._dep_tree = dep_tree
+    loader._order()
+    assert list(loader._dep_tree) == ['d', 'b', 'c', 'a']
+
+
+def test__order_self_dependency():
+    dep_tree = mod.collections.OrderedDict()
+    dep_tree['a'] = {'fn': 'afn', 'depends_on': ['a']}
+
+    loader = mod.DependencyLoader(['a'], {})
+    loader._dep_tree = dep_tree
+    with pytest.raises(mod.CircularDependency):
+        loader._order()
+
+
+def test__order_large_chain():
+    dep_tree = mod.collections.OrderedDict()
+    ids = ['c{0}'.format(i) for i in range(500)]
+    for (i, dep_id) in enumerate(ids):
+        dep_tree[dep_id] = {'depends_on': [ids[i + 1]] if i < 499 else []}
+
+    loader = mod.DependencyLoader(ids, {})
+    loader._dep_tree = dep_tree
+    loader._order()
+    assert list(loader._dep_tree) == list(reversed(ids))
+
+
+def test_load_cached(tmpdir, monkeypatch):
+    make_component(tmpdir, 'cachedcomp',
+                   "EXPORTS = {'initialize': {}, 'init_complete': {}}\n"
+                   "def initialize(supervisor):\n"
+                   "    pass\n"
+                   "def init_complete(supervisor):\n"
+                   "    pass\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    cache_path = str(tmpdir.join('deps.json'))
+    loader = mod.DependencyLoader(['cachedcomp'], COMPONENT_META,
+                                  cache_path=cache_path)
+    expected = list(loader.load())
+    assert tmpdir.join('deps.json').check()
+
+    loader = mod.DependencyLoader(['cachedcomp'], COMPONENT_META,
+                                  cache_path=cache_path)
+    with mock.patch.object(loader, '_build') as build:
+        members = list(loader.load())
+    assert not build.called
+    assert [m['name'] for m in members] == [m['name'] for m in expected]
+    assert all(isinstance(m['fn'], mod.LazyFunction) for m in members)
+    assert members[0]['fn'].__module__ == 'cachedcomp.hooks'
+
+
+def test_load_cache_invalidated(tmpdir, monkeypatch):
+    pkg = make_component(tmpdir, 'stalecomp',
+                         "def initialize(supervisor):\n"
+                         "    pass\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    cache_path = str(tmpdir.join('deps.json'))
+    loader = mod.DependencyLoader(['stalecomp'], COMPONENT_META,
+                                  cache_path=cache_path)
+    assert [m['name'] for m in loader.load()] == ['initialize']
+
+    pkg.join('hooks.py').write("def initialize(supervisor):\n"
+                               "    pass\n"
+                               "def init_complete(supervisor):\n"
+                               "    pass\n")
+    # the next start imports the changed module
+    mod.sys.modules.pop('stalecomp.hooks')
+    loader = mod.DependencyLoader(['stalecomp'], COMPONENT_META,
+                                  cache_path=cache_path)
+    names = [m['name'] for m in loader.load()]
+    assert names == ['initialize', 'init_complete']
+
+
+@mock.patch.object(mod.logging, 'exception')
+@mock.patch.object(mod.logging, 'warning')
+def test_load_cache_not_writable(log_warning, log_exception, tmpdir,
+                                 monkeypatch):
+    make_component(tmpdir, 'rocomp', "def initialize(supervisor):\n"
+                                     "    pass\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.setattr(mod.DependencyLoader, '_cache_warned', False)
+    cache_path = str(tmpdir.join('missing', 'deps.json'))
+    for _ in range(2):
+        loader = mod.DependencyLoader(['rocomp'], COMPONENT_META,
+                                      cache_path=cache_path)
+        assert [m['name'] for m in loader.load()] == ['initialize']
+    assert log_warning.call_count == 1
+    assert not log_exception.called
+
+
+def test_get_levels():
+    dep_tree = mod.collections.OrderedDict()
+    dep_tree['a'] = {'fn': 'afn'}
+    dep_tree['c'] = {'fn': 'cfn'}
+    dep_tree['d'] = {'fn': 'dfn', 'depends_on': ['a']}
+    dep_tree['e'] = {'fn': 'efn'}
+    dep_tree['b'] = {'fn': 'bfn', 'depends_on': ['d', 'c']}
+
+    loader = mod.DependencyLoader(['a', 'b', 'c', 'd', 'e'], {})
+    loader._dep_tree = dep_tree
+    levels = [[member['fn'] for member in level]
+              for level in loader.get_levels()]
+    assert levels == [['afn', 'cfn'], ['dfn', 'efn'], ['bfn']]
@@ -33,11 +33,34 @@ class TestPlaceholder(object):
         container = mock.Mock()
         placeholder = mod.Placeholder('extname', '', container, mod.Nothing)
         ret = placeholder(1, 2, a='b')
-        assert ret is placeholder
-        container.store_call.assert_called_once_with('extname',
-                                                     '',
-                                                     (1, 2),
-                                                     dict(a='b'))
+        assert isinstance(ret, mod.Placeholder)
+        assert ret is not placeholder
+        container.store_call.assert_called_once_with(
+            'extname',
+            '',
+            (1, 2),
+            dict(a='b'),
+            ret._Placeholder__resolve)
+
+    def test___call___resolves_result(self):
+        container = mock.Mock()
+        placeholder = mod.Placeholder('extname', '', container, mod.Nothing)
+        ret = placeholder()
+        resolve_cb = container.store_call.call_args[0][4]
+        result = mock.Mock()
+        resolve_cb(result)
+        assert ret.attr is result.attr
+        assert placeholder._Placeholder__resolved is mod.Nothing
+
+    def test___getattr___cached(self):
+        placeholder = mod.Placeholder('extname', '', mock.Mock(), 1)
+        assert placeholder.some_attr is placeholder.some_attr
+        assert placeholder.some_attr is not placeholder.other_attr
+
+    def test_slots(self):
+        placeholder = mod.Placeholder('extname', '', mock.Mock(), 1)
+        with pytest.raises(AttributeError):
+            object.__getattribute__(placeholder, '__dict__')
 
 
 class TestExtContainer(object):
@@ -56,6 +79,15 @@ class TestExtContainer(object):
         assert ph._Placeholder__attrpath == ''
         assert ph._Placeholder__parent is ec
         assert ph._Placeholder__onfail == mod.Nothing
+        assert ec.missing is ph
+
+    def test___install_extension_drops_placeholder(self):
+        ec = mod.ExtContainer()
+        ec.missing.method()
+        ext = mock.Mock()
+        ec._ExtContainer__install_extension('missing', ext)
+        assert 'missing' not in ec._placeholders
+        assert ec.missing is ext
 
     def test___install_extension_already_exists(self):
         ec = mod.ExtContainer()
@@ -76,6 +108,16 @@ class TestExtContainer(object):
         assert ec._extensions['test'] is ext
         __replay_calls.assert_called_once_with('test', ext)
 
+    def test___install_extension_binds_attribute(self):
+        ext = mock.Mock()
+        ec = mod.ExtContainer()
+        ec._ExtContainer__install_extension('test', ext)
+        assert ec.__dict__['test'] is ext
+        with mock.patch.object(mod.ExtContainer,
+                               '_ExtContainer__get_extension') as get_ext:
+            assert ec.test is ext
+        assert not get_ext.called
+
     def test___invoke_no_attrs(self):
         ext = mock.Mock()
         ec = mod.ExtContainer()
@@ -105,17 +147,22 @@ class TestExtContainer(object):
         ec = mod.ExtContainer()
         call1 = ('method_a', (1, 2), dict(a=3))
         call2 = ('nested.method_b', (3, 4), dict(b=4))
-        ec._calls['extname'] = [call1, call2]
+        resolve1 = mock.Mock()
+        resolve2 = mock.Mock()
+        ec._calls['extname'] = mod.collections.deque([call1 + (resolve1,),
+                                                      call2 + (resolve2,)])
         ext = mock.Mock()
         ec._ExtContainer__replay_calls('extname', ext)
         __invoke.assert_has_calls([mock.call(ext, *call1),
                                    mock.call(ext, *call2)])
+        resolve1.assert_called_once_with(__invoke.return_value)
+        resolve2.assert_called_once_with(__invoke.return_value)
 
     @mock.patch.object(mod.ExtContainer, '_ExtContainer__invoke')
     def test___replay_calls_cleans_up_properly(self, __invoke):
         ec = mod.ExtContainer()
-        call1 = ('method_a', (1, 2), dict(a=3))
-        call2 = ('nested.method_b', (3, 4), dict(b=4))
+        call1 = ('method_a', (1, 2), dict(a=3), mock.Mock())
+        call2 = ('nested.method_b', (3, 4), dict(b=4), mock.Mock())
         ec._calls['extname'] = [call1]
         ec._calls['another'] = [call2]
         ext = mock.Mock()
@@ -175,19 +222,36 @@ class TestExtContainer(object):
         assert second._extensions == ec._extensions
         assert second._calls == ec._calls
         assert second._ignore == ec._ignore
+        assert second.__dict__['test'] == 1
 
     def test_store_call(self):
         ec = mod.ExtContainer()
-        ec.store_call('extname', 'method', (1, 2), dict(a=3))
+        resolve_cb = mock.Mock()
+        ec.store_call('extname', 'method', (1, 2), dict(a=3), resolve_cb)
         assert len(ec._calls) == 1
-        assert ec._calls == {'extname': [('method', (1, 2), dict(a=3))]}
+        assert list(ec._calls['extname']) == [
+            ('method', (1, 2), dict(a=3), resolve_cb)]
 
     def test_store_call_ignore(self):
         ec = mod.ExtContainer()
         ec._ignore = ['extname']
-        ec.store_call('extname', 'method', (1, 2), dict(a=3))
+        ec.store_call('extname', 'method', (1, 2), dict(a=3), mock.Mock())
         assert len(ec._calls) == 0
 
+    def test_store_call_limit(self):
+        ec = mod.ExtContainer(max_calls=2)
+        for i in range(5):
+            ec.store_call('extname', 'method', (i,), {}, mock.Mock())
+        assert [args for (_, args, _, _) in ec._calls['extname']] == [(0,),
+                                                                      (1,)]
+
+    def test_limit_calls(self):
+        ec = mod.ExtContainer()
+        assert ec._max_calls == mod.ExtContainer.DEFAULT_MAX_CALLS
+        ec.limit_calls(None)
+        assert ec._max_calls is None
+        assert ec(onfail=1)._max_calls is None
+
     def test_is_installed(self):
         ec = mod.ExtContainer()
         ec['valid'] = 1
@@ -256,3 +320,16 @@ def test_integration_replay_calls():
     ext.assert_called_once_with('initializing', kw=42)
     ext.method1.assert_called_once_with(1, 2, a=4)
     ext.nested.method2.assert_called_once_with(5, 7, g=9)
+
+
+def test_integration_replay_resolves_results():
+    ext = mock.Mock()
+    ec = mod.ExtContainer()
+    first = ec.not_yet_here.create(1)
+    second = ec.not_yet_here.create(2)
+
+    ec.not_yet_here = ext
+
+    assert ext.create.call_args_list == [mock.call(1), mock.call(2)]
+    assert first.name is ext.create.return_value.name
+    assert second.name is ext.create.return_value.name
@@ -0,0 +1,106 @@
+import json
+
+import gevent
+import mock
+
+from librarian_core import profiling as mod
+from librarian_core.dependencies import LazyFunction
+from librarian_core.pubsub import PubSub
+
+
+def test_from_argv():
+    assert not mod.StartupProfiler.from_argv(['--debug']).enabled
+    profiler = mod.StartupProfiler.from_argv(['--debug',
+                                              '--profile-startup',
+                                              'out.txt'])
+    assert profiler.enabled
+    assert profiler.path == 'out.txt'
+
+
+def test_self_times():
+    profiler = mod.StartupProfiler('out.txt')
+    with mock.patch.object(mod.time, 'time') as time:
+        time.side_effect = [1.0, 2.0, 3.5, 4.0, 5.0]
+        with profiler.span('a'):
+            with profiler.span('b'):
+                pass
+        profiler.started_at = 0.0
+        self_times = profiler.get_self_times()
+    assert self_times == {('startup',): 2000000,
+                          ('startup', 'a'): 1500000,
+                          ('startup', 'a', 'b'): 1500000}
+
+
+def test_span_in_greenlet():
+    profiler = mod.StartupProfiler('out.txt')
+
+    def child():
+        with profiler.span('child'):
+            pass
+
+    with profiler.span('parent'):
+        gevent.spawn(child).join()
+    paths = [path for (path, _, _) in profiler._spans]
+    assert ('startup', 'parent', 'child') in paths
+
+
+def test_finish_collapsed(tmpdir):
+    path = str(tmpdir.join('startup.txt'))
+    profiler = mod.StartupProfiler(path)
+    with profiler.span('a'):
+        pass
+    profiler.finish()
+    lines = tmpdir.join('startup.txt').read().splitlines()
+    assert [line.rsplit(' ', 1)[0] for line in lines] == ['startup',
+                                                          'startup;a']
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+
+def test_finish_speedscope(tmpdir):
+    path = str(tmpdir.join('startup.json'))
+    profiler = mod.StartupProfiler(path)
+    with profiler.span('a'):
+        pass
+    profiler.finish()
+    data = json.loads(tmpdir.join('startup.json').read())
+    assert data['shared']['frames'] == [{'name': 'startup'}, {'name': 'a'}]
+    (profile,) = data['profiles']
+    assert profile['samples'] == [[0], [0, 1]]
+    assert len(profile['weights']) == 2
+
+
+def test_install_uninstall():
+    events = PubSub()
+    listener = mock.Mock(__name__='listener', __module__='mymod')
+    events.subscribe('event', listener)
+    original_import = LazyFunction.import_module
+    profiler = mod.StartupProfiler('out.txt')
+    profiler.install(events)
+    events.publish('event', 1)
+    LazyFunction('os.path', 'join').resolve()
+    profiler.uninstall()
+    listener.assert_called_once_with(1)
+    paths = [path for (path, _, _) in profiler._spans]
+    assert ('startup', 'event mymod.listener') in paths
+    assert ('startup', 'import os.path') in paths
+    assert 'publish' not in events.__dict__
+    assert LazyFunction.import_module is original_import
+
+
+def test_install_with_stats():
+    events = PubSub()
+    listener = mock.Mock(__name__='listener', __module__='mymod')
+    events.subscribe('event', listener)
+    events.enable_stats()
+    profiler = mod.StartupProfiler('out.txt')
+    profiler.install(events)
+    events.publish('event', 1)
+    profiler.uninstall()
+    paths = [path for (path, _, _) in profiler._spans]
+    assert ('startup', 'event mymod.listener') in paths
+    ((event, name, calls, _, _),) = events.stats()
+    assert (event, name, calls) == ('event', 'mymod.listener', 1)
+    # statistics are still recorded after the profiler is removed
+    assert events.stats_enabled
+    events.publish('event', 2)
+    assert events.stats()[0][2] == 2
@@ -1,3 +1,4 @@
+import gevent
 import mock
 import pytest
 
@@ -24,7 +25,8 @@ def test_publish_has_listeners(pubsub):
     second = mock.Mock()
     second.side_effect = lambda *args, **kwargs: order_checker('second')
 
-    pubsub._subscribers['myevent'] = [first, second]
+    pubsub.subscribe('myevent', first)
+    pubsub.subscribe('myevent', second)
     pubsub.publish('myevent', 1, 2, a='test')
 
     first.assert_called_once_with(1, 2, a='test')
@@ -39,7 +41,8 @@ def test_publish_to_scope(pubsub):
     second = mock.MagicMock()
     second.__module__ = 'librarian_second_component.module'
 
-    pubsub._subscribers['myevent'] = [first, second]
+    pubsub.subscribe('myevent', first)
+    pubsub.subscribe('myevent', second)
     pubsub.publish('myevent',
                    1,
                    2,
@@ -56,7 +59,7 @@ def test_subscribe_new(pubsub):
     second = mock.Mock()
     pubsub.subscribe('test', first)
     pubsub.subscribe('test', second)
-    assert pubsub._subscribers['test'] == [first, second]
+    assert list(pubsub._subscribers['test']) == [first, second]
 
 
 def test_subscribe_already_exists(pubsub):
@@ -64,32 +67,156 @@ def test_subscribe_already_exists(pubsub):
     func = mock.Mock()
     pubsub.subscribe('test', func)
     pubsub.subscribe('test', func)
-    assert pubsub._subscribers['test'] == [func]
+    assert list(pubsub._subscribers['test']) == [func]
+
+
+def test_subscribe_stores_scope(pubsub):
+    func = mock.MagicMock()
+    func.__module__ = 'librarian_component.hooks'
+    pubsub.subscribe('test', func)
+    sub = pubsub._subscribers['test'][func]
+    assert sub == mod.Subscription('librarian_component.hooks', 0, None)
 
 
 def test_unsubscribe(pubsub):
     func = mock.Mock()
-    pubsub._subscribers['test'] = [func]
+    pubsub.subscribe('test', func)
     pubsub.unsubscribe('test', func)
-    assert pubsub._subscribers['test'] == []
+    assert list(pubsub._subscribers['test']) == []
 
 
 def test_unsubscribe_was_not_subscribed(pubsub):
     func = mock.Mock()
-    pubsub._subscribers['test'] = []
+    pubsub._subscribers['test'] = mod.collections.OrderedDict()
     try:
         pubsub.unsubscribe('test', func)
     except Exception:
         pytest.fail('Should not raise.')
 
-    assert pubsub._subscribers['test'] == []
+    assert list(pubsub._subscribers['test']) == []
 
 
 def test_get_subscribers_copies(pubsub):
     func = mock.Mock()
-    pubsub._subscribers['test'] = [func]
+    pubsub.subscribe('test', func)
     listeners = pubsub.get_subscribers('test')
     assert listeners == [func]
     assert listeners is not pubsub._subscribers['test']
     listeners.remove(func)
-    assert pubsub._subscribers['test'] == [func]
+    assert list(pubsub._subscribers['test']) == [func]
+
+
+def test_dispatch_cache_invalidated(pubsub):
+    first = mock.Mock()
+    second = mock.Mock()
+    pubsub.subscribe('test', first)
+    pubsub.publish('test')
+    assert pubsub._dispatch['test'][None] == (first,)
+    pubsub.subscribe('test', second)
+    pubsub.publish('test')
+    second.assert_called_once_with()
+    pubsub.unsubscribe('test', first)
+    pubsub.publish('test')
+    assert first.call_count == 2
+    assert second.call_count == 2
+
+
+def test_publish_to_scope_cached_per_scope(pubsub):
+    first = mock.MagicMock()
+    first.__module__ = 'librarian_first.hooks'
+    second = mock.MagicMock()
+    second.__module__ = 'librarian_second.hooks'
+    pubsub.subscribe('test', first)
+    pubsub.subscribe('test', second)
+    pubsub.publish('test', scope='librarian_first')
+    pubsub.publish('test', scope='librarian_second')
+    pubsub.publish('test')
+    assert first.call_count == 2
+    assert second.call_count == 2
+
+
+def test_publish_priority(pubsub):
+    order_checker = mock.Mock()
+    low = mock.Mock(side_effect=lambda: order_checker('low'))
+    default = mock.Mock(side_effect=lambda: order_checker('default'))
+    high = mock.Mock(side_effect=lambda: order_checker('high'))
+    pubsub.subscribe('test', low, priority=-1)
+    pubsub.subscribe('test', default)
+    pubsub.subscribe('test', high, priority=10)
+    pubsub.publish('test')
+    order_checker.assert_has_calls([mock.call('high'),
+                                    mock.call('default'),
+                                    mock.call('low')])
+
+
+def test_publish_async(pubsub):
+    first = mock.Mock(return_value=1)
+    second = mock.Mock(return_value=2)
+    pubsub.subscribe('test', first)
+    pubsub.subscribe('test', second)
+    results = pubsub.publish_async('test', 1, a=2)
+    assert [result.get() for result in results] == [1, 2]
+    first.assert_called_once_with(1, a=2)
+    second.assert_called_once_with(1, a=2)
+
+
+@mock.patch.object(mod.logging, 'exception')
+def test_publish_async_isolates_errors(exception, pubsub):
+    class CustomError(Exception):
+        pass
+
+    failing = mock.Mock(side_effect=CustomError())
+    other = mock.Mock(return_value='ok')
+    pubsub.subscribe('test', failing)
+    pubsub.subscribe('test', other)
+    (first, second) = pubsub.publish_async('test')
+    with pytest.raises(CustomError):
+        first.get()
+    assert second.get() == 'ok'
+    assert exception.called
+
+
+@mock.patch.object(mod.logging, 'error')
+def test_publish_async_timeout(error, pubsub):
+    def slow():
+        gevent.sleep(1)
+
+    pubsub.subscribe('test', slow, timeout=0.01)
+    (result,) = pubsub.publish_async('test')
+    with pytest.raises(mod.Timeout):
+        result.get()
+    assert error.called
+
+
+def test_stats_disabled_by_default(pubsub):
+    listener = mock.Mock()
+    listener.__name__ = 'listener'
+    pubsub.subscribe('test', listener)
+    pubsub.publish('test')
+    assert not pubsub.stats_enabled
+    assert pubsub.stats() == []
+
+
+def test_stats(pubsub):
+    def listener():
+        pass
+
+    pubsub.subscribe('test', listener)
+    pubsub.enable_stats()
+    assert pubsub.stats_enabled
+    pubsub.publish('test')
+    pubsub.publish('test')
+    pubsub.publish_async('test')[0].get()
+    ((event, name, calls, total, maximum),) = pubsub.stats()
+    assert event == 'test'
+    assert name == __name__ + '.listener'
+    assert calls == 3
+    assert total >= maximum >= 0
+
+    pubsub.disable_stats()
+    assert not pubsub.stats_enabled
+    assert 'publish' not in pubsub.__dict__
+    pubsub.publish('test')
+    assert pubsub.stats()[0][2] == 3
+    pubsub.clear_stats()
+    assert pubsub.stats() == []
@@ -0,0 +1,56 @@
+import io
+
+import mock
+
+from librarian_core import server as mod
+
+
+def test_file_wrapper_iterates_from_current_position():
+    f = io.BytesIO(b'0123456789')
+    f.seek(4)
+    wrapper = mod.FileWrapper(f, blksize=4)
+    assert list(wrapper) == [b'4567', b'89']
+
+
+def test_file_wrapper_close():
+    f = mock.Mock()
+    wrapper = mod.FileWrapper(f)
+    wrapper.close()
+    f.close.assert_called_once_with()
+
+
+def test_file_wrapper_fileno_unsupported():
+    wrapper = mod.FileWrapper(io.BytesIO(b''))
+    assert wrapper.fileno() is None
+
+
+def test_file_wrapper_fileno(tmpdir):
+    path = tmpdir.join('test.bin')
+    path.write('data')
+    with open(str(path), 'rb') as f:
+        assert mod.FileWrapper(f).fileno() == f.fileno()
+
+
+def test_file_wrapper_length():
+    f = io.BytesIO(b'0123456789')
+    f.seek(2)
+    wrapper = mod.FileWrapper(f, blksize=4, length=5)
+    assert list(wrapper) == [b'2345', b'6']
+
+
+def test_file_wrapper_length_beyond_end():
+    wrapper = mod.FileWrapper(io.BytesIO(b'0123'), blksize=4, length=10)
+    assert list(wrapper) == [b'0123']
+
+
+@mock.patch.object(mod.pywsgi.WSGIHandler, 'process_result')
+def test_handler_limits_iterated_file_to_content_length(process_result):
+    f = io.BytesIO(b'0123456789')
+    f.seek(2)
+    handler = mock.Mock(spec=mod.SendfileWSGIHandler)
+    handler.result = mod.FileWrapper(f)
+    handler.provided_content_length = '3'
+    handler.can_sendfile.return_value = False
+    mod.SendfileWSGIHandler.process_result(handler)
+    process_result.assert_called_once_with()
+    assert list(handler.result) == [b'234']